@@ -0,0 +1,154 @@
+# analytics.py
+import numpy as np
+import pandas as pd
+from config import GENRE_COLS, AGE_BAND_EDGES, AGE_BAND_LABELS
+from utils import genre_masks_from_strings
+
+AGGREGATE_NAMES = ("agg_summary", "agg_genre", "agg_year", "agg_age", "agg_gender", "agg_rating")
+
+
+def _positions(keys, values):
+    """Vị trí của mỗi value trong keys (không cần sắp xếp), -1 nếu không có"""
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+    if keys.size == 0:
+        return np.full(values.shape, -1, dtype=np.intp)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    pos = np.minimum(np.searchsorted(sorted_keys, values), len(keys) - 1)
+    return np.where(sorted_keys[pos] == values, order[pos], -1)
+
+
+def _rating_sums(ratings, movies_df, users):
+    """Tổng và số rating theo từng phim, từng user và phân bố điểm, trong một lượt bincount"""
+    values = ratings['rating'].to_numpy(dtype=float)
+    movie_pos = _positions(movies_df['movieId'].to_numpy(), ratings['movieId'].to_numpy())
+    user_pos = _positions(users['userId'].to_numpy(), ratings['userId'].to_numpy())
+
+    known = movie_pos >= 0
+    movie_count = np.bincount(movie_pos[known], minlength=len(movies_df))
+    movie_sum = np.bincount(movie_pos[known], weights=values[known], minlength=len(movies_df))
+    known = user_pos >= 0
+    user_count = np.bincount(user_pos[known], minlength=len(users))
+    user_sum = np.bincount(user_pos[known], weights=values[known], minlength=len(users))
+    histogram = np.bincount(np.clip(np.rint(values).astype(int), 0, 5), minlength=6)[1:]
+    return movie_sum, movie_count, user_sum, user_count, histogram
+
+
+def _table(key_name, keys, counts, ratings, rating_sum, count_name):
+    table = pd.DataFrame({
+        key_name: keys,
+        count_name: np.asarray(counts, dtype=np.int64),
+        'ratings': np.asarray(ratings, dtype=np.int64),
+        'rating_sum': np.asarray(rating_sum, dtype=float),
+    })
+    return _with_average(table)
+
+
+def _with_average(table):
+    ratings = table['ratings'].to_numpy(dtype=float)
+    table['avg_rating'] = np.round(
+        np.divide(table['rating_sum'].to_numpy(), ratings, out=np.full(len(table), np.nan), where=ratings > 0), 3
+    )
+    return table
+
+
+def _codes(values):
+    """(nhãn duy nhất, mã của từng phần tử) cho một cột phân loại"""
+    labels, codes = np.unique(np.asarray(values), return_inverse=True)
+    return labels, codes.ravel()
+
+
+def compute_aggregates(movies_df, ratings, users):
+    """
+    Tính các bảng thống kê cho trang Dataset Analytics
+
+    Trả về dict name -> DataFrame nhỏ (theo genre, năm, nhóm tuổi, giới tính,
+    phân bố điểm và một hàng tổng quan). Mỗi bảng có ratings, rating_sum và
+    avg_rating nên có thể cộng dồn khi có rating mới (xem update_aggregates).
+    """
+    movie_sum, movie_count, user_sum, user_count, histogram = _rating_sums(ratings, movies_df, users)
+
+    # Genre: ma trận flags (phim x genre) nhân với tổng theo phim
+    if 'genre_mask' in movies_df.columns:
+        masks = movies_df['genre_mask'].to_numpy(dtype=np.uint32)
+    else:
+        masks = genre_masks_from_strings(movies_df['genres'].fillna('unknown').to_numpy(), GENRE_COLS)
+    flags = ((masks[:, None] >> np.arange(len(GENRE_COLS), dtype=np.uint32)) & 1).astype(float)
+    genre = _table('genre', GENRE_COLS, flags.sum(axis=0), movie_count @ flags, movie_sum @ flags, 'movies')
+
+    years = movies_df['year'].to_numpy(dtype=float)
+    valid = ~np.isnan(years)
+    year_labels, year_codes = _codes(years[valid].astype(int))
+    n_years = len(year_labels)
+    year = _table(
+        'year', year_labels,
+        np.bincount(year_codes, minlength=n_years),
+        np.bincount(year_codes, weights=movie_count[valid], minlength=n_years),
+        np.bincount(year_codes, weights=movie_sum[valid], minlength=n_years),
+        'movies',
+    )
+
+    bands = np.digitize(users['age'].to_numpy(), AGE_BAND_EDGES)
+    n_bands = len(AGE_BAND_LABELS)
+    age = _table(
+        'age_band', AGE_BAND_LABELS,
+        np.bincount(bands, minlength=n_bands),
+        np.bincount(bands, weights=user_count, minlength=n_bands),
+        np.bincount(bands, weights=user_sum, minlength=n_bands),
+        'users',
+    )
+
+    gender_labels, gender_codes = _codes(users['gender'].fillna('unknown').astype(str).to_numpy())
+    n_genders = len(gender_labels)
+    gender = _table(
+        'gender', gender_labels,
+        np.bincount(gender_codes, minlength=n_genders),
+        np.bincount(gender_codes, weights=user_count, minlength=n_genders),
+        np.bincount(gender_codes, weights=user_sum, minlength=n_genders),
+        'users',
+    )
+
+    rating = pd.DataFrame({'rating': np.arange(1, 6), 'count': histogram.astype(np.int64)})
+    summary = _with_average(pd.DataFrame({
+        'movies': [len(movies_df)],
+        'users': [len(users)],
+        'ratings': [int(len(ratings))],
+        'rating_sum': [float(ratings['rating'].to_numpy(dtype=float).sum())],
+    }))
+
+    return {
+        'agg_summary': summary, 'agg_genre': genre, 'agg_year': year,
+        'agg_age': age, 'agg_gender': gender, 'agg_rating': rating,
+    }
+
+
+def update_aggregates(aggregates, new_ratings, movies_df, users):
+    """
+    Cộng thêm một batch rating mới vào các bảng đã có, không quét lại toàn bộ ratings
+
+    Số phim/user trong mỗi nhóm giữ nguyên; chỉ ratings, rating_sum, avg_rating
+    và phân bố điểm được cập nhật.
+    """
+    delta = compute_aggregates(movies_df, new_ratings, users)
+    updated = {}
+    for name, key in (('agg_genre', 'genre'), ('agg_year', 'year'), ('agg_age', 'age_band'), ('agg_gender', 'gender')):
+        table = aggregates[name].set_index(key)
+        change = delta[name].set_index(key)[['ratings', 'rating_sum']]
+        table = table.reindex(table.index.union(change.index))
+        for col in ('ratings', 'rating_sum'):
+            table[col] = table[col].fillna(0).add(change[col], fill_value=0)
+        table['ratings'] = table['ratings'].astype(np.int64)
+        for col in set(table.columns) - {'ratings', 'rating_sum', 'avg_rating'}:
+            table[col] = table[col].fillna(0).astype(np.int64)
+        updated[name] = _with_average(table.reset_index()[aggregates[name].columns.drop('avg_rating')])
+
+    rating = aggregates['agg_rating'].copy()
+    rating['count'] = rating['count'].to_numpy() + delta['agg_rating']['count'].to_numpy()
+    updated['agg_rating'] = rating
+
+    summary = aggregates['agg_summary'][['movies', 'users', 'ratings', 'rating_sum']].copy()
+    summary['ratings'] += int(len(new_ratings))
+    summary['rating_sum'] += delta['agg_summary']['rating_sum'].iloc[0]
+    updated['agg_summary'] = _with_average(summary)
+    return updated
@@ -0,0 +1,194 @@
+# ann_index.py
+import numpy as np
+from config import (
+    ANN_BACKEND, ANN_INDEX_PATH, ANN_N_LISTS, ANN_N_PROBE, ANN_KMEANS_ITERATIONS, ANN_KMEANS_SAMPLE, SERVE_MODE
+)
+from artifact_store import publish_arrays, attach_arrays
+from topk import top_k
+
+_ASSIGN_BLOCK = 8192
+
+
+class ExactIndex:
+    """
+    Backend "exact": quét toàn bộ vectors mỗi query, cùng interface với IVFIndex
+
+    Dùng làm ground truth khi đo recall và khi muốn tắt ANN mà không đổi code gọi.
+    """
+
+    backend = "exact"
+
+    def __init__(self, vectors, meta=None):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.meta = dict(meta or {})
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, vectors, meta=None, **params):
+        return cls(vectors, meta)
+
+    def candidates(self, query, n_probe=None):
+        """(vị trí, similarity) của mọi phim"""
+        return np.arange(len(self.vectors)), self.vectors @ np.asarray(query, dtype=np.float32)
+
+    def search(self, query, k, n_probe=None, exclude=None):
+        """(vị trí, similarity) của k phim có tích vô hướng với query lớn nhất"""
+        return _search(self, query, k, n_probe, exclude)
+
+    def save(self, path):
+        return publish_arrays(path, {'vectors': self.vectors}, {**self.meta, 'backend': self.backend})
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        return cls(arrays['vectors'], meta)
+
+
+class IVFIndex:
+    """
+    Inverted file index: chia catalog thành n_lists cụm bằng spherical k-means
+
+    Vector của các phim được sắp lại theo cụm (mỗi inverted list là một đoạn
+    liên tiếp của mảng float32), nên một query chỉ cần chọn n_probe centroid
+    gần nhất rồi nhân ma trận-vector trên các đoạn đó thay vì cả catalog.
+    n_probe là tham số đổi recall lấy latency lúc query, không cần build lại;
+    n_probe = n_lists cho kết quả giống exact.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, centroids, offsets, items, vectors, meta=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.items = np.asarray(items, dtype=np.int32)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.meta = dict(meta or {})
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, meta=None, n_lists=ANN_N_LISTS, n_iter=ANN_KMEANS_ITERATIONS,
+              sample_size=ANN_KMEANS_SAMPLE, seed=0):
+        """Train centroid trên một mẫu của vectors (đã chuẩn hóa L2) rồi gán mọi phim vào cụm gần nhất"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n_items = len(vectors)
+        if n_lists is None:
+            n_lists = int(round(4 * np.sqrt(n_items)))
+        n_lists = max(1, min(n_lists, n_items))
+
+        centroids = _spherical_kmeans(vectors, n_lists, n_iter, sample_size, seed)
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind='stable')
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+        return cls(centroids, offsets, order, vectors[order], meta)
+
+    def candidates(self, query, n_probe=ANN_N_PROBE):
+        """(vị trí, similarity) của mọi phim trong n_probe inverted list có centroid gần query nhất"""
+        query = np.asarray(query, dtype=np.float32)
+        lists = np.sort(top_k(self.centroids @ query, min(n_probe or ANN_N_PROBE, self.n_lists)))
+        spans = [(self.offsets[i], self.offsets[i + 1]) for i in lists]
+        # Mỗi list là một đoạn liên tiếp: nhân trực tiếp trên slice, không gather vector
+        positions = np.concatenate([self.items[start:stop] for start, stop in spans]).astype(np.intp)
+        scores = np.concatenate([self.vectors[start:stop] @ query for start, stop in spans])
+        return positions, scores
+
+    def search(self, query, k, n_probe=ANN_N_PROBE, exclude=None):
+        """(vị trí, similarity) của k phim gần query nhất trong các list được quét"""
+        return _search(self, query, k, n_probe, exclude)
+
+    def save(self, path):
+        arrays = {'centroids': self.centroids, 'offsets': self.offsets, 'items': self.items, 'vectors': self.vectors}
+        return publish_arrays(path, arrays, {**self.meta, 'backend': self.backend})
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        return cls(arrays['centroids'], arrays['offsets'], arrays['items'], arrays['vectors'], meta)
+
+
+ANN_BACKENDS = {"exact": ExactIndex, "ivf": IVFIndex}
+
+
+def _search(index, query, k, n_probe, exclude):
+    positions, scores = index.candidates(query, n_probe)
+    skip = np.flatnonzero(np.isin(positions, exclude)) if exclude is not None else None
+    order = top_k(scores, k, exclude=skip)
+    return positions[order], scores[order]
+
+
+def _assign(vectors, centroids):
+    """Cụm có centroid gần nhất (tích vô hướng lớn nhất) của mỗi vector, tính theo block"""
+    assign = np.empty(len(vectors), dtype=np.intp)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK):
+        assign[start:start + _ASSIGN_BLOCK] = np.argmax(vectors[start:start + _ASSIGN_BLOCK] @ centroids.T, axis=1)
+    return assign
+
+
+def _spherical_kmeans(vectors, n_lists, n_iter, sample_size, seed):
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)] if len(vectors) > sample_size else vectors
+    n_lists = min(n_lists, len(sample))
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = _assign(sample, centroids)
+        sums = np.stack([np.bincount(assign, weights=sample[:, d], minlength=n_lists)
+                         for d in range(sample.shape[1])], axis=1)
+        # Cụm rỗng được khởi tạo lại bằng một điểm ngẫu nhiên
+        empty = np.flatnonzero(np.bincount(assign, minlength=n_lists) == 0)
+        sums[empty] = sample[rng.choice(len(sample), len(empty))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.where(norms > 0, norms, 1)).astype(np.float32)
+    return centroids
+
+
+def build_ann_index(vectors, backend=ANN_BACKEND, meta=None, **params):
+    """Build ANN index bằng backend trong ANN_BACKENDS; params là tham số build của backend đó"""
+    if backend not in ANN_BACKENDS:
+        raise ValueError(f"unknown ANN backend '{backend}'")
+    return ANN_BACKENDS[backend].build(vectors, meta=meta, **params)
+
+
+def load_ann_index(path=ANN_INDEX_PATH, mmap=True):
+    """Đọc ANN index đã lưu bằng save() (memory-map), None nếu chưa có"""
+    attached = attach_arrays(path, mmap=mmap)
+    if attached is None:
+        return None
+    meta, arrays = attached
+    meta.pop('arrays', None)
+    backend = ANN_BACKENDS.get(meta.get('backend'))
+    return backend.from_arrays(arrays, meta) if backend is not None else None
+
+
+def load_or_build_ann_index(neighbor_index, path=ANN_INDEX_PATH, backend=ANN_BACKEND, allow_build=not SERVE_MODE):
+    """
+    ANN index trên vectors của neighbor_index (content model)
+
+    Dùng index đã lưu ở path nếu cùng catalog/model với neighbor_index và cùng
+    backend, nếu không thì build rồi lưu (trừ khi allow_build=False: serve mode
+    trả về None kèm warning).
+    """
+    if neighbor_index is None or getattr(neighbor_index, 'vectors', None) is None:
+        return None
+    key = "|".join([backend, str(ANN_N_LISTS), str(neighbor_index.meta.get('catalog')),
+                    str(neighbor_index.meta.get('model'))])
+    if path:
+        cached = load_ann_index(path)
+        if cached is not None and cached.meta.get('key') == key and len(cached) == len(neighbor_index):
+            return cached
+    if not allow_build:
+        print("Warning: ANN index missing or stale; run `python build_artifacts.py`")
+        return None
+
+    ann = build_ann_index(neighbor_index.vectors, backend, meta={'key': key})
+    if path:
+        try:
+            ann.save(path)
+        except OSError as e:
+            print(f"Warning: Could not save ANN index: {e}")
+    return ann
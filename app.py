@@ -1,25 +1,59 @@
-import os
 from typing import List, Tuple
 import pandas as pd
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-from collections import Counter
 import numpy as np
 
-from data_loader import load_data
+from data_loader import load_data, load_cached_aggregates
+from analytics import compute_aggregates, update_aggregates
 from recommend import (
     build_similarity_matrix, recommend, recommend_by_genres, 
-    get_genre_recommendations, hybrid_recommend
+    get_genre_recommendations, hybrid_recommend, als_recommend
 )
-from search import search_movie_by_title
-from poster_service import get_poster_url
+from search import search_movie_by_title, autocomplete_titles
+from search_index import update_popularity
+from collaborative import build_item_cf_index, refresh_item_cf_rows, also_liked, ItemCFOperands
+from genre_leaderboard import GenreLeaderboards
+from matrix_factorization import load_or_train_als
+from config import (
+    ALS_MODEL_DIR, NEIGHBOR_INDEX_PATH, CF_INDEX_PATH, TRENDING_WINDOWS, TRENDING_DEFAULT_WINDOW, CONTENT_SEARCH_MODE
+)
+from ann_index import load_or_build_ann_index
+from poster_service import get_poster_url, get_poster_urls
+from result_cache import get_result_cache, data_version
+from rating_ingest import RatingIngestor
+from trending import TrendingScores, get_trending
+from metrics import METRICS, timed, record_error
 
-@st.cache_data(show_spinner=False)
-def load_context() -> Tuple[pd.DataFrame, Tuple, pd.DataFrame, pd.DataFrame]:
+# cache_resource: mọi session dùng chung một object (không pickle/copy mỗi lần rerun);
+# các mảng lớn được memory-map read-only từ artifact trên đĩa, nên không được sửa in-place
+@st.cache_resource(show_spinner=False)
+@timed("load_context")
+def load_context() -> Tuple[pd.DataFrame, Tuple, pd.DataFrame, pd.DataFrame, dict]:
     try:
         movies_df, ratings, users = load_data()
-        cosine_sim, indices = build_similarity_matrix(movies_df)
+        # Replay rating mới trong log lên stats gốc; các model bên dưới dùng dữ liệu đã gộp
+        ingestor = RatingIngestor(movies_df, ratings)
+        movies_df, ratings = ingestor.movies_df, ingestor.ratings
+        cosine_sim, indices = build_similarity_matrix(movies_df, index_path=NEIGHBOR_INDEX_PATH)
+        
+        # Các model phụ dựa trên ratings; lỗi ở đây không được chặn phần content-based
+        models = {'ingestor': ingestor}
+        try:
+            models['cf'] = build_item_cf_index(ratings, movies_df, index_path=CF_INDEX_PATH)
+        except Exception as e:
+            record_error("build_item_cf_index", e)
+            st.warning(f"⚠️ Could not build collaborative filtering index: {e}")
+        models['als'] = load_als_model(ratings, movies_df)
+        if CONTENT_SEARCH_MODE == "approx":
+            try:
+                models['ann'] = load_or_build_ann_index(cosine_sim)
+            except Exception as e:
+                record_error("load_or_build_ann_index", e)
+                st.warning(f"⚠️ Could not load ANN index, using exact similarity: {e}")
+        models['genres'] = GenreLeaderboards(movies_df)
+        models['trending'] = TrendingScores(movies_df, ratings)
+        models['analytics'] = (None if ingestor.applied else load_cached_aggregates()) or compute_aggregates(movies_df, ratings, users)
+        models['version'] = data_version(movies_df, cosine_sim, models.get('cf'), models.get('als'))
         
         # Handle case where similarity matrix building failed
         if cosine_sim is None or indices is None:
@@ -28,19 +62,74 @@ def load_context() -> Tuple[pd.DataFrame, Tuple, pd.DataFrame, pd.DataFrame]:
             cosine_sim = None
             indices = pd.Series(movies_df.index, index=movies_df['title'].fillna('unknown')).drop_duplicates()
             
-        return movies_df, (cosine_sim, indices), ratings, users
+        return movies_df, (cosine_sim, indices), ratings, users, models
         
     except Exception as e:
+        record_error("load_context", e)
         st.error(f"❌ Error loading data: {e}")
         # Return empty data structures
         empty_df = pd.DataFrame()
-        return empty_df, (None, pd.Series()), empty_df, empty_df
+        return empty_df, (None, pd.Series()), empty_df, empty_df, {}
 
 
-def _render_movie_row(title: str, genres: str, year: int, similarity_score: float = None, avg_rating: float = None, rating_count: int = None, confidence_score: float = None):
+@timed("sync_ratings")
+def sync_ratings(movies_df, ratings, users, cosine_sim, models):
+    """
+    Áp dụng rating mới được ghi vào log (qua service hoặc rating_ingest.py) từ lần rerun trước
+
+    Chỉ phần bị ảnh hưởng được cập nhật: stats của phim có rating mới, các
+    leaderboard chứa genre của chúng, trending, bảng analytics, độ phổ biến trong search
+    index và các hàng item-CF liên quan.
+    ALS giữ nguyên tới lần train lại.
+    """
+    ingestor = models.get('ingestor')
+    if ingestor is None:
+        return movies_df, ratings
+    with ingestor.lock:
+        new_ratings = ingestor.sync()
+        if not new_ratings.empty:
+            changed = ingestor.take_dirty()
+            movies_df = ingestor.movies_df
+            models['genres'].update(movies_df, changed)
+            models['trending'].update(new_ratings)
+            if models.get('analytics'):
+                models['analytics'] = update_aggregates(models['analytics'], new_ratings, movies_df, users)
+            update_popularity(movies_df)
+            if models.get('cf') is not None:
+                operands = models.get('cf_operands')
+                if operands is None:
+                    # Build một lần từ ratings hiện có (đã gồm batch này), các batch sau chỉ cập nhật phần mới
+                    operands = models['cf_operands'] = ItemCFOperands(ingestor.ratings, movies_df)
+                else:
+                    operands.update(new_ratings)
+                models['cf'] = refresh_item_cf_rows(models['cf'], ingestor.ratings, movies_df, changed,
+                                                    operands=operands)
+            models['version'] = data_version(movies_df, cosine_sim, models.get('cf'), models.get('als'))
+        return ingestor.movies_df, ingestor.ratings
+
+
+def load_als_model(ratings, movies_df):
+    """Memory-map factors ALS đã lưu nếu khớp catalog, nếu không thì train lại và lưu (trừ serve mode)"""
+    try:
+        return load_or_train_als(ratings, movies_df, ALS_MODEL_DIR)
+    except Exception as e:
+        record_error("load_als_model", e)
+        st.warning(f"⚠️ Could not load matrix factorization model: {e}")
+        return None
+
+
+def _prefetch_posters(movies: pd.DataFrame) -> List[str]:
+    """Resolve poster của cả danh sách phim trong một batch trước khi render"""
+    if movies.empty:
+        return []
+    return get_poster_urls(zip(movies["title"], movies["year"]))
+
+
+def _render_movie_row(title: str, genres: str, year: int, similarity_score: float = None, avg_rating: float = None, rating_count: int = None, confidence_score: float = None, poster: str = None):
     """Render movie với poster và thông tin"""
     cols = st.columns([1, 3, 1, 1])
-    poster = get_poster_url(title, year)
+    if poster is None:
+        poster = get_poster_url(title, year)
     
     with cols[0]:
         if poster:
@@ -72,33 +161,61 @@ def _render_movie_row(title: str, genres: str, year: int, similarity_score: floa
         if similarity_score is not None:
             st.metric("Similarity", f"{similarity_score:.1%}")
 
-def show_genre_analysis(movies_df):
-    """Hiển thị phân tích thể loại"""
+def show_genre_analysis(agg_genre: pd.DataFrame):
+    """Hiển thị phân tích thể loại từ bảng thống kê đã tính sẵn"""
     st.subheader("📊 Genre Analysis")
     
-    # Tách và đếm genres
-    all_genres = []
-    for genres_str in movies_df['genres'].dropna():
-        genres = [g.strip() for g in genres_str.split() if g.strip() != 'unknown']
-        all_genres.extend(genres)
-    
-    genre_counts = Counter(all_genres)
-    top_genres = dict(genre_counts.most_common(10))
-    
-    # Tạo bar chart đơn giản
-    df_genres = pd.DataFrame(list(top_genres.items()), columns=['Genre', 'Count'])
+    top_genres = agg_genre[agg_genre['genre'] != 'unknown'].nlargest(10, 'movies')
+    df_genres = pd.DataFrame({'Genre': top_genres['genre'], 'Count': top_genres['movies']})
     st.bar_chart(df_genres.set_index('Genre'))
 
-def show_year_distribution(movies_df):
+def show_year_distribution(agg_year: pd.DataFrame):
     """Hiển thị phân bố năm phát hành"""
     st.subheader("📈 Movies by Year")
     
-    # Lọc năm hợp lệ
-    valid_years = movies_df[movies_df['year'].notna() & (movies_df['year'] > 1900)]['year']
-    year_counts = valid_years.value_counts().sort_index()
-    
+    year_counts = agg_year[agg_year['year'] > 1900].set_index('year')['movies']
     st.line_chart(year_counts)
 
+def show_audience_analysis(agg_age: pd.DataFrame, agg_gender: pd.DataFrame):
+    """Hiển thị số rating và điểm trung bình theo nhóm tuổi / giới tính của user"""
+    st.subheader("👥 Ratings by Audience")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.caption("By age band")
+        st.bar_chart(agg_age.set_index('age_band')[['ratings']], sort=False)
+        st.dataframe(agg_age[['age_band', 'users', 'ratings', 'avg_rating']], hide_index=True)
+    with col2:
+        st.caption("By gender")
+        st.bar_chart(agg_gender.set_index('gender')[['ratings']])
+        st.dataframe(agg_gender[['gender', 'users', 'ratings', 'avg_rating']], hide_index=True)
+
+def show_debug_panel():
+    """Sidebar debug: latency percentile, lỗi và counter của các hot path; export JSON / Prometheus"""
+    with st.sidebar.expander("🛠️ Debug: performance metrics"):
+        METRICS.enabled = st.checkbox("Collect metrics", value=METRICS.enabled)
+        trace_memory = st.checkbox("Trace peak memory (tracemalloc, slower)", value=METRICS.trace_memory)
+        if trace_memory != METRICS.trace_memory:
+            METRICS.set_trace_memory(trace_memory)
+        
+        snapshot = METRICS.snapshot()
+        if snapshot["timers"]:
+            table = pd.DataFrame.from_dict(snapshot["timers"], orient="index")
+            st.dataframe(table[["count", "errors", "p50_ms", "p95_ms", "p99_ms", "max_ms", "peak_memory_bytes"]])
+            for name, timer in snapshot["timers"].items():
+                if timer["last_error"]:
+                    st.caption(f"❗ {name}: {timer['last_error']}")
+        else:
+            st.caption("No measurements yet.")
+        if snapshot["counters"]:
+            st.json(snapshot["counters"])
+        
+        st.download_button("⬇️ Export JSON", METRICS.to_json(), file_name="metrics.json", mime="application/json")
+        st.download_button("⬇️ Export Prometheus", METRICS.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+        if st.button("Reset metrics"):
+            METRICS.reset()
+
+
 def create_user_profile():
     """Tạo user profile cho hybrid recommendations"""
     st.sidebar.subheader("🎯 Your Preferences")
@@ -132,14 +249,22 @@ def main():
     st.markdown("*Discover movies you'll love using AI-powered recommendations*")
     
     # Load data
-    movies_df, (cosine_sim, indices), ratings, users = load_context()
+    movies_df, (cosine_sim, indices), ratings, users, models = load_context()
+    movies_df, ratings = sync_ratings(movies_df, ratings, users, cosine_sim, models)
+    
+    # Kết quả query được cache theo version dữ liệu/model, rerun không phải tính lại
+    cache = get_result_cache()
+    cache.set_version(models.get('version', ''))
     
     # Sidebar navigation
     st.sidebar.title("🎮 Navigation")
     page = st.sidebar.selectbox(
         "Choose a feature:",
-        ["🔍 Movie Search & Recommend", "🎭 Browse by Genre", "📊 Dataset Analytics", "🎯 Hybrid Recommendations"]
+        ["🔍 Movie Search & Recommend", "🎭 Browse by Genre", "🔥 Trending", "📊 Dataset Analytics",
+         "🎯 Hybrid Recommendations", "👤 Recommendations for a User"]
     )
+    # Render trước các page vì page có thể return sớm; query của page hiện tại hiện ở lần rerun sau
+    show_debug_panel()
     
     if page == "🔍 Movie Search & Recommend":
         # Original search functionality với cải tiến
@@ -149,6 +274,13 @@ def main():
         
         with col1:
             q = st.text_input("🔍 Enter movie title:", value="Toy Story", placeholder="e.g., Toy Story, Titanic, etc.")
+            
+            # Autocomplete: gợi ý title theo prefix đang gõ, phim phổ biến lên trước
+            suggestions = cache.get_or_compute(
+                "autocomplete", lambda: autocomplete_titles(q, movies_df, top_n=8), prefix=q.casefold(), top_n=8
+            )
+            if suggestions and suggestions != [q]:
+                q = st.selectbox("💡 Suggestions", [q] + [t for t in suggestions if t != q])
         
         with col2:
             topn = st.slider("Number of recommendations", min_value=3, max_value=20, value=8)
@@ -157,7 +289,9 @@ def main():
         
         if search_btn and q.strip():
             # Search results
-            results = search_movie_by_title(q, movies_df, top_n=10)
+            results = cache.get_or_compute(
+                "search", lambda: search_movie_by_title(q, movies_df, top_n=10), q=q.casefold(), top_n=10
+            )
             if results.empty:
                 st.warning("❌ No matching movies found. Try a different title!")
                 return
@@ -172,12 +306,14 @@ def main():
             
             # Show search results
             with st.expander("📋 Search Results", expanded=True):
-                for _, row in results.iterrows():
+                posters = _prefetch_posters(results)
+                for (_, row), poster in zip(results.iterrows(), posters):
                     _render_movie_row(
                         row["title"], row["genres"], row["year"], 
                         avg_rating=row.get("avg_rating"), 
                         rating_count=row.get("rating_count"),
-                        confidence_score=row.get("confidence_score")
+                        confidence_score=row.get("confidence_score"),
+                        poster=poster
                     )
             
             # Recommendations
@@ -186,21 +322,45 @@ def main():
             
             # Check if we have valid similarity matrix
             if cosine_sim is not None:
-                recs = recommend(seed_title, movies_df, cosine_sim, indices, top_n=topn, return_scores=True)
+                recs = cache.get_or_compute(
+                    "recommend",
+                    lambda: recommend(seed_title, movies_df, cosine_sim, indices, top_n=topn, return_scores=True,
+                                      ann=models.get('ann')),
+                    title=seed_title, top_n=topn, mode=CONTENT_SEARCH_MODE
+                )
                 
                 if not recs.empty:
-                    for _, row in recs.iterrows():
+                    posters = _prefetch_posters(recs)
+                    for (_, row), poster in zip(recs.iterrows(), posters):
                         similarity = row.get('similarity_score', None)
                         _render_movie_row(
                             row["title"], row["genres"], row["year"], 
                             similarity_score=similarity,
                             avg_rating=row.get("avg_rating"), 
-                            rating_count=row.get("rating_count")
+                            rating_count=row.get("rating_count"),
+                            poster=poster
                         )
                 else:
                     st.info("No recommendations found for this movie.")
             else:
                 st.warning("⚠️ Recommendation engine not available. Please check data loading.")
+            
+            # Collaborative filtering: người xem phim này cũng thích
+            cf_recs = cache.get_or_compute(
+                "also_liked", lambda: also_liked(seed_title, movies_df, models.get('cf'), indices, top_n=topn),
+                title=seed_title, top_n=topn
+            )
+            if not cf_recs.empty:
+                st.header(f"👥 Users who liked *{seed_title}* also liked")
+                posters = _prefetch_posters(cf_recs)
+                for (_, row), poster in zip(cf_recs.iterrows(), posters):
+                    _render_movie_row(
+                        row["title"], row["genres"], row["year"], 
+                        similarity_score=row.get("cf_score"),
+                        avg_rating=row.get("avg_rating"), 
+                        rating_count=row.get("rating_count"),
+                        poster=poster
+                    )
     
     elif page == "🎭 Browse by Genre":
         st.header("Browse Movies by Genre")
@@ -215,49 +375,92 @@ def main():
             num_movies = st.slider("Number of movies", 5, 20, 10)
         
         if st.button("🎭 Find Movies"):
-            genre_movies = recommend_by_genres(movies_df, [selected_genre], top_n=num_movies)
+            genre_movies = cache.get_or_compute(
+                "genres",
+                lambda: recommend_by_genres(movies_df, [selected_genre], top_n=num_movies,
+                                            leaderboards=models.get('genres')),
+                genres=[selected_genre], top_n=num_movies
+            )
             
             if not genre_movies.empty:
                 st.success(f"Found {len(genre_movies)} {selected_genre} movies")
                 
-                for _, row in genre_movies.iterrows():
+                posters = _prefetch_posters(genre_movies)
+                for (_, row), poster in zip(genre_movies.iterrows(), posters):
                     final_score = row.get('final_score', 0)
                     _render_movie_row(
                         row["title"], row["genres"], row["year"], 
                         similarity_score=final_score,
                         avg_rating=row.get("avg_rating"), 
-                        rating_count=row.get("rating_count")
+                        rating_count=row.get("rating_count"),
+                        poster=poster
                     )
             else:
                 st.warning(f"No {selected_genre} movies found!")
     
+    elif page == "🔥 Trending":
+        st.header("Trending Movies")
+        st.info("Popularity and ratings with exponential time decay: recent ratings count the most.")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            windows = list(TRENDING_WINDOWS)
+            window = st.selectbox(
+                "Window (half-life)", windows, index=windows.index(TRENDING_DEFAULT_WINDOW),
+                format_func=lambda name: f"{name} ({TRENDING_WINDOWS[name]} days)"
+            )
+        with col2:
+            num_recs = st.slider("Number of movies", 5, 20, 10)
+        
+        trending_movies = get_trending(movies_df, models.get('trending'), window, num_recs)
+        if not trending_movies.empty:
+            st.success(f"🔥 Top {len(trending_movies)} trending movies this {window}")
+            posters = _prefetch_posters(trending_movies)
+            for (_, row), poster in zip(trending_movies.iterrows(), posters):
+                _render_movie_row(
+                    row["title"], row["genres"], row["year"], 
+                    similarity_score=row["trend_score"],
+                    avg_rating=row.get("avg_rating"), 
+                    rating_count=row.get("rating_count"),
+                    poster=poster
+                )
+                st.caption(f"🔥 {row['trend_count']:.1f} recent ratings (decayed), avg {row['trend_rating']:.2f}")
+        else:
+            st.warning("No trending data available!")
+    
     elif page == "📊 Dataset Analytics":
         st.header("Dataset Analytics & Insights")
         
-        # Basic stats
+        # Basic stats (từ bảng thống kê tính sẵn, không quét lại ratings)
+        aggregates = models.get('analytics')
+        if not aggregates:
+            st.warning("⚠️ Analytics are not available. Please check data loading.")
+            return
+        summary = aggregates['agg_summary'].iloc[0]
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Total Movies", f"{len(movies_df):,}")
+            st.metric("Total Movies", f"{int(summary['movies']):,}")
         
         with col2:
-            st.metric("Total Ratings", f"{len(ratings):,}")
+            st.metric("Total Ratings", f"{int(summary['ratings']):,}")
         
         with col3:
-            st.metric("Total Users", f"{len(users):,}")
+            st.metric("Total Users", f"{int(summary['users']):,}")
         
         with col4:
-            avg_rating = ratings['rating'].mean()
-            st.metric("Avg Rating", f"{avg_rating:.1f}/5")
+            st.metric("Avg Rating", f"{summary['avg_rating']:.1f}/5")
         
         # Visualizations
         col1, col2 = st.columns(2)
         
         with col1:
-            show_genre_analysis(movies_df)
+            show_genre_analysis(aggregates['agg_genre'])
         
         with col2:
-            show_year_distribution(movies_df)
+            show_year_distribution(aggregates['agg_year'])
+        
+        show_audience_analysis(aggregates['agg_age'], aggregates['agg_gender'])
     
     elif page == "🎯 Hybrid Recommendations":
         st.header("Personalized Hybrid Recommendations")
@@ -269,13 +472,20 @@ def main():
         # Movie input
         movie_title = st.text_input("Enter a movie you like:", value="Toy Story")
         num_recs = st.slider("Number of recommendations", 5, 15, 10)
+        blend_trending = st.checkbox("🔥 Boost trending movies", value=False)
+        trending = models.get('trending') if blend_trending else None
         
         if st.button("🎯 Get Personalized Recommendations"):
             if movie_title.strip():
                 if cosine_sim is not None:
-                    hybrid_recs = hybrid_recommend(
-                        movie_title, movies_df, cosine_sim, indices, 
-                        user_preferences=user_prefs, top_n=num_recs
+                    hybrid_recs = cache.get_or_compute(
+                        "hybrid",
+                        lambda: hybrid_recommend(
+                            movie_title.strip(), movies_df, cosine_sim, indices, 
+                            user_preferences=user_prefs, top_n=num_recs, trending=trending, ann=models.get('ann')
+                        ),
+                        title=movie_title.strip(), preferences=user_prefs, top_n=num_recs,
+                        trending=blend_trending, mode=CONTENT_SEARCH_MODE
                     )
                     
                     if isinstance(hybrid_recs, str):
@@ -283,19 +493,54 @@ def main():
                     elif not hybrid_recs.empty:
                         st.success("🎉 Here are your personalized recommendations!")
                         
-                        for _, row in hybrid_recs.iterrows():
+                        posters = _prefetch_posters(hybrid_recs)
+                        for (_, row), poster in zip(hybrid_recs.iterrows(), posters):
                             final_score = row.get('final_score', row.get('similarity_score', 0))
                             _render_movie_row(
                                 row["title"], row["genres"], row["year"], 
                                 similarity_score=final_score,
                                 avg_rating=row.get("avg_rating"), 
-                                rating_count=row.get("rating_count")
+                                rating_count=row.get("rating_count"),
+                                poster=poster
                             )
                     else:
                         st.warning("No recommendations found!")
                 else:
                     st.warning("⚠️ Personalized recommendations not available. Please check data loading.")
     
+    elif page == "👤 Recommendations for a User":
+        st.header("Personalized Recommendations (Matrix Factorization)")
+        st.info("Latent-factor model trained with alternating least squares on all ratings.")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            user_id = st.number_input("User ID", min_value=1, value=1, step=1)
+        with col2:
+            num_recs = st.slider("Number of recommendations", 5, 20, 10)
+        
+        if st.button("👤 Recommend for this User"):
+            if models.get('als') is not None:
+                user_recs = cache.get_or_compute(
+                    "als", lambda: als_recommend(int(user_id), movies_df, models['als'], top_n=num_recs),
+                    user_id=int(user_id), top_n=num_recs
+                )
+                
+                if not user_recs.empty:
+                    st.success(f"🎉 Top {len(user_recs)} movies for user {int(user_id)}")
+                    posters = _prefetch_posters(user_recs)
+                    for (_, row), poster in zip(user_recs.iterrows(), posters):
+                        _render_movie_row(
+                            row["title"], row["genres"], row["year"], 
+                            similarity_score=row["predicted_rating"] / 5.0,
+                            avg_rating=row.get("avg_rating"), 
+                            rating_count=row.get("rating_count"),
+                            poster=poster
+                        )
+                else:
+                    st.warning(f"No ratings found for user {int(user_id)}!")
+            else:
+                st.warning("⚠️ Matrix factorization model not available. Please check data loading.")
+    
     # Footer
     st.markdown("---")
     st.markdown("*Powered by MovieLens 100K Dataset & Content-Based Filtering*")
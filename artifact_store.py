@@ -0,0 +1,181 @@
+# artifact_store.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from config import ARTIFACT_DIR, ARTIFACT_VERSION, ARTIFACT_HASH_SOURCES
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(paths, use_hash=ARTIFACT_HASH_SOURCES):
+    """Fingerprint của các file nguồn: size + mtime, hoặc sha1 nội dung nếu use_hash"""
+    fingerprint = {}
+    for path in paths:
+        stat = os.stat(path)
+        entry = {"size": stat.st_size}
+        if use_hash:
+            entry["sha1"] = _file_sha1(path)
+        else:
+            entry["mtime_ns"] = stat.st_mtime_ns
+        fingerprint[os.path.normpath(path)] = entry
+    return fingerprint
+
+
+def frame_digest(df, columns=None):
+    """sha1 ngắn của nội dung các cột, dùng làm khóa cho artifact dẫn xuất từ frame"""
+    digest = hashlib.sha1(str(len(df)).encode())
+    for col in (columns if columns is not None else df.columns):
+        values = df[col]
+        digest.update(str(col).encode())
+        if values.dtype.kind in "biuf":
+            digest.update(np.ascontiguousarray(values.to_numpy()).tobytes())
+        else:
+            digest.update("\x1f".join(values.fillna("").astype(str)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def save_frame(path, df):
+    """Lưu DataFrame thành thư mục, mỗi cột một file .npy (chuỗi là mảng unicode cố định)"""
+    os.makedirs(path, exist_ok=True)
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if values.dtype.kind in "biuf":
+            array = values.to_numpy()
+        else:
+            array = values.fillna("").to_numpy(dtype=str)
+        np.save(os.path.join(path, f"{i}.npy"), array, allow_pickle=False)
+
+
+def load_frame(path, columns, mmap=True):
+    """
+    Đọc lại DataFrame đã lưu bằng save_frame theo thứ tự cột cho trước
+
+    Với mmap=True các cột số được memory-map read-only: mọi session/process
+    cùng đọc một file dùng chung page cache của OS thay vì mỗi nơi một bản copy.
+    """
+    data = {}
+    for i, col in enumerate(columns):
+        array = np.load(os.path.join(path, f"{i}.npy"), mmap_mode="r" if mmap else None, allow_pickle=False)
+        data[col] = array if array.dtype.kind in "biuf" else np.asarray(array)
+    return pd.DataFrame(data, copy=False)
+
+
+def publish_arrays(path, arrays, meta=None):
+    """
+    Ghi một nhóm mảng thành thư mục các file .npy để process khác attach bằng mmap
+
+    meta.json (kèm meta truyền vào) được ghi sau cùng và bị xóa trước khi thay
+    file, nên reader không bao giờ thấy một lần ghi dở dang là hợp lệ.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, "meta.json")
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=path)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in arrays:
+            os.replace(os.path.join(tmp_dir, f"{name}.npy"), os.path.join(path, f"{name}.npy"))
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({**(meta or {}), "arrays": list(arrays)}, f, indent=2)
+        os.replace(os.path.join(tmp_dir, "meta.json"), meta_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return path
+
+
+def attach_arrays(path, mmap=True):
+    """Đọc (meta, dict mảng) đã ghi bằng publish_arrays, None nếu chưa có hoặc ghi dở"""
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None, allow_pickle=False)
+            for name in meta["arrays"]
+        }
+        return meta, arrays
+    except Exception as e:
+        print(f"Warning: Ignoring invalid shared artifact {path}: {e}")
+        return None
+
+
+def load_artifacts(sources, artifact_dir=ARTIFACT_DIR):
+    """
+    Đọc các frame đã cache nếu artifact còn hợp lệ
+
+    Trả về dict name -> DataFrame, hoặc None nếu chưa có cache, khác version
+    hoặc file nguồn đã thay đổi.
+    """
+    manifest_path = os.path.join(artifact_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != ARTIFACT_VERSION:
+            return None
+        use_hash = manifest.get("use_hash", False)
+        if manifest.get("sources") != source_fingerprint(sources, use_hash=use_hash):
+            return None
+
+        return {
+            name: load_frame(os.path.join(artifact_dir, name), columns)
+            for name, columns in manifest["frames"].items()
+        }
+    except Exception as e:
+        print(f"Warning: Ignoring invalid artifact cache: {e}")
+        return None
+
+
+def save_artifacts(frames, sources, artifact_dir=ARTIFACT_DIR):
+    """
+    Lưu các frame vào artifact store cùng manifest (version + fingerprint nguồn)
+
+    Ghi vào thư mục tạm rồi mới thay thế, manifest được ghi sau cùng nên
+    một lần ghi dở dang không bao giờ bị đọc như cache hợp lệ.
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=artifact_dir)
+    try:
+        for name, df in frames.items():
+            save_frame(os.path.join(tmp_dir, name), df)
+
+        manifest_path = os.path.join(artifact_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        for name in frames:
+            # File cũ có thể đang được process khác mmap: chỉ unlink, không ghi đè nội dung
+            target = os.path.join(artifact_dir, name)
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(os.path.join(tmp_dir, name), target)
+
+        manifest = {
+            "version": ARTIFACT_VERSION,
+            "use_hash": ARTIFACT_HASH_SOURCES,
+            "sources": source_fingerprint(sources),
+            "frames": {name: list(df.columns) for name, df in frames.items()},
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(os.path.join(tmp_dir, MANIFEST_NAME), manifest_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return artifact_dir
@@ -0,0 +1,70 @@
+# benchmarks/bench_ann.py
+"""
+Đo recall@K và QPS của ANN index (IVF) so với quét exact, theo kích thước catalog và n_probe
+
+Catalog lớn được tạo bằng cách nhân bản embedding của MovieLens 100K rồi thêm
+nhiễu nhỏ (để các bản sao không trùng nhau) và chuẩn hóa lại. Ground truth là
+top-K của backend exact trên cùng vectors; query là các phim ngẫu nhiên trong
+catalog (bỏ chính phim đó).
+Chạy từ thư mục gốc của project:
+    python -m benchmarks.bench_ann [--sizes 1682 20000 100000] [--probes 1 4 8 16 32]
+"""
+import argparse
+import time
+import numpy as np
+from config import NEIGHBOR_INDEX_PATH, DEFAULT_TOP_N
+from data_loader import load_data
+from recommend import build_similarity_matrix
+from ann_index import build_ann_index
+
+NOISE = 0.05
+N_QUERIES = 200
+
+
+def _catalog(base, size, rng):
+    vectors = base[np.resize(np.arange(len(base)), size)]
+    if size > len(base):
+        vectors = vectors + rng.normal(scale=NOISE, size=vectors.shape).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def _run(index, vectors, queries, k, n_probe=None):
+    """(kết quả của mỗi query, QPS)"""
+    start = time.perf_counter()
+    results = [index.search(vectors[q], k, n_probe=n_probe, exclude=q)[0] for q in queries]
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ANN recall/QPS")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_682, 20_000, 100_000])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_N)
+    args = parser.parse_args()
+
+    movies_df, _, _ = load_data(with_ratings=False)
+    neighbor_index, _ = build_similarity_matrix(movies_df, index_path=NEIGHBOR_INDEX_PATH)
+    base = np.asarray(neighbor_index.vectors)
+    rng = np.random.default_rng(0)
+
+    print(f"{'items':>8} {'backend':>8} {'lists':>6} {'n_probe':>8} {'build s':>8} {f'recall@{args.k}':>10} {'QPS':>8}")
+    for size in args.sizes:
+        vectors = _catalog(base, size, rng)
+        queries = rng.choice(size, min(N_QUERIES, size), replace=False)
+
+        exact = build_ann_index(vectors, "exact")
+        truth, exact_qps = _run(exact, vectors, queries, args.k)
+        print(f"{size:>8} {'exact':>8} {'-':>6} {'-':>8} {0:>8.2f} {1:>10.3f} {exact_qps:>8.0f}")
+
+        start = time.perf_counter()
+        ivf = build_ann_index(vectors, "ivf")
+        build_s = time.perf_counter() - start
+        for n_probe in args.probes:
+            found, qps = _run(ivf, vectors, queries, args.k, n_probe)
+            recall = np.mean([len(np.intersect1d(a, b)) / max(len(a), 1) for a, b in zip(truth, found)])
+            print(f"{size:>8} {'ivf':>8} {ivf.n_lists:>6} {n_probe:>8} {build_s:>8.2f} {recall:>10.3f} {qps:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
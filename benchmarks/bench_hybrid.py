@@ -0,0 +1,155 @@
+# benchmarks/bench_hybrid.py
+"""
+Đo latency hybrid_recommend so với cách cũ (rerank top_n*2 láng giềng)
+
+Hai cách chấm hybrid được đo: scan (tính similarity cho toàn catalog) và
+hybrid (mặc định: chỉ chấm các phim vượt được cận trên, kết quả giống hệt
+scan; benchmark kiểm tra điều này). Mỗi cách được đo ROUNDS lượt, lấy lượt nhanh nhất. Catalog lớn được tạo bằng cách
+nhân bản MovieLens 100K, neighbor index là top-K exact của các bản sao.
+Benchmark thất bại (exit 1) nếu hybrid chậm hơn rerank ở kích thước nào đó.
+Chạy từ thư mục gốc của project:
+    python -m benchmarks.bench_hybrid
+"""
+import contextlib
+import sys
+import time
+import numpy as np
+import pandas as pd
+from config import NEIGHBOR_TOP_K, SIMILARITY_WEIGHT, RATING_SCORE_WEIGHT, PREFERENCE_WEIGHT, GENRE_COLS
+from data_loader import load_data
+from neighbor_index import NeighborIndex
+import recommend as recommend_module
+from recommend import build_similarity_matrix, hybrid_recommend, recommend, _genre_masks
+from topk import top_k
+from utils import genre_mask, popcount32
+
+CATALOG_SIZES = [1_682, 10_000, 62_000, 250_000]
+TOP_N = 10
+ROUNDS = 3
+PREFERENCES = {"genres": ["Comedy", "Drama"], "year_range": [1990, 1998]}
+
+
+def _legacy_hybrid(title, movies_df, cosine_sim, indices, user_preferences, top_n):
+    """Cách cũ: chỉ rerank top_n*2 láng giềng content-based bằng các cột pandas"""
+    content_recs = recommend(title, movies_df, cosine_sim, indices, top_n * 2, return_scores=True)
+    positions = movies_df.index.get_indexer(content_recs.index)
+    preferred_mask = genre_mask(user_preferences.get('genres', []), GENRE_COLS)
+    content_recs['bonus_score'] = popcount32(_genre_masks(movies_df)[positions] & preferred_mask) * 0.1
+    year_range = user_preferences['year_range']
+    year_mask = (content_recs['year'].notna() &
+                 (content_recs['year'] >= year_range[0]) &
+                 (content_recs['year'] <= year_range[1]))
+    content_recs.loc[year_mask, 'bonus_score'] += 0.05
+    content_recs['rating_score'] = content_recs['avg_rating'].fillna(3.0) / 5.0
+    content_recs['final_score'] = (
+        content_recs['similarity_score'].fillna(0) * SIMILARITY_WEIGHT +
+        content_recs['rating_score'] * RATING_SCORE_WEIGHT +
+        content_recs['bonus_score'] * PREFERENCE_WEIGHT
+    )
+    order = top_k(content_recs['final_score'].to_numpy(), top_n, tiebreak=content_recs['rating_count'].to_numpy())
+    return content_recs.iloc[order]
+
+
+def _tiled_neighbors(base_vectors, n, k):
+    """
+    Top-k láng giềng exact của catalog n phim gồm các bản sao base_vectors (phim i là bản sao của i % m)
+
+    Similarity giữa hai phim chỉ phụ thuộc phim gốc, nên chỉ cần sắp xếp hàng
+    similarity của m phim gốc rồi trải ra các bản sao thay vì nhân n x n.
+    """
+    m = len(base_vectors)
+    base_sim = np.asarray(base_vectors) @ np.asarray(base_vectors).T
+    copies = np.arange(0, n, m)
+    heads = np.empty((m, k + 1), dtype=np.int64)
+    for b in range(m):
+        expanded = []
+        for j in np.argsort(-base_sim[b], kind='stable'):
+            expanded.extend(p for p in copies + j if p < n)
+            if len(expanded) > k:
+                break
+        heads[b] = expanded[:k + 1]
+    rows = heads[np.arange(n) % m]
+    # Bỏ chính phim đó (nếu có trong danh sách) rồi lấy k phần tử đầu, giữ nguyên thứ tự
+    keep = np.argsort(rows == np.arange(n)[:, None], axis=1, kind='stable')[:, :k]
+    neighbors = np.take_along_axis(rows, keep, axis=1).astype(np.int32)
+    scores = base_sim[np.arange(n)[:, None] % m, neighbors % m].astype(np.float32)
+    return neighbors, scores
+
+
+def _synthetic_catalog(movies_df, base_index, n):
+    reps = -(-n // len(movies_df))
+    catalog = pd.concat([movies_df] * reps, ignore_index=True).iloc[:n].reset_index(drop=True)
+    catalog['title'] = catalog['title'] + catalog.index.astype(str).str.zfill(7)
+    # Cột chuỗi liền một khối như khi đọc từ artifact store (concat tạo nhiều chunk Arrow)
+    for col in ('title', 'genres'):
+        catalog[col] = pd.Series(catalog[col].to_numpy(dtype=object), dtype='str')
+    neighbors, scores = _tiled_neighbors(base_index.vectors, n, NEIGHBOR_TOP_K)
+    vectors = np.tile(base_index.vectors, (reps, 1))[:n]
+    index = NeighborIndex(neighbors, scores, vectors=vectors)
+    indices = pd.Series(catalog.index, index=catalog['title'])
+    return catalog, index, indices
+
+
+@contextlib.contextmanager
+def _full_scan():
+    """Tắt cận trên của hybrid: similarity được tính cho toàn catalog"""
+    original = recommend_module._hybrid_candidates
+    recommend_module._hybrid_candidates = lambda *args: None
+    try:
+        yield
+    finally:
+        recommend_module._hybrid_candidates = original
+
+
+def _time_per_query(fn, titles, repeats, rounds=ROUNDS):
+    """ms mỗi truy vấn, lấy round nhanh nhất để bớt nhiễu của máy"""
+    fn(titles[0])  # warm-up: hash table của index title được build ở lần tra đầu tiên
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for i in range(repeats):
+            fn(titles[i % len(titles)])
+        best = min(best, (time.perf_counter() - start) / repeats * 1000)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(42)
+    movies_df, _, _ = load_data(with_ratings=False)
+    base_index, base_indices = build_similarity_matrix(movies_df)
+    print(f"{'catalog':>10} {'rerank ms':>10} {'scan ms':>10} {'hybrid ms':>10}")
+    slower, mismatched = [], []
+    for n in CATALOG_SIZES:
+        if n == len(movies_df):
+            catalog, index, indices = movies_df, base_index, base_indices
+        else:
+            catalog, index, indices = _synthetic_catalog(movies_df, base_index, n)
+        titles = catalog['title'].iloc[rng.integers(0, n, size=20)].tolist()
+        titles = [t for t in titles if t in indices]
+        repeats = max(50, 500_000 // n)
+        legacy_ms = _time_per_query(
+            lambda t: _legacy_hybrid(t, catalog, index, indices, PREFERENCES, TOP_N), titles, repeats)
+        hybrid_ms = _time_per_query(
+            lambda t: hybrid_recommend(t, catalog, index, indices, PREFERENCES, TOP_N), titles, repeats)
+        with _full_scan():
+            scan_ms = _time_per_query(
+                lambda t: hybrid_recommend(t, catalog, index, indices, PREFERENCES, TOP_N), titles, repeats)
+            expected = [hybrid_recommend(t, catalog, index, indices, PREFERENCES, TOP_N)['movieId'].tolist()
+                        for t in titles]
+        if [hybrid_recommend(t, catalog, index, indices, PREFERENCES, TOP_N)['movieId'].tolist()
+                for t in titles] != expected:
+            mismatched.append(n)
+        print(f"{n:>10,} {legacy_ms:>10.3f} {scan_ms:>10.3f} {hybrid_ms:>10.3f}")
+        if hybrid_ms > legacy_ms:
+            slower.append(n)
+
+    if mismatched:
+        print(f"hybrid differs from the full scan at catalog sizes {mismatched}")
+    if slower:
+        print(f"hybrid slower than rerank at catalog sizes {slower}")
+    if slower or mismatched:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_posters.py
+"""
+So sánh resolve poster tuần tự với get_poster_urls trên một server giả lập OMDb
+
+Server chạy ở localhost, trả JSON giống OMDb sau RESPONSE_DELAY giây; title chứa
+"slow" sẽ bị treo lâu hơn deadline để kiểm tra placeholder. Không cần API key thật;
+cache poster SQLite được đặt trong một thư mục tạm.
+Chạy từ thư mục gốc của project:
+    python -m benchmarks.bench_posters
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_DELAY = 0.2
+SLOW_DELAY = 3.0
+PAGE_SIZE = 20
+
+
+class FakeOMDbHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+    requests_seen = 0
+
+    def do_GET(self):
+        FakeOMDbHandler.connections.add(self.client_address)
+        FakeOMDbHandler.requests_seen += 1
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        title = query.get("t", [""])[0]
+        time.sleep(SLOW_DELAY if "slow" in title.lower() else RESPONSE_DELAY)
+        if title.lower().startswith("missing"):
+            payload = {"Response": "False", "Error": "Movie not found!"}
+        else:
+            payload = {"Title": title, "Year": query.get("y", ["N/A"])[0], "Response": "True",
+                       "Poster": f"http://posters.local/{urllib.parse.quote(title)}.jpg"}
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_omdb():
+    """Chạy server giả lập OMDb trên một port trống, trả về (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOMDbHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def main():
+    server, base_url = start_fake_omdb()
+    os.environ["OMDB_API_URL"] = base_url
+    os.environ.setdefault("OMDB_API_KEY", "bench")
+    os.environ["POSTER_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "posters.sqlite3")
+
+    import poster_service
+    cache = poster_service.get_poster_cache()
+
+    items = [(f"Movie {i}", 1990 + i % 10) for i in range(PAGE_SIZE)]
+
+    start = time.perf_counter()
+    sequential = [poster_service.get_poster_url(title, year) for title, year in items]
+    sequential_s = time.perf_counter() - start
+
+    cache.clear()
+    FakeOMDbHandler.connections.clear()
+    start = time.perf_counter()
+    batched = poster_service.get_poster_urls(items)
+    batched_s = time.perf_counter() - start
+    assert batched == sequential, "batch results differ from sequential results"
+
+    start = time.perf_counter()
+    poster_service.get_poster_urls(items)
+    warm_s = time.perf_counter() - start
+
+    cache.clear()
+    mixed = items[:5] + [("Slow Movie", 1995), ("Missing Movie", 1995)]
+    start = time.perf_counter()
+    results = poster_service.get_poster_urls(mixed, deadline=1.0)
+    deadline_s = time.perf_counter() - start
+
+    print(f"{PAGE_SIZE} posters, {RESPONSE_DELAY * 1000:.0f} ms per OMDb response")
+    print(f"  sequential get_poster_url: {sequential_s:.2f} s")
+    print(f"  get_poster_urls batch:     {batched_s:.2f} s ({len(FakeOMDbHandler.connections)} connections)")
+    print(f"  warm cache batch:          {warm_s * 1000:.1f} ms")
+    print(f"  batch with 1 s deadline and a hung request: {deadline_s:.2f} s")
+    print(f"    hung  -> {results[5]}")
+    print(f"    missing -> {results[6]}")
+
+    # Single-flight: nhiều thread cùng xin một title chỉ tạo một request OMDb
+    cache.clear()
+    FakeOMDbHandler.requests_seen = 0
+    threads = [threading.Thread(target=poster_service.get_poster_url, args=("Shared Movie", 1995))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"  10 concurrent lookups of one title -> {FakeOMDbHandler.requests_seen} OMDb request(s)")
+
+    # Negative cache: title không có poster không bị hỏi lại trong thời hạn TTL
+    FakeOMDbHandler.requests_seen = 0
+    for _ in range(3):
+        poster_service.get_poster_url("Missing Movie", 1995)
+    print(f"  3 lookups of a missing title -> {FakeOMDbHandler.requests_seen} OMDb request(s), cache {cache.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/bench_search.py
+"""
+Đo latency prefix search (autocomplete) và fuzzy search theo kích thước catalog
+
+Catalog lớn được tạo bằng cách nhân bản catalog MovieLens 100K và thêm hậu tố
+vào title. Chạy từ thư mục gốc của project:
+    python -m benchmarks.bench_search
+"""
+import time
+import numpy as np
+import pandas as pd
+from data_loader import load_data
+from search_index import TitleSearchIndex
+
+SCALES = [1, 5, 30, 60]
+PREFIX_QUERIES = ["t", "st", "sta", "star", "star t", "god", "the", "lo", "jura", "toy s"]
+FUZZY_QUERIES = ["toy stor", "star wars", "godfathr", "aladin", "jurasic park", "lion king", "terminator"]
+REPEATS = 50
+
+
+def _scaled_catalog(movies_df, scale):
+    big = pd.concat([movies_df] * scale, ignore_index=True)
+    big['movieId'] = np.arange(1, len(big) + 1)
+    copy_no = np.arange(len(big)) // len(movies_df)
+    big['title'] = [t if c == 0 else f"{t} {c}" for t, c in zip(big['title'], copy_no)]
+    return big
+
+
+def _ms_per_query(fn, queries):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for q in queries:
+            fn(q)
+    return (time.perf_counter() - start) / (REPEATS * len(queries)) * 1000
+
+
+def main():
+    movies_df, _, _ = load_data(with_ratings=False)
+    print(f"{'titles':>8} {'build s':>9} {'prefix ms':>10} {'fuzzy ms':>10}")
+    for scale in SCALES:
+        catalog = _scaled_catalog(movies_df, scale)
+        start = time.perf_counter()
+        index = TitleSearchIndex(catalog)
+        build_s = time.perf_counter() - start
+
+        prefix_ms = _ms_per_query(lambda q: index.prefix_search(q, 10), PREFIX_QUERIES)
+        fuzzy_ms = _ms_per_query(lambda q: index.fuzzy_search(q, 10, 60), FUZZY_QUERIES)
+        print(f"{len(catalog):>8,} {build_s:>9.2f} {prefix_ms:>10.3f} {fuzzy_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
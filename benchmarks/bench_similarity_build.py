@@ -0,0 +1,59 @@
+# benchmarks/bench_similarity_build.py
+"""
+Đo thời gian và bộ nhớ build neighbor index: in-memory vs build theo block ra file mmap
+
+Catalog lớn được tạo bằng cách nhân bản các phim của MovieLens 100K, vector là
+embedding của content model (embeddings.py). Cột peak MB là bộ nhớ cấp phát
+thêm tối đa (tracemalloc) của process cha trong lần build; khi workers > 1 mỗi
+worker giữ thêm khoảng một block x N.
+Chạy từ thư mục gốc của project:
+    python -m benchmarks.bench_similarity_build [--sizes 1682 10000 30000] [--workers 4]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from config import NEIGHBOR_TOP_K, NEIGHBOR_BUILD_WORKERS
+from data_loader import load_data
+from embeddings import build_item_embeddings
+from neighbor_index import build_neighbor_index, build_neighbor_index_on_disk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark build neighbor index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_682, 10_000, 30_000])
+    parser.add_argument("--workers", type=int, default=NEIGHBOR_BUILD_WORKERS)
+    args = parser.parse_args()
+
+    movies_df, _, _ = load_data(with_ratings=False)
+    out_dir = tempfile.mkdtemp(prefix="bench-neighbors-")
+
+    print(f"{'items':>8} {'method':>16} {'time s':>8} {'peak MB':>8}")
+    tracemalloc.start()
+    try:
+        for size in args.sizes:
+            catalog = movies_df.iloc[np.resize(np.arange(len(movies_df)), size)].reset_index(drop=True)
+            vectors = build_item_embeddings(catalog)
+            runs = [("in-memory", lambda: build_neighbor_index(vectors, k=NEIGHBOR_TOP_K))]
+            for workers in sorted({1, args.workers}):
+                path = os.path.join(out_dir, f"{size}-{workers}")
+                runs.append((f"on-disk x{workers}", lambda path=path, workers=workers: build_neighbor_index_on_disk(
+                    vectors, path, k=NEIGHBOR_TOP_K, workers=workers)))
+            for name, build in runs:
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                start = time.perf_counter()
+                build()
+                elapsed = time.perf_counter() - start
+                peak_mb = (tracemalloc.get_traced_memory()[1] - baseline) / 2**20
+                print(f"{size:>8} {name:>16} {elapsed:>8.2f} {peak_mb:>8.0f}")
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_startup.py
+"""
+Đo thời gian khởi động app: import module và cold start tới lần render đầu tiên
+
+Mỗi lần đo chạy trong một process Python mới (import lạnh, page cache của
+artifact đã ấm), ở chế độ mặc định và ở serve mode (RECOMMENDER_SERVE_MODE=1).
+First render là một lượt chạy app.py qua streamlit AppTest: import các module
+của app, load_context và render trang đầu (không tính import streamlit.testing).
+Cột cuối liệt kê các module nặng bị import trong lúc đó. Nên chạy
+`python build_artifacts.py` trước. Chạy từ thư mục gốc của project:
+    python -m benchmarks.bench_startup [--repeats 3] [--budget-ms 3000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["sklearn", "scipy", "plotly", "fuzzywuzzy", "matplotlib"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({"import_ms": (time.perf_counter() - start) * 1000}))
+"""
+
+RENDER_PROBE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+heavy = %r
+start = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=300).run()
+print(json.dumps({
+    "render_ms": (time.perf_counter() - start) * 1000,
+    "errors": [e.value for e in at.exception],
+    "heavy": [m for m in heavy if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+MODES = {"default": {}, "serve": {"RECOMMENDER_SERVE_MODE": "1"}}
+
+
+def _probe(code, env):
+    """Chạy code trong process mới, trả về (kết quả JSON dòng cuối, wall time ms của cả process)"""
+    start = time.perf_counter()
+    done = subprocess.run([sys.executable, "-W", "ignore", "-c", code], env=env, capture_output=True, text=True,
+                          check=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    return json.loads(done.stdout.strip().splitlines()[-1]), wall_ms
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start của app")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="thất bại (exit 1) nếu first render ở serve mode chậm hơn ngưỡng này")
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'import ms':>10} {'render ms':>10} {'process ms':>11}  heavy modules")
+    results = {}
+    for mode, extra_env in MODES.items():
+        env = dict(os.environ, **extra_env)
+        imports, renders, walls, heavy = [], [], [], []
+        for _ in range(args.repeats):
+            imports.append(_probe(IMPORT_PROBE, env)[0]["import_ms"])
+            render, wall_ms = _probe(RENDER_PROBE, env)
+            if render["errors"]:
+                raise SystemExit(f"{mode}: app raised {render['errors']}")
+            renders.append(render["render_ms"])
+            walls.append(wall_ms)
+            heavy = render["heavy"]
+        results[mode] = _median(renders)
+        print(f"{mode:>8} {_median(imports):>10.0f} {_median(renders):>10.0f} {_median(walls):>11.0f}  "
+              f"{', '.join(heavy) or '-'}")
+
+    if args.budget_ms is not None:
+        ok = results["serve"] <= args.budget_ms
+        print(f"serve first render {results['serve']:.0f} ms vs budget {args.budget_ms:.0f} ms: {'OK' if ok else 'OVER'}")
+        if not ok:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
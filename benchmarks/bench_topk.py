@@ -0,0 +1,44 @@
+# benchmarks/bench_topk.py
+"""
+Đo latency mỗi query của top-K kernel so với cách cũ (Python sorted cả hàng)
+
+Chạy từ thư mục gốc của project:
+    python -m benchmarks.bench_topk
+"""
+import time
+import numpy as np
+from topk import top_k
+
+CATALOG_SIZES = [1_682, 10_000, 62_000, 250_000, 1_000_000]
+TOP_N = 10
+
+
+def _legacy_top_n(row, top_n):
+    sim_scores = list(enumerate(row))
+    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1:top_n+1]
+    return [i[0] for i in sim_scores]
+
+
+def _time_per_query(fn, rows, repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        fn(rows[i % len(rows)], i % len(rows))
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'catalog':>10} {'legacy ms':>12} {'top_k ms':>10} {'speedup':>9}")
+    for n in CATALOG_SIZES:
+        # Điểm similarity lượng tử hóa để có nhiều giá trị bằng nhau như TF-IDF genres
+        rows = np.round(rng.random((4, n)), 2).astype(np.float32)
+        repeats = max(3, 200_000 // n)
+
+        legacy_repeats = max(1, repeats // 10)
+        legacy_ms = _time_per_query(lambda row, _: _legacy_top_n(row, TOP_N), rows, legacy_repeats)
+        kernel_ms = _time_per_query(lambda row, idx: top_k(row, TOP_N, exclude=idx), rows, repeats)
+        print(f"{n:>10,} {legacy_ms:>12.3f} {kernel_ms:>10.3f} {legacy_ms / kernel_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# benchmarks/evaluate.py
+"""
+Đánh giá offline các recommender trên các split có sẵn của MovieLens 100K
+
+Mỗi split (u1..u5, ua, ub) được train trên file .base và đo trên file .test:
+precision@k, recall@k, NDCG@k (phim test có rating >= RELEVANT_RATING là relevant),
+RMSE với các model dự đoán được rating, cùng thời gian build, peak memory
+(tracemalloc) và số query/giây. Các split chạy song song trên nhiều process,
+kết quả ghi ra JSON để so sánh chất lượng/latency giữa các phiên bản.
+
+Chạy từ thư mục gốc của project:
+    python -m benchmarks.evaluate --k 10 --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from config import BASE_DIR, GENRE_COLS
+from data_loader import load_data, read_ratings
+from recommend import build_similarity_matrix, recommend, hybrid_recommend, als_recommend
+from collaborative import build_item_cf_index, build_rating_matrix
+from matrix_factorization import train_als
+from topk import top_k
+
+SPLITS = ["u1", "u2", "u3", "u4", "u5", "ua", "ub"]
+RELEVANT_RATING = 4
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "evaluation.json")
+
+
+def _with_split_stats(movies_df, movie_stats):
+    """Tính lại avg_rating/rating_count chỉ từ ratings của tập base để tránh rò rỉ tập test"""
+    movies = movies_df.drop(columns=["avg_rating", "rating_count"])
+    movies = movies.merge(movie_stats, on="movieId", how="left")
+    movies["avg_rating"] = movies["avg_rating"].fillna(3.0)
+    movies["rating_count"] = movies["rating_count"].fillna(0)
+    return movies
+
+
+def _ranking_metrics(recommended, relevant, k):
+    hits = np.isin(recommended[:k], list(relevant))
+    dcg = float((hits / np.log2(np.arange(2, len(hits) + 2))).sum())
+    ideal = float((1.0 / np.log2(np.arange(2, min(len(relevant), k) + 2))).sum())
+    return hits.sum() / k, hits.sum() / len(relevant), dcg / ideal
+
+
+def _positions(result, movies):
+    if result is None or result.empty:
+        return np.empty(0, dtype=np.int64)
+    return movies.index.get_indexer(result.index)
+
+
+def _unseen(positions, seen, k):
+    return positions[~np.isin(positions, seen)][:k]
+
+
+class _SplitData:
+    """Ratings base/test của một split đã map sang vị trí user/item"""
+
+    def __init__(self, name, movies_df):
+        base, base_stats = read_ratings(os.path.join(BASE_DIR, f"{name}.base"))
+        test, _ = read_ratings(os.path.join(BASE_DIR, f"{name}.test"))
+        self.base = base
+        self.movies = _with_split_stats(movies_df, base_stats)
+        self.train, self.user_ids = build_rating_matrix(base, self.movies)
+
+        movie_pos = pd.Series(np.arange(len(self.movies)), index=self.movies["movieId"].to_numpy())
+        user_pos = pd.Series(np.arange(len(self.user_ids)), index=self.user_ids)
+        test = test[test["userId"].isin(self.user_ids) & test["movieId"].isin(movie_pos.index)]
+        self.test_users = user_pos.reindex(test["userId"].to_numpy()).to_numpy()
+        self.test_items = movie_pos.reindex(test["movieId"].to_numpy()).to_numpy()
+        self.test_ratings = test["rating"].to_numpy(dtype=np.float64)
+
+        self.relevant = {}
+        liked = self.test_ratings >= RELEVANT_RATING
+        for user, item in zip(self.test_users[liked], self.test_items[liked]):
+            self.relevant.setdefault(int(user), set()).add(int(item))
+
+    def seen(self, user):
+        return self.train.indices[self.train.indptr[user]:self.train.indptr[user + 1]]
+
+    def user_ratings(self, user):
+        return self.train.data[self.train.indptr[user]:self.train.indptr[user + 1]]
+
+    def seed_item(self, user):
+        """Phim user chấm cao nhất trong tập base (bằng điểm thì lấy phim phổ biến hơn)"""
+        seen = self.seen(user)
+        counts = self.movies["rating_count"].to_numpy()[seen]
+        return int(seen[np.lexsort((-counts, -self.user_ratings(user)))[0]])
+
+    def preferences(self, user):
+        """Preferences cho hybrid: 3 genre xuất hiện nhiều nhất và khoảng năm của các phim user thích"""
+        seen = self.seen(user)
+        liked = seen[self.user_ratings(user) >= RELEVANT_RATING]
+        if liked.size == 0:
+            liked = seen
+        masks = self.movies["genre_mask"].to_numpy()[liked]
+        genre_counts = [(int(((masks >> bit) & 1).sum()), name) for bit, name in enumerate(GENRE_COLS)]
+        genres = [name for count, name in sorted(genre_counts, reverse=True)[:3] if count > 0]
+        years = self.movies["year"].to_numpy()[liked]
+        years = years[~np.isnan(years)]
+        year_range = (int(np.percentile(years, 10)), int(np.percentile(years, 90))) if years.size else None
+        return {"genres": genres, "year_range": year_range}
+
+
+def _content_model(data):
+    cosine_sim, indices = build_similarity_matrix(data.movies)
+    titles = data.movies["title"].fillna("unknown").to_numpy()
+
+    def rank(user, k):
+        seen = data.seen(user)
+        recs = recommend(titles[data.seed_item(user)], data.movies, cosine_sim, indices, top_n=k + len(seen))
+        return _unseen(_positions(recs, data.movies), seen, k)
+
+    return rank, None
+
+
+def _hybrid_model(data):
+    cosine_sim, indices = build_similarity_matrix(data.movies)
+    titles = data.movies["title"].fillna("unknown").to_numpy()
+
+    def rank(user, k):
+        seen = data.seen(user)
+        recs = hybrid_recommend(titles[data.seed_item(user)], data.movies, cosine_sim, indices,
+                                user_preferences=data.preferences(user), top_n=k + len(seen))
+        return _unseen(_positions(recs, data.movies), seen, k)
+
+    return rank, None
+
+
+def _item_cf_model(data):
+    """Item-item CF: điểm của item = tổng sim x (rating - mean của user) qua các phim user đã xem"""
+    cf_index = build_item_cf_index(data.base, data.movies)
+    n_items = len(cf_index)
+    valid = cf_index.neighbors >= 0
+    rows = np.repeat(np.arange(n_items), cf_index.neighbors.shape[1])[valid.ravel()]
+    sim = sp.csr_matrix((cf_index.scores[valid], (rows, cf_index.neighbors[valid])), shape=(n_items, n_items))
+
+    train = data.train
+    counts = np.diff(train.indptr)
+    means = np.asarray(train.sum(axis=1)).ravel() / np.maximum(counts, 1)
+    centered = train.copy()
+    centered.data -= np.repeat(means, counts).astype(np.float32)
+    rated = train.copy()
+    rated.data = np.ones_like(rated.data)
+
+    def rank(user, k):
+        scores = np.asarray((centered[user] @ sim).todense()).ravel()
+        scores[scores <= 0] = np.nan
+        return top_k(scores, k, exclude=data.seen(user))
+
+    def predict(users, items):
+        numerator = np.asarray((centered[users] @ sim)[np.arange(len(users)), items]).ravel()
+        denominator = np.asarray((rated[users] @ abs(sim))[np.arange(len(users)), items]).ravel()
+        fallback = data.movies["avg_rating"].to_numpy()[items]
+        return np.where(denominator > 0, means[users] + numerator / np.maximum(denominator, 1e-9), fallback)
+
+    return rank, predict
+
+
+def _als_model(data):
+    model = train_als(data.base, data.movies)
+
+    def rank(user, k):
+        recs = als_recommend(int(data.user_ids[user]), data.movies, model, top_n=k)
+        return _positions(recs, data.movies)
+
+    def predict(users, items):
+        scores = (model.user_factors[users] * model.item_factors[items]).sum(axis=1) + model.global_mean
+        return np.clip(scores, 1.0, 5.0)
+
+    return rank, predict
+
+
+MODELS = {
+    "content": _content_model,
+    "hybrid": _hybrid_model,
+    "item_cf": _item_cf_model,
+    "als": _als_model,
+}
+
+
+def evaluate_split(name, k=10, models=None):
+    """Build và đánh giá các model trên một split, trả về dict model -> metrics"""
+    movies_df, _, _ = load_data(with_ratings=False)
+    data = _SplitData(name, movies_df)
+    results = {"users": len(data.relevant), "test_ratings": int(len(data.test_ratings))}
+
+    baseline = data.movies["avg_rating"].to_numpy()[data.test_items]
+    results["item_mean"] = {"rmse": float(np.sqrt(np.mean((baseline - data.test_ratings) ** 2)))}
+
+    for model_name in models or MODELS:
+        tracemalloc.start()
+        start = time.perf_counter()
+        rank, predict = MODELS[model_name](data)
+        build_seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        precision, recall, ndcg = [], [], []
+        start = time.perf_counter()
+        for user, relevant in data.relevant.items():
+            p, r, n = _ranking_metrics(np.asarray(rank(user, k)), relevant, k)
+            precision.append(p)
+            recall.append(r)
+            ndcg.append(n)
+        query_seconds = time.perf_counter() - start
+
+        rmse = None
+        if predict is not None:
+            predictions = predict(data.test_users, data.test_items)
+            rmse = float(np.sqrt(np.mean((predictions - data.test_ratings) ** 2)))
+
+        results[model_name] = {
+            f"precision@{k}": float(np.mean(precision)),
+            f"recall@{k}": float(np.mean(recall)),
+            f"ndcg@{k}": float(np.mean(ndcg)),
+            "rmse": rmse,
+            "build_seconds": build_seconds,
+            "peak_memory_mb": peak / 2 ** 20,
+            "queries_per_second": len(data.relevant) / query_seconds if query_seconds > 0 else None,
+        }
+    return name, results
+
+
+def _summarize(split_results):
+    """Trung bình các metric của mỗi model qua các split"""
+    summary = {}
+    for results in split_results.values():
+        for model_name, metrics in results.items():
+            if not isinstance(metrics, dict):
+                continue
+            for metric, value in metrics.items():
+                if value is not None:
+                    summary.setdefault(model_name, {}).setdefault(metric, []).append(value)
+    return {model: {metric: float(np.mean(values)) for metric, values in metrics.items()}
+            for model, metrics in summary.items()}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline evaluation on MovieLens 100K splits")
+    parser.add_argument("--splits", nargs="+", default=SPLITS, choices=SPLITS)
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args(argv)
+
+    # Warm artifact cache một lần trước khi các process con cùng đọc
+    load_data()
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(args.splits)))) as pool:
+        futures = [pool.submit(evaluate_split, name, args.k, args.models) for name in args.splits]
+        split_results = dict(future.result() for future in futures)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "k": args.k,
+        "relevant_rating": RELEVANT_RATING,
+        "wall_seconds": time.perf_counter() - start,
+        "splits": split_results,
+        "mean": _summarize(split_results),
+    }
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'model':>10} {'P@k':>7} {'R@k':>7} {'NDCG':>7} {'RMSE':>7} {'build s':>8} {'peak MB':>8} {'QPS':>8}")
+    for model_name, metrics in report["mean"].items():
+        if model_name not in MODELS:
+            print(f"{model_name:>10} {'':>7} {'':>7} {'':>7} {metrics['rmse']:>7.4f}")
+            continue
+        rmse = metrics.get("rmse")
+        print(f"{model_name:>10} {metrics[f'precision@{args.k}']:>7.4f} {metrics[f'recall@{args.k}']:>7.4f} "
+              f"{metrics[f'ndcg@{args.k}']:>7.4f} {rmse if rmse is not None else float('nan'):>7.4f} "
+              f"{metrics['build_seconds']:>8.2f} {metrics['peak_memory_mb']:>8.1f} "
+              f"{metrics['queries_per_second']:>8.0f}")
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
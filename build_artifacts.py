@@ -0,0 +1,60 @@
+# build_artifacts.py
+"""
+Build sẵn mọi artifact mà app / service cần để khởi động ở serve mode
+
+Gồm artifact dữ liệu (kèm bảng analytics), neighbor index content-based,
+ANN index, item-CF index và model ALS. Sau đó chạy với RECOMMENDER_SERVE_MODE=1
+để chỉ memory-map các artifact này, không import sklearn và không fit/train:
+    python build_artifacts.py [--workers 8]
+    RECOMMENDER_SERVE_MODE=1 streamlit run app.py
+
+Neighbor index được build theo block trên --workers process; nếu bị ngắt
+(Ctrl+C, crash) thì chạy lại lệnh để build tiếp từ block còn thiếu.
+"""
+import argparse
+import time
+from config import NEIGHBOR_INDEX_PATH, CF_INDEX_PATH, ALS_MODEL_DIR, NEIGHBOR_BUILD_WORKERS
+from data_loader import load_data
+from rating_ingest import RatingIngestor
+from recommend import build_similarity_matrix
+from collaborative import build_item_cf_index
+from matrix_factorization import load_or_train_als
+from ann_index import load_or_build_ann_index
+
+
+def _step(name, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{name:<22} {time.perf_counter() - start:7.2f}s")
+    return result
+
+
+def _progress(name):
+    start = time.perf_counter()
+
+    def report(done, total):
+        print(f"\r  {name}: {done}/{total} blocks ({done / max(total, 1):.0%}) {time.perf_counter() - start:.1f}s",
+              end="\n" if done == total else "", flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build sẵn artifact cho serve mode")
+    parser.add_argument("--workers", type=int, default=NEIGHBOR_BUILD_WORKERS, help="số process build neighbor index")
+    args = parser.parse_args()
+
+    movies_df, ratings, _ = _step("data artifacts", load_data)
+    # Giống app: model được build trên ratings gốc cộng các rating trong log
+    ingestor = RatingIngestor(movies_df, ratings)
+    movies_df, ratings = ingestor.movies_df, ingestor.ratings
+
+    neighbor_index, _ = _step("neighbor index", lambda: build_similarity_matrix(
+        movies_df, index_path=NEIGHBOR_INDEX_PATH, allow_build=True, workers=args.workers,
+        progress=_progress("neighbor index")))
+    _step("ANN index", lambda: load_or_build_ann_index(neighbor_index, allow_build=True))
+    _step("item-CF index", lambda: build_item_cf_index(ratings, movies_df, index_path=CF_INDEX_PATH, allow_build=True))
+    _step("ALS model", lambda: load_or_train_als(ratings, movies_df, ALS_MODEL_DIR, allow_train=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# collaborative.py
+import numpy as np
+import pandas as pd
+from config import (
+    CF_TOP_K, CF_BLOCK_SIZE, CF_SHRINKAGE, CF_MIN_COMMON_USERS, CF_DELTA_COMPACT_RATIO, DEFAULT_TOP_N, SERVE_MODE
+)
+from neighbor_index import NeighborIndex
+from artifact_store import frame_digest
+from topk import top_k_rows
+
+
+def build_rating_matrix(ratings, movies_df):
+    """
+    Tạo ma trận CSR user x item (float32) từ bảng ratings
+
+    Cột j tương ứng với hàng j của movies_df (map qua movieId), hàng là userId
+    đã được đánh số lại liên tục. Rating của phim không có trong movies_df bị bỏ qua.
+
+    Returns:
+        (matrix, user_ids) với user_ids[i] là userId của hàng i
+    """
+    import scipy.sparse as sp  # chỉ cần khi build/refresh, serve từ index đã lưu không phải import
+    movie_pos = pd.Series(np.arange(len(movies_df)), index=movies_df['movieId'].to_numpy())
+    cols = movie_pos.reindex(ratings['movieId'].to_numpy()).to_numpy()
+    known = ~np.isnan(cols)
+
+    user_ids, rows = np.unique(ratings['userId'].to_numpy()[known], return_inverse=True)
+    values = ratings['rating'].to_numpy(dtype=np.float32)[known]
+    matrix = sp.csr_matrix(
+        (values, (rows.ravel(), cols[known].astype(np.int64))),
+        shape=(len(user_ids), len(movies_df)), dtype=np.float32,
+    )
+    matrix.sum_duplicates()
+    return matrix, user_ids
+
+
+def _center_by_user(matrix):
+    """Trừ rating trung bình của mỗi user khỏi các rating của user đó (adjusted cosine)"""
+    centered = matrix.copy()
+    counts = np.diff(centered.indptr)
+    sums = np.asarray(centered.sum(axis=1)).ravel()
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    centered.data -= np.repeat(means, counts).astype(np.float32)
+    return centered
+
+
+def _similarity_operands(ratings, movies_df):
+    """Các ma trận item x user (chuẩn hóa) và item x user (0/1 đã rating) dùng để tính similarity"""
+    import scipy.sparse as sp
+    matrix, _ = build_rating_matrix(ratings, movies_df)
+    centered = _center_by_user(matrix)
+
+    # Item x user, mỗi hàng chuẩn hóa L2
+    items = centered.T.tocsr()
+    norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=1)).ravel())
+    inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    items = sp.diags(inv_norms.astype(np.float32)) @ items
+
+    rated = matrix.T.tocsr()
+    rated.data = np.ones_like(rated.data)
+    return items, items.T.tocsr(), rated, rated.T.tocsr()
+
+
+def _similarity_block(operands, rows, shrinkage, min_common):
+    """Similarity đã shrink của các phim rows với mọi phim; cặp không hợp lệ (và chính nó) là -inf"""
+    items, items_t, rated, rated_t = operands
+    sim = (items[rows] @ items_t).toarray()
+    common = (rated[rows] @ rated_t).toarray()
+    return _shrink(sim, common, rows, shrinkage, min_common)
+
+
+def _shrink(sim, common, rows, shrinkage, min_common):
+    sim *= common / (common + shrinkage)
+    sim[(common < min_common) | (sim <= 0)] = -np.inf
+    sim[np.arange(len(rows)), rows] = -np.inf
+    return sim
+
+
+class ItemCFOperands:
+    """
+    Ma trận rating cho refresh item-CF, cập nhật theo từng batch rating mới
+
+    Giữ ma trận CSR gốc (user x item và item x user) cộng một phần delta nhỏ
+    chứa các rating mới, cùng rating trung bình của mỗi user và bình phương
+    chuẩn (sau khi trừ trung bình) của mỗi item. update() chỉ tính lại các
+    giá trị đó cho user có rating mới và các item họ đã rating, nên tốn
+    O(batch + lịch sử của các user đó) thay vì build lại từ toàn bộ ratings.
+    Similarity của một block phim chỉ cần hàng của các user đã rating chúng.
+    Delta được gộp vào ma trận gốc khi vượt CF_DELTA_COMPACT_RATIO số rating gốc.
+    """
+
+    def __init__(self, ratings, movies_df, compact_ratio=CF_DELTA_COMPACT_RATIO):
+        self.compact_ratio = compact_ratio
+        matrix, user_ids = build_rating_matrix(ratings, movies_df)
+        self._movie_pos = pd.Index(movies_df['movieId'].to_numpy())
+        self._user_pos = {int(user_id): row for row, user_id in enumerate(user_ids)}
+        self._set_base(matrix)
+        self.means = self._row_means(matrix)
+        self.norms2 = np.zeros(matrix.shape[1])
+        self._add_norms(matrix, np.arange(matrix.shape[0]), 1.0)
+
+    @property
+    def shape(self):
+        return self.base.shape
+
+    def _set_base(self, matrix):
+        import scipy.sparse as sp
+        self.base = matrix
+        self.base_t = matrix.T.tocsr()
+        self._delta = [np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)]
+        self.delta = sp.csr_matrix(matrix.shape, dtype=np.float32)
+        self.delta_t = sp.csr_matrix(matrix.shape[::-1], dtype=np.float32)
+
+    @staticmethod
+    def _row_means(matrix):
+        counts = np.diff(matrix.indptr)
+        sums = np.asarray(matrix.sum(axis=1, dtype=np.float64)).ravel()
+        return np.divide(sums, counts, out=np.zeros(len(counts)), where=counts > 0)
+
+    def _user_rows(self, users):
+        """Hàng rating (gốc + delta) của các user, CSR len(users) x số item"""
+        return (self.base[users] + self.delta[users]).tocsr()
+
+    def _add_norms(self, rows, users, sign):
+        """Cộng (sign=1) hoặc trừ (sign=-1) đóng góp của các hàng user vào bình phương chuẩn của item"""
+        centered = rows.data - np.repeat(self.means[users], np.diff(rows.indptr))
+        np.add.at(self.norms2, rows.indices, sign * centered * centered)
+
+    def update(self, new_ratings):
+        """Thêm batch rating mới (userId, movieId, rating); rating của phim ngoài catalog bị bỏ"""
+        import scipy.sparse as sp
+        cols = self._movie_pos.get_indexer(new_ratings['movieId'].to_numpy())
+        known = cols >= 0
+        if not known.any():
+            return
+        user_ids = new_ratings['userId'].to_numpy()[known]
+        for user_id in np.unique(user_ids):
+            self._user_pos.setdefault(int(user_id), len(self._user_pos))
+        rows = np.fromiter((self._user_pos[int(u)] for u in user_ids), dtype=np.int64, count=len(user_ids))
+        shape = (len(self._user_pos), self.base.shape[1])
+        if shape != self.base.shape:
+            # User mới: thêm hàng rỗng vào ma trận gốc
+            self.base.resize(shape)
+            self.base_t.resize(shape[::-1])
+            self.means = np.concatenate([self.means, np.zeros(shape[0] - len(self.means))])
+            self.delta.resize(shape)
+            self.delta_t.resize(shape[::-1])
+
+        users = np.unique(rows)
+        self._add_norms(self._user_rows(users), users, -1.0)
+        self._delta = [np.concatenate([old, new]) for old, new in zip(
+            self._delta, (rows, cols[known].astype(np.int64), new_ratings['rating'].to_numpy(dtype=np.float32)[known])
+        )]
+        if len(self._delta[0]) > self.compact_ratio * max(self.base.nnz, 1):
+            merged = (self.base + sp.csr_matrix((self._delta[2], (self._delta[0], self._delta[1])), shape=shape))
+            self._set_base(merged.tocsr())
+        else:
+            self.delta = sp.csr_matrix((self._delta[2], (self._delta[0], self._delta[1])), shape=shape)
+            self.delta.sum_duplicates()
+            self.delta_t = self.delta.T.tocsr()
+
+        user_rows = self._user_rows(users)
+        self.means[users] = self._row_means(user_rows)
+        self._add_norms(user_rows, users, 1.0)
+
+    def similarity_block(self, rows, shrinkage, min_common):
+        """Như _similarity_block nhưng chỉ đọc hàng của các user đã rating các phim rows"""
+        items = (self.base_t[rows] + self.delta_t[rows]).tocsr()
+        users = np.unique(items.indices)
+        items = items[:, users]
+        user_rows = self._user_rows(users)
+
+        inv_norms = np.divide(1.0, np.sqrt(self.norms2), out=np.zeros_like(self.norms2), where=self.norms2 > 1e-9)
+        items.data = ((items.data - self.means[users][items.indices]) * np.repeat(inv_norms[rows], np.diff(items.indptr))
+                      ).astype(np.float32)
+        rated_items = items.copy()
+        rated_items.data = np.ones_like(rated_items.data)
+        rated_users = user_rows.copy()
+        rated_users.data = np.ones_like(rated_users.data)
+        user_rows.data = ((user_rows.data - np.repeat(self.means[users], np.diff(user_rows.indptr)))
+                          * inv_norms[user_rows.indices]).astype(np.float32)
+
+        sim = (items @ user_rows).toarray()
+        common = (rated_items @ rated_users).toarray()
+        return _shrink(sim, common, rows, shrinkage, min_common)
+
+
+def _top_neighbors(sim, k, rows=None):
+    """top_k_rows trên block similarity, ô không hợp lệ thành -1 / 0"""
+    block_neighbors, block_scores = top_k_rows(sim, k, exclude_cols=rows)
+    invalid = ~np.isfinite(block_scores)
+    block_neighbors[invalid] = -1
+    block_scores[invalid] = 0.0
+    return block_neighbors, block_scores
+
+
+def build_item_cf_index(ratings, movies_df, k=CF_TOP_K, block_size=CF_BLOCK_SIZE,
+                        shrinkage=CF_SHRINKAGE, min_common=CF_MIN_COMMON_USERS, index_path=None,
+                        allow_build=not SERVE_MODE):
+    """
+    Xây dựng NeighborIndex item-item từ ratings (mean-centered cosine)
+
+    Similarity được tính bằng tích sparse theo từng block item, nên bộ nhớ tạm
+    chỉ là block_size x số phim; mỗi phim chỉ giữ top-K láng giềng có
+    similarity dương và ít nhất min_common user cùng rating.
+    Similarity được co lại theo số user chung: sim * n / (n + shrinkage).
+    Nếu có index_path thì memory-map index đã lưu khi cùng ratings, catalog và tham số.
+    allow_build=False (serve mode): không build; index đã lưu cùng catalog và tham số
+    vẫn được dùng dù ratings đã đổi, nếu không có thì raise RuntimeError.
+    """
+    if index_path:
+        key = "|".join([
+            frame_digest(ratings, ['userId', 'movieId', 'rating']),
+            frame_digest(movies_df, ['movieId']),
+            f"{k}:{shrinkage}:{min_common}",
+        ])
+        cached = NeighborIndex.load(index_path)
+        if cached is not None and cached.meta.get('key') == key:
+            return cached
+        if (not allow_build and cached is not None
+                and cached.meta.get('key', '').split('|')[1:] == key.split('|')[1:]):
+            print("Warning: Item-CF index was built from older ratings; run `python build_artifacts.py` to rebuild")
+            return cached
+
+    if not allow_build:
+        raise RuntimeError("item-CF index has not been built; run `python build_artifacts.py`")
+
+    operands = _similarity_operands(ratings, movies_df)
+    n_items = len(movies_df)
+    neighbors = np.empty((n_items, k), dtype=np.int32)
+    scores = np.empty((n_items, k), dtype=np.float32)
+
+    for start in range(0, n_items, block_size):
+        rows = np.arange(start, min(start + block_size, n_items))
+        sim = _similarity_block(operands, rows, shrinkage, min_common)
+        neighbors[rows], scores[rows] = _top_neighbors(sim, k, rows)
+
+    cf_index = NeighborIndex(neighbors, scores)
+    if index_path:
+        cf_index.meta['key'] = key
+        try:
+            cf_index.save(index_path)
+        except OSError as e:
+            print(f"Warning: Could not save item-CF index: {e}")
+    return cf_index
+
+
+def refresh_item_cf_rows(cf_index, ratings, movies_df, changed, block_size=CF_BLOCK_SIZE,
+                         shrinkage=CF_SHRINKAGE, min_common=CF_MIN_COMMON_USERS, operands=None):
+    """
+    Refresh NeighborIndex item-CF sau khi các phim changed có rating mới
+
+    Tính lại similarity của các phim changed với toàn catalog (block
+    len(changed) x N thay vì N x N): hàng của chúng được thay mới, và vì
+    similarity đối xứng nên điểm của chúng trong danh sách láng giềng của mọi
+    phim khác cũng được cập nhật. Similarity giữa hai phim không đổi rating
+    chỉ lệch nhẹ qua rating trung bình của user và được giữ nguyên.
+    operands là ItemCFOperands đã update tới ratings hiện tại; nếu None thì
+    build từ ratings (tốn O(số rating), nên caller refresh nhiều lần giữ lại một).
+    Trả về NeighborIndex mới; index cũ (có thể memory-map) không bị sửa.
+    """
+    changed = np.unique(np.asarray(changed, dtype=np.intp))
+    if cf_index is None or changed.size == 0:
+        return cf_index
+
+    k = cf_index.shape[1]
+    neighbors = np.array(cf_index.neighbors)
+    scores = np.array(cf_index.scores)
+    # Bỏ các phim changed khỏi danh sách cũ, điểm mới của chúng được merge lại bên dưới
+    stale = np.isin(neighbors, changed)
+    scores[stale | (neighbors < 0)] = -np.inf
+
+    if operands is None:
+        operands = ItemCFOperands(ratings, movies_df)
+    others = np.setdiff1d(np.arange(len(neighbors)), changed)
+    for start in range(0, len(changed), block_size):
+        rows = changed[start:start + block_size]
+        sim = operands.similarity_block(rows, shrinkage, min_common)
+        neighbors[rows], scores[rows] = _top_neighbors(sim, k, rows)
+
+        # Mỗi phim khác merge top-K hiện có với similarity tới các phim rows (cột của sim)
+        merged_scores = np.concatenate([scores[others], sim.T[others].astype(np.float32)], axis=1)
+        merged_ids = np.concatenate([neighbors[others], np.broadcast_to(rows.astype(np.int32), (len(others), len(rows)))], axis=1)
+        order, scores[others] = top_k_rows(merged_scores, k)
+        neighbors[others] = np.take_along_axis(merged_ids, order.astype(np.intp), axis=1)
+
+    invalid = ~np.isfinite(scores)
+    neighbors[invalid] = -1
+    scores[invalid] = 0.0
+    return NeighborIndex(neighbors, scores, {key: value for key, value in cf_index.meta.items() if key != 'key'})
+
+
+def also_liked(title, movies_df, cf_index, indices, top_n=DEFAULT_TOP_N):
+    """Gợi ý 'người thích phim này cũng thích' từ item-item CF index"""
+    if cf_index is None or title not in indices:
+        return pd.DataFrame()
+
+    idx = indices[title]
+    movie_indices, scores = cf_index.query(idx, top_n)
+    if len(movie_indices) == 0:
+        return pd.DataFrame()
+
+    result = movies_df.iloc[movie_indices][['movieId', 'title', 'genres', 'year', 'avg_rating', 'rating_count']].copy()
+    result['cf_score'] = np.round(scores.astype(float), 3)
+    return result
@@ -14,6 +14,10 @@ GENRE_COLS = [
 ]
 MOVIE_COLS = ["movieId","title","release_date","video_release_date","IMDb_URL"] + GENRE_COLS
 
+# Nhóm tuổi cho analytics (theo các nhóm tuổi chuẩn của MovieLens)
+AGE_BAND_EDGES = [18, 25, 35, 45, 50, 56]
+AGE_BAND_LABELS = ["Under 18", "18-24", "25-34", "35-44", "45-49", "50-55", "56+"]
+
 # Recommendation constants
 DEFAULT_MIN_RATING = 3.0
 DEFAULT_MIN_RATING_COUNT = 5
@@ -23,6 +27,11 @@ DEFAULT_TOP_N = 10
 FUZZY_MIN_SCORE = 50
 FUZZY_CONFIDENCE_THRESHOLD = 60
 
+# Genre leaderboards: ngưỡng rating_count được materialize sẵn cho từng genre lúc load,
+# tổ hợp nhiều genre / ngưỡng khác được build lần đầu dùng rồi giữ trong LRU
+GENRE_LEADERBOARD_MIN_COUNTS = (0, DEFAULT_MIN_RATING_COUNT)
+GENRE_LEADERBOARD_CACHE_SIZE = 256
+
 # Scoring weights
 GENRE_WEIGHT = 0.4
 RATING_WEIGHT = 0.6
@@ -31,6 +40,98 @@ RATING_WEIGHT = 0.6
 SIMILARITY_WEIGHT = 0.5
 RATING_SCORE_WEIGHT = 0.3
 PREFERENCE_WEIGHT = 0.2
+HYBRID_GATHER_MAX_FRACTION = 0.02  # hybrid: ứng viên quá tỷ lệ này của catalog thì tính similarity cả catalog thay vì gather
 
 # Performance settings
 TFIDF_MAX_FEATURES = 1000
+
+
+# Neighbor index settings
+NEIGHBOR_TOP_K = 50
+NEIGHBOR_BLOCK_SIZE = 1024
+NEIGHBOR_BOUND_DIMS = 8  # số chiều đầu của vectors dùng cho cận trên similarity (hybrid)
+NEIGHBOR_INDEX_PATH = os.path.join('processed', 'neighbor_index')
+NEIGHBOR_BUILD_WORKERS = os.cpu_count() or 1  # số process khi build offline (build_artifacts.py)
+NEIGHBOR_BUILD_BLOCK_SIZE = 256  # mỗi worker cần ~block x N x 20 byte tạm: 100k phim ~ 0.5 GB
+
+# Item embedding settings: content model = genres + token title + năm + rating, giảm chiều bằng truncated SVD
+EMBEDDING_DIM = 32  # None: dùng lại TF-IDF genres như trước
+EMBEDDING_WEIGHTS = {"genres": 1.0, "title": 0.5, "year": 0.5, "rating": 0.3}
+EMBEDDING_YEAR_BUCKET = 5      # số năm mỗi bucket
+EMBEDDING_TITLE_MIN_DF = 2     # token title phải xuất hiện ở ít nhất từng này phim
+
+# ANN settings: IVF (k-means coarse quantizer) trên item embedding cho content similarity xấp xỉ
+SEARCH_MODES = ("exact", "approx")
+CONTENT_SEARCH_MODE = os.getenv("RECOMMENDER_SEARCH_MODE", "exact")  # một trong SEARCH_MODES
+ANN_BACKEND = "ivf"            # "ivf" hoặc "exact" (quét toàn bộ, để so sánh)
+ANN_INDEX_PATH = os.path.join('processed', 'ann_index')
+ANN_N_LISTS = None             # số inverted list, None = 4 * sqrt(N)
+ANN_N_PROBE = 8                # số list quét mỗi query: tăng để recall cao hơn, giảm để nhanh hơn
+ANN_KMEANS_ITERATIONS = 10
+ANN_KMEANS_SAMPLE = 50_000     # k-means chỉ train trên mẫu ngẫu nhiên tối đa từng này phim
+
+# Search index settings
+FUZZY_SHORTLIST_SIZE = 12
+SEARCH_INDEX_CACHE_SIZE = 4
+
+# Artifact cache settings
+ARTIFACT_DIR = os.path.join('processed', 'artifacts')
+ARTIFACT_VERSION = 6
+ARTIFACT_HASH_SOURCES = False  # True: so sánh nội dung file nguồn (sha1) thay vì size + mtime
+
+# Serve mode: chỉ dùng artifact đã build sẵn (python build_artifacts.py), không import sklearn / không fit / không train
+SERVE_MODE = os.getenv("RECOMMENDER_SERVE_MODE", "0") == "1"
+
+# Ingestion settings
+RATINGS_CHUNK_SIZE = 1_000_000
+RATING_LOG_PATH = os.getenv("RATING_LOG_PATH", os.path.join('processed', 'ratings.log'))
+RATING_RANGE = (1.0, 5.0)  # rating hợp lệ khi ingest thêm
+
+# Trending settings: mỗi window là half-life (ngày) của trọng số decay
+TRENDING_WINDOWS = {"week": 7, "month": 30, "year": 365}
+TRENDING_DEFAULT_WINDOW = "month"
+TRENDING_TOP_K = 100        # số phim giữ sẵn thứ hạng cho mỗi window
+TRENDING_WEIGHT = 0.2       # trọng số trending khi blend vào hybrid
+
+# Collaborative filtering settings
+CF_TOP_K = 50
+CF_BLOCK_SIZE = 512
+CF_SHRINKAGE = 10.0  # similarity *= n_common / (n_common + CF_SHRINKAGE)
+CF_MIN_COMMON_USERS = 3
+CF_DELTA_COMPACT_RATIO = 0.1  # refresh item-CF: gộp rating mới vào ma trận gốc khi vượt tỉ lệ này
+CF_INDEX_PATH = os.path.join('processed', 'item_cf_index')
+
+# Matrix factorization (ALS) settings
+ALS_FACTORS = 32
+ALS_REGULARIZATION = 0.1
+ALS_ITERATIONS = 10
+ALS_WORKERS = 4
+ALS_BATCH_SIZE = 256
+ALS_MAX_BATCH_CELLS = 200_000  # số hàng x độ dài tối đa của mảng đệm mỗi batch
+ALS_MODEL_DIR = os.path.join('processed', 'als')
+
+# Poster service settings
+OMDB_API_URL = os.getenv("OMDB_API_URL", "https://www.omdbapi.com/")
+POSTER_REQUEST_TIMEOUT = 5
+POSTER_MAX_WORKERS = 8
+POSTER_BATCH_DEADLINE = 6.0  # giây, tổng thời gian tối đa cho một batch poster
+POSTER_CACHE_PATH = os.getenv("POSTER_CACHE_PATH", os.path.join('processed', 'posters.sqlite3'))
+POSTER_CACHE_HIT_TTL = 30 * 24 * 3600   # poster tìm thấy
+POSTER_CACHE_MISS_TTL = 24 * 3600       # OMDb trả lời không có poster
+POSTER_CACHE_ERROR_TTL = 10 * 60        # timeout / lỗi mạng, thử lại sớm
+
+# Recommendation HTTP service settings
+SERVICE_HOST = os.getenv("RECOMMENDER_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("RECOMMENDER_PORT", "8000"))
+SERVICE_WORKERS = int(os.getenv("RECOMMENDER_WORKERS", "2"))
+SERVICE_MAX_BATCH = 100
+
+# Instrumentation (metrics.py)
+METRICS_ENABLED = os.getenv("RECOMMENDER_METRICS", "1") != "0"
+METRICS_TRACE_MEMORY = os.getenv("RECOMMENDER_TRACE_MEMORY", "0") == "1"  # tracemalloc, chậm hơn nhiều
+METRICS_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Result cache cho recommend / hybrid / search
+RESULT_CACHE_SIZE = 512          # số entry giữ trong memory mỗi process (LRU)
+RESULT_CACHE_TTL = 6 * 3600      # giây
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join('processed', 'results.sqlite3'))
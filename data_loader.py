@@ -1,48 +1,120 @@
 # data_loader.py
 import os
+import numpy as np
 import pandas as pd
-from config import MOVIES_PATH, RATINGS_PATH, USERS_PATH, MOVIE_COLS, GENRE_COLS
-from utils import extract_year, row_genres
+from config import MOVIES_PATH, RATINGS_PATH, USERS_PATH, MOVIE_COLS, GENRE_COLS, RATINGS_CHUNK_SIZE
+from utils import genres_from_flags, genre_masks_from_flags, extract_years
+from artifact_store import load_artifacts, save_artifacts
+from analytics import AGGREGATE_NAMES, compute_aggregates
+from metrics import timed, record_error
 
-def calculate_movie_ratings(ratings):
-    """Tính điểm trung bình và số lượng rating cho mỗi phim"""
-    try:
-        if ratings.empty:
-            return pd.DataFrame(columns=['movieId', 'avg_rating', 'rating_count'])
-        
-        movie_stats = ratings.groupby('movieId').agg({
-            'rating': ['mean', 'count']
-        }).round(2)
-        
-        # Flatten column names
-        movie_stats.columns = ['avg_rating', 'rating_count']
-        movie_stats = movie_stats.reset_index()
-        
-        return movie_stats
-    except Exception as e:
-        print(f"Warning: Error calculating movie ratings: {e}")
-        # Return empty DataFrame with correct columns
-        return pd.DataFrame(columns=['movieId', 'avg_rating', 'rating_count'])
+SOURCE_PATHS = [MOVIES_PATH, RATINGS_PATH, USERS_PATH]
+
+RATING_COLS = ["userId", "movieId", "rating", "timestamp"]
+# timestamp (Unix giây) vừa int32 tới năm 2038, đủ cho trending mà chỉ tốn 4 byte/rating
+RATING_DTYPES = {"userId": np.int32, "movieId": np.int32, "rating": np.float32, "timestamp": np.int32}
+
+def read_ratings(path=RATINGS_PATH, chunksize=RATINGS_CHUNK_SIZE, keep_frame=True):
+    """
+    Đọc file ratings theo từng chunk và cộng dồn sum/count rating cho mỗi phim
+
+    Bộ nhớ cho phần thống kê chỉ tỉ lệ với số phim, không phải số rating.
+    Nếu keep_frame=False thì không giữ lại các dòng rating (trả về None),
+    phù hợp khi chỉ cần movie_stats của file hàng chục triệu dòng.
+
+    Returns:
+        (ratings DataFrame hoặc None, movie_stats DataFrame)
+    """
+    sums = np.zeros(0, dtype=np.float64)
+    counts = np.zeros(0, dtype=np.int64)
+    chunks = []
+
+    for chunk in pd.read_csv(path, sep="\t", names=RATING_COLS, dtype=RATING_DTYPES, chunksize=chunksize):
+        movie_ids = chunk["movieId"].to_numpy()
+        size = int(movie_ids.max()) + 1 if len(movie_ids) else 0
+        if size > len(sums):
+            sums = np.pad(sums, (0, size - len(sums)))
+            counts = np.pad(counts, (0, size - len(counts)))
+        sums[:size] += np.bincount(movie_ids, weights=chunk["rating"].to_numpy(), minlength=size)
+        counts[:size] += np.bincount(movie_ids, minlength=size)
+
+        if keep_frame:
+            chunks.append(chunk)
 
-def load_data():
+    rated = np.flatnonzero(counts)
+    movie_stats = pd.DataFrame({
+        'movieId': rated.astype(np.int64),
+        'avg_rating': np.round(sums[rated] / counts[rated], 2),
+        'rating_count': counts[rated],
+    })
+
+    ratings = None
+    if keep_frame:
+        if chunks:
+            ratings = pd.concat(chunks, ignore_index=True)
+        else:
+            ratings = pd.DataFrame({col: pd.Series(dtype=RATING_DTYPES[col]) for col in RATING_COLS})
+    return ratings, movie_stats
+
+@timed("load_data")
+def load_data(use_cache=True, with_ratings=True):
+    """
+    Load movies, ratings, users
+
+    Nếu use_cache=True thì đọc từ artifact store khi cache còn hợp lệ (cùng
+    version, file nguồn chưa đổi); nếu không thì parse lại và ghi cache mới.
+    with_ratings=False trả về ratings=None: khi phải parse lại, file ratings chỉ
+    được đọc streaming để cộng dồn stats (bộ nhớ theo số phim, không theo số
+    rating) và cache không được ghi vì các bảng analytics cần ratings.
+    """
+    if use_cache:
+        try:
+            frames = load_artifacts(SOURCE_PATHS)
+        except OSError as e:
+            record_error("load_data.artifacts", e)
+            frames = None
+        if frames is not None:
+            return frames["movies"], frames["ratings"] if with_ratings else None, frames["users"]
+
+    movies_df, ratings, users, movie_stats = _load_from_source(keep_ratings=with_ratings)
+
+    if use_cache and ratings is not None:
+        try:
+            frames = {"movies": movies_df, "ratings": ratings, "users": users, "movie_stats": movie_stats}
+            frames.update(compute_aggregates(movies_df, ratings, users))
+            save_artifacts(frames, SOURCE_PATHS)
+        except Exception as e:
+            record_error("load_data.artifacts", e)
+            print(f"Warning: Could not write artifact cache: {e}")
+
+    return movies_df, ratings, users
+
+def load_cached_aggregates():
+    """Đọc các bảng thống kê analytics (agg_*) từ artifact store, None nếu chưa có cache"""
+    frames = load_artifacts(SOURCE_PATHS)
+    if frames is None or not all(name in frames for name in AGGREGATE_NAMES):
+        return None
+    return {name: frames[name] for name in AGGREGATE_NAMES}
+
+def _load_from_source(keep_ratings=True):
     try:
         movies = pd.read_csv(MOVIES_PATH, sep="|", encoding="latin-1", header=None, names=MOVIE_COLS)
-        ratings = pd.read_csv(RATINGS_PATH, sep="\t", names=["userId","movieId","rating","timestamp"])
         users = pd.read_csv(USERS_PATH, sep="|", header=None, names=["userId","age","gender","occupation","zip_code"])
         
+        # Ratings được đọc theo chunk, movie_stats cộng dồn trong lúc đọc
+        ratings, movie_stats = read_ratings(RATINGS_PATH, keep_frame=keep_ratings)
+        
         # Drop unneeded cols
         movies = movies.drop(["video_release_date", "IMDb_URL"], axis=1)
-        ratings = ratings.drop(["timestamp"], axis=1)
         users = users.drop(["zip_code", "occupation"], axis=1)
         
-        # Process movies
-        movies["genres"] = movies.apply(lambda row: row_genres(row, GENRE_COLS), axis=1)
-        movies["year"] = movies["title"].apply(extract_year)
+        # Process movies (vectorized trên toàn bộ cột)
+        genre_flags = movies[GENRE_COLS].to_numpy()
+        movies["genres"] = genres_from_flags(genre_flags, GENRE_COLS)
+        movies["genre_mask"] = genre_masks_from_flags(genre_flags)
+        movies["year"] = extract_years(movies["title"])
         movies["title"] = movies["title"].str.replace(r"\s*\(\d{4}\)\s*$", "", regex=True)
-        movies_df = movies[["movieId","title","genres","year"]]
-        
-        # Calculate and merge movie ratings
-        movie_stats = calculate_movie_ratings(ratings)
+        movies_df = movies[["movieId","title","genres","year","genre_mask"]]
         
         if not movie_stats.empty:
             movies_df = movies_df.merge(movie_stats, on='movieId', how='left')
@@ -55,7 +127,7 @@ def load_data():
         movies_df['avg_rating'] = movies_df['avg_rating'].fillna(3.0)
         movies_df['rating_count'] = movies_df['rating_count'].fillna(0)
         
-        return movies_df, ratings, users
+        return movies_df, ratings, users, movie_stats
         
     except FileNotFoundError as e:
         raise FileNotFoundError(f"Data files not found: {e}")
@@ -0,0 +1,89 @@
+# embeddings.py
+import numpy as np
+from config import (
+    EMBEDDING_DIM, EMBEDDING_WEIGHTS, EMBEDDING_YEAR_BUCKET, EMBEDDING_TITLE_MIN_DF, GENRE_COLS
+)
+from utils import genre_masks_from_strings
+
+
+def embedding_key(dim=EMBEDDING_DIM, weights=EMBEDDING_WEIGHTS):
+    """Chuỗi mô tả cấu hình embedding, lưu trong meta để index cũ bị build lại khi cấu hình đổi"""
+    parts = [f"dim={dim}", f"year_bucket={EMBEDDING_YEAR_BUCKET}", f"min_df={EMBEDDING_TITLE_MIN_DF}"]
+    parts += [f"{name}={weight}" for name, weight in sorted(weights.items())]
+    return "embedding|" + "|".join(parts)
+
+
+def _zscore(values):
+    std = values.std()
+    return (values - values.mean()) / std if std > 0 else np.zeros_like(values)
+
+
+def embedding_features(movies_df, weights=EMBEDDING_WEIGHTS):
+    """
+    Ma trận đặc trưng thưa N x D của mỗi phim, ghép từ 4 nhóm
+
+    genres (bit của genre_mask), token title (TF-IDF, bỏ token hiếm), bucket năm
+    phát hành (one-hot, năm thiếu là một bucket riêng) và rating (z-score của
+    avg_rating và log số rating, cắt ở ±3). Mỗi nhóm có chuẩn tối đa 1 rồi nhân
+    trọng số trong weights, nên không nhóm nào lấn át chỉ vì có nhiều cột.
+    """
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import normalize
+
+    n_items = len(movies_df)
+    rows = np.arange(n_items)
+    blocks = []
+
+    if 'genre_mask' in movies_df.columns:
+        masks = movies_df['genre_mask'].to_numpy(dtype=np.uint32)
+    else:
+        masks = genre_masks_from_strings(movies_df['genres'].fillna('unknown').to_numpy(), GENRE_COLS)
+    flags = (masks[:, None] >> np.arange(len(GENRE_COLS), dtype=np.uint32)) & 1
+    blocks.append(("genres", normalize(sp.csr_matrix(flags.astype(np.float64)))))
+
+    titles = movies_df['title'].fillna('').astype(str).to_numpy()
+    try:
+        title_matrix = TfidfVectorizer(stop_words='english', min_df=min(EMBEDDING_TITLE_MIN_DF, n_items),
+                                       sublinear_tf=True).fit_transform(titles)
+    except ValueError:  # không còn token nào (catalog nhỏ hoặc title rỗng)
+        title_matrix = sp.csr_matrix((n_items, 0))
+    blocks.append(("title", title_matrix))
+
+    if 'year' in movies_df.columns:
+        years = movies_df['year'].to_numpy(dtype=np.float64)
+    else:
+        years = np.full(n_items, np.nan)
+    buckets = np.where(np.isnan(years), -1, np.floor(np.nan_to_num(years) / EMBEDDING_YEAR_BUCKET))
+    _, bucket_cols = np.unique(buckets, return_inverse=True)
+    blocks.append(("year", sp.csr_matrix((np.ones(n_items), (rows, bucket_cols.ravel())),
+                                         shape=(n_items, bucket_cols.max() + 1 if n_items else 0))))
+
+    stats = np.column_stack([
+        _zscore(movies_df['avg_rating'].to_numpy(dtype=np.float64)),
+        _zscore(np.log1p(movies_df['rating_count'].to_numpy(dtype=np.float64))),
+    ])
+    blocks.append(("rating", sp.csr_matrix(np.clip(stats, -3, 3) / (3 * np.sqrt(2)))))
+
+    return sp.hstack([block * weights.get(name, 0.0) for name, block in blocks], format='csr')
+
+
+def build_item_embeddings(movies_df, dim=EMBEDDING_DIM, weights=EMBEDDING_WEIGHTS, random_state=0):
+    """
+    Embedding float32 N x dim (C-contiguous, mỗi hàng chuẩn hóa L2) cho content similarity
+
+    Giảm chiều embedding_features bằng TruncatedSVD (randomized, seed cố định nên
+    build lại cho cùng kết quả). Similarity giữa hai phim là tích vô hướng của
+    hai hàng. Nếu số đặc trưng ít hơn dim thì các cột thừa bằng 0.
+    """
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.preprocessing import normalize
+
+    features = embedding_features(movies_df, weights)
+    n_items, n_features = features.shape
+    embeddings = np.zeros((n_items, dim), dtype=np.float32)
+    components = min(dim, n_features - 1, n_items - 1)
+    if components >= 1:
+        reduced = TruncatedSVD(n_components=components, random_state=random_state).fit_transform(features)
+        embeddings[:, :components] = normalize(reduced)
+    return embeddings
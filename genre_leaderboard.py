@@ -0,0 +1,167 @@
+# genre_leaderboard.py
+from collections import OrderedDict
+import threading
+import numpy as np
+from config import (
+    GENRE_COLS, GENRE_WEIGHT, RATING_WEIGHT, DEFAULT_TOP_N, DEFAULT_MIN_RATING, DEFAULT_MIN_RATING_COUNT,
+    GENRE_LEADERBOARD_MIN_COUNTS, GENRE_LEADERBOARD_CACHE_SIZE
+)
+from utils import genre_mask, genre_masks_from_strings, popcount32
+
+
+class GenreLeaderboards:
+    """
+    Bảng xếp hạng phim theo genre, build sẵn để recommend_by_genres chỉ cần cắt mảng
+
+    Với mỗi tổ hợp genre G và ngưỡng min_rating_count, các phim có ít nhất một
+    genre trong G được chia theo số genre khớp (level) và mỗi level được sắp xếp
+    theo (avg_rating giảm, rating_count giảm, vị trí tăng). Trong một level điểm
+    của recommend_by_genres chỉ phụ thuộc avg_rating, nên min_rating là một
+    prefix (tìm bằng binary search) và top_n chỉ cần gộp top_n đầu của mỗi level.
+
+    Genre đơn với các ngưỡng GENRE_LEADERBOARD_MIN_COUNTS được build ngay lúc
+    khởi tạo; tổ hợp khác được build ở lần dùng đầu và giữ trong LRU.
+    Một instance được dùng chung giữa các thread: query và update chạy dưới _lock.
+    """
+
+    def __init__(self, movies_df, min_counts=GENRE_LEADERBOARD_MIN_COUNTS,
+                 cache_size=GENRE_LEADERBOARD_CACHE_SIZE):
+        self.min_counts = tuple(min_counts)
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._load_columns(movies_df)
+        self._build_pinned()
+
+    def __len__(self):
+        return len(self.masks)
+
+    def _load_columns(self, movies_df):
+        if 'genre_mask' in movies_df.columns:
+            self.masks = movies_df['genre_mask'].to_numpy(dtype=np.uint32)
+        else:
+            self.masks = genre_masks_from_strings(movies_df['genres'].fillna('unknown').to_numpy(), GENRE_COLS)
+        # Bản copy riêng để update chỉ ghi lại các vị trí thay đổi
+        self.avg_rating = np.array(movies_df['avg_rating'].to_numpy(dtype=float))
+        self.rating_count = np.array(movies_df['rating_count'].to_numpy(dtype=float))
+
+    def _build_pinned(self):
+        self._pinned = {
+            (np.uint32(1 << bit), min_count): self._build(np.uint32(1 << bit), min_count)
+            for bit in range(len(GENRE_COLS)) for min_count in self.min_counts
+        }
+        self._lru = OrderedDict()
+
+    def _build(self, mask, min_count):
+        """Danh sách level -> (vị trí phim, -avg_rating) đã sắp xếp cho tổ hợp mask"""
+        hits = popcount32(self.masks & mask)
+        positions = np.flatnonzero((hits > 0) & (self.rating_count >= min_count))
+        order = np.lexsort((positions, -self.rating_count[positions], -self.avg_rating[positions]))
+        positions = positions[order]
+        levels = []
+        for level in np.unique(hits[positions]):
+            level_positions = positions[hits[positions] == level]
+            levels.append((int(level), level_positions, -self.avg_rating[level_positions]))
+        return levels
+
+    def _patch(self, board, mask, min_count, changed):
+        """
+        Board mới sau khi rating của các phim changed thay đổi (genre không đổi)
+
+        Mỗi phim changed chỉ có thể đổi chỗ trong level của nó: được gỡ ra rồi
+        chèn lại bằng binary search nếu vẫn đủ min_count. Level không chứa phim
+        nào trong changed được giữ nguyên.
+        """
+        hits = popcount32(self.masks[changed] & mask)
+        if not hits.any():
+            return board
+        levels = {level: (positions, neg_avg) for level, positions, neg_avg in board}
+        for level in np.unique(hits[hits > 0]):
+            moved = changed[hits == level]
+            positions, neg_avg = levels.get(int(level), (np.empty(0, dtype=np.intp), np.empty(0)))
+            keep = ~np.isin(positions, moved)
+            positions, neg_avg = positions[keep], neg_avg[keep]
+            moved = moved[self.rating_count[moved] >= min_count]
+            moved = moved[np.lexsort((moved, -self.rating_count[moved], -self.avg_rating[moved]))]
+            slots = [self._slot(positions, neg_avg, position) for position in moved]
+            levels[int(level)] = (np.insert(positions, slots, moved),
+                                  np.insert(neg_avg, slots, -self.avg_rating[moved]))
+        return [(level, positions, neg_avg) for level, (positions, neg_avg) in sorted(levels.items())
+                if len(positions)]
+
+    def _slot(self, positions, neg_avg, position):
+        """Chỗ chèn position vào level đã sắp theo (avg_rating giảm, rating_count giảm, vị trí tăng)"""
+        value = -self.avg_rating[position]
+        start = int(np.searchsorted(neg_avg, value, side='left'))
+        stop = int(np.searchsorted(neg_avg, value, side='right'))
+        ties = positions[start:stop]
+        count = self.rating_count[position]
+        before = (self.rating_count[ties] > count) | ((self.rating_count[ties] == count) & (ties < position))
+        return start + int(before.sum())
+
+    def _board(self, mask, min_count):
+        key = (mask, min_count)
+        board = self._pinned.get(key)
+        if board is not None:
+            return board
+        board = self._lru.get(key)
+        if board is None:
+            board = self._build(mask, min_count)
+            self._lru[key] = board
+            while len(self._lru) > self.cache_size:
+                self._lru.popitem(last=False)
+        else:
+            self._lru.move_to_end(key)
+        return board
+
+    def query(self, preferred_genres, top_n=DEFAULT_TOP_N, min_rating=DEFAULT_MIN_RATING,
+              min_rating_count=DEFAULT_MIN_RATING_COUNT):
+        """
+        Trả về (positions, genre_score, final_score) giống thứ tự của recommend_by_genres
+
+        Chỉ đụng tới top_n phần tử đầu của mỗi level sau khi cắt theo min_rating.
+        """
+        empty = np.empty(0, dtype=np.intp), np.empty(0), np.empty(0)
+        mask = genre_mask(preferred_genres, GENRE_COLS)
+        if not mask or top_n <= 0:
+            return empty
+
+        with self._lock:
+            candidates, levels, max_level = [], [], 0
+            for level, positions, neg_avg in self._board(mask, min_rating_count):
+                cut = int(np.searchsorted(neg_avg, -min_rating, side='right'))
+                if cut:
+                    max_level = max(max_level, level)
+                    candidates.append(positions[:min(cut, top_n)])
+                    levels.append(np.full(min(cut, top_n), level))
+            if not candidates:
+                return empty
+
+            positions = np.concatenate(candidates)
+            genre_score = np.concatenate(levels).astype(float)
+            avg_rating, rating_count = self.avg_rating[positions], self.rating_count[positions]
+        final_score = (avg_rating / 5.0) * RATING_WEIGHT + genre_score / max_level * GENRE_WEIGHT
+        order = np.lexsort((positions, -rating_count, -final_score))[:top_n]
+        return positions[order], genre_score[order], final_score[order]
+
+    def update(self, movies_df, changed=None):
+        """
+        Cập nhật sau khi avg_rating/rating_count thay đổi
+
+        changed là vị trí các phim có rating thay đổi: chỉ các vị trí đó được
+        ghi lại và chèn lại vào những bảng chứa genre của chúng (_patch).
+        changed=None hoặc catalog đổi kích thước thì build lại toàn bộ.
+        """
+        with self._lock:
+            if changed is None or len(movies_df) != len(self.masks):
+                self._load_columns(movies_df)
+                self._build_pinned()
+                return
+
+            changed = np.unique(np.asarray(changed, dtype=np.intp))
+            if changed.size == 0:
+                return
+            self.avg_rating[changed] = movies_df['avg_rating'].to_numpy(dtype=float)[changed]
+            self.rating_count[changed] = movies_df['rating_count'].to_numpy()[changed]
+            for boards in (self._pinned, self._lru):
+                for key, board in list(boards.items()):
+                    boards[key] = self._patch(board, key[0], key[1], changed)
@@ -0,0 +1,182 @@
+# matrix_factorization.py
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import (
+    ALS_FACTORS, ALS_REGULARIZATION, ALS_ITERATIONS, ALS_WORKERS, ALS_BATCH_SIZE,
+    ALS_MAX_BATCH_CELLS, ALS_MODEL_DIR, SERVE_MODE
+)
+from collaborative import build_rating_matrix
+from artifact_store import publish_arrays, attach_arrays, frame_digest
+
+
+class ALSModel:
+    """Latent factors của user/item (float32) cùng dữ liệu cần để phục vụ gợi ý"""
+
+    def __init__(self, user_factors, item_factors, user_ids, global_mean, seen_indptr, seen_indices, meta=None):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_ids = np.asarray(user_ids)
+        self.global_mean = float(global_mean)
+        # CSR (indptr, indices) các item mỗi user đã rating, để loại khỏi gợi ý
+        self.seen_indptr = seen_indptr
+        self.seen_indices = seen_indices
+        self.meta = dict(meta or {})
+
+    def user_index(self, user_id):
+        """Hàng của user_id trong user_factors, None nếu user không có trong tập train"""
+        pos = int(np.searchsorted(self.user_ids, user_id))
+        if pos < len(self.user_ids) and self.user_ids[pos] == user_id:
+            return pos
+        return None
+
+    def seen_items(self, user_pos):
+        return self.seen_indices[self.seen_indptr[user_pos]:self.seen_indptr[user_pos + 1]]
+
+    def score_items(self, user_pos):
+        """Điểm dự đoán cho mọi item của một user: một phép nhân ma trận-vector"""
+        return self.item_factors @ self.user_factors[user_pos] + self.global_mean
+
+    def predict(self, user_pos, item_pos):
+        return float(self.item_factors[item_pos] @ self.user_factors[user_pos] + self.global_mean)
+
+
+def _solve_batch(matrix, fixed, rows, regularization):
+    """
+    Giải least squares có regularization cho một batch hàng của matrix (CSR, đã trừ mean)
+
+    Factors của các item trong batch được gom thành mảng đệm (b, L, f) nên cả
+    ma trận Gram lẫn phép giải đều là một lời gọi batched của NumPy.
+    """
+    n_factors = fixed.shape[1]
+    starts = matrix.indptr[rows]
+    lengths = matrix.indptr[rows + 1] - starts
+    width = max(int(lengths.max()), 1)
+
+    valid = np.arange(width) < lengths[:, None]
+    positions = (starts[:, None] + np.arange(width))[valid]
+    gathered = np.zeros((len(rows), width, n_factors), dtype=np.float32)
+    values = np.zeros((len(rows), width), dtype=np.float32)
+    gathered[valid] = fixed[matrix.indices[positions]]
+    values[valid] = matrix.data[positions]
+
+    gathered_t = gathered.transpose(0, 2, 1)
+    lhs = (gathered_t @ gathered).astype(np.float64)
+    lhs += (regularization * np.maximum(lengths, 1))[:, None, None] * np.eye(n_factors)
+    rhs = (gathered_t @ values[..., None]).astype(np.float64)
+    return np.linalg.solve(lhs, rhs)[..., 0]
+
+
+def _make_batches(lengths, batch_size, max_cells):
+    """
+    Chia các hàng thành batch theo độ dài tăng dần để mảng đệm ít lãng phí;
+    mỗi batch có tối đa batch_size hàng và (số hàng x độ dài lớn nhất) <= max_cells
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        stop = min(start + batch_size, len(order))
+        while stop - start > 1 and lengths[order[stop - 1]] * (stop - start) > max_cells:
+            stop = start + (stop - start) // 2
+        batches.append(order[start:stop])
+        start = stop
+    return batches
+
+
+def _als_step(matrix, fixed, regularization, workers, batch_size, max_cells=ALS_MAX_BATCH_CELLS):
+    """Cập nhật toàn bộ factors của một phía; các batch được giải song song trên thread pool"""
+    n_rows = matrix.shape[0]
+    out = np.empty((n_rows, fixed.shape[1]), dtype=np.float32)
+    batches = _make_batches(np.diff(matrix.indptr), batch_size, max_cells)
+
+    def run(rows):
+        out[rows] = _solve_batch(matrix, fixed, rows, regularization)
+
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, batches))
+    else:
+        for rows in batches:
+            run(rows)
+    return out
+
+
+def train_als(ratings, movies_df, factors=ALS_FACTORS, regularization=ALS_REGULARIZATION,
+              iterations=ALS_ITERATIONS, workers=ALS_WORKERS, batch_size=ALS_BATCH_SIZE, seed=42):
+    """
+    Huấn luyện matrix factorization bằng alternating least squares trên rating đã trừ global mean
+
+    Mỗi bước cố định một phía (item hoặc user) và giải các hệ f x f của phía còn lại
+    theo batch bằng np.linalg.solve; các batch chạy song song trên ThreadPoolExecutor
+    (NumPy nhả GIL khi nhân/giải ma trận). Factors được trả về dạng float32.
+    """
+    matrix, user_ids = build_rating_matrix(ratings, movies_df)
+    global_mean = float(matrix.data.mean()) if matrix.nnz else 0.0
+    centered = matrix.copy()
+    centered.data = (centered.data - global_mean).astype(np.float32)
+    centered_t = centered.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    user_factors = (rng.standard_normal((matrix.shape[0], factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((matrix.shape[1], factors)) * 0.01).astype(np.float32)
+
+    for _ in range(iterations):
+        user_factors = _als_step(centered, item_factors, regularization, workers, batch_size)
+        item_factors = _als_step(centered_t, user_factors, regularization, workers, batch_size)
+
+    return ALSModel(user_factors, item_factors, user_ids, global_mean,
+                    matrix.indptr.astype(np.int64), matrix.indices.astype(np.int32))
+
+
+def save_als(model, directory=ALS_MODEL_DIR):
+    """Publish factors float32 (memory-map được lúc serve) qua artifact_store, meta lưu global_mean"""
+    arrays = {
+        "user_factors": np.asarray(model.user_factors, dtype=np.float32),
+        "item_factors": np.asarray(model.item_factors, dtype=np.float32),
+        "user_ids": model.user_ids,
+        "seen_indptr": model.seen_indptr,
+        "seen_indices": model.seen_indices,
+    }
+    meta = {**model.meta, "global_mean": model.global_mean, "factors": int(model.item_factors.shape[1])}
+    return publish_arrays(directory, arrays, meta)
+
+
+def load_als(directory=ALS_MODEL_DIR, mmap=True):
+    """Attach ALSModel đã publish; mặc định memory-map các mảng để nhiều process dùng chung page cache"""
+    attached = attach_arrays(directory, mmap=mmap)
+    if attached is None:
+        return None
+    meta, arrays = attached
+    meta.pop("arrays", None)
+    return ALSModel(arrays["user_factors"], arrays["item_factors"], arrays["user_ids"], meta["global_mean"],
+                    arrays["seen_indptr"], arrays["seen_indices"], meta)
+
+
+def load_or_train_als(ratings, movies_df, directory=ALS_MODEL_DIR, allow_train=not SERVE_MODE):
+    """
+    Memory-map model ALS đã lưu nếu cùng ratings, catalog và tham số, nếu không thì train lại và lưu
+
+    allow_train=False (serve mode) thì không train: model đã lưu cùng catalog và tham số
+    vẫn được dùng dù ratings đã đổi, nếu không có thì trả về None.
+    """
+    key = "|".join([
+        frame_digest(ratings, ['userId', 'movieId', 'rating']),
+        frame_digest(movies_df, ['movieId']),
+        f"{ALS_FACTORS}:{ALS_REGULARIZATION}:{ALS_ITERATIONS}",
+    ])
+    model = load_als(directory)
+    if model is not None and model.meta.get('key') == key:
+        return model
+    if not allow_train:
+        if model is not None and model.meta.get('key', '').split('|')[1:] == key.split('|')[1:]:
+            print("Warning: ALS model was trained on older ratings; run `python build_artifacts.py` to retrain")
+            return model
+        print("Warning: ALS model missing or stale; run `python build_artifacts.py`")
+        return None
+    model = train_als(ratings, movies_df)
+    model.meta['key'] = key
+    try:
+        save_als(model, directory)
+    except OSError as e:
+        print(f"Warning: Could not save ALS model: {e}")
+    return model
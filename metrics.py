@@ -0,0 +1,218 @@
+# metrics.py
+import functools
+import json
+import re
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from config import METRICS_ENABLED, METRICS_TRACE_MEMORY, METRICS_BUCKETS_MS
+
+
+class Histogram:
+    """Histogram latency (ms) với bucket cố định kiểu Prometheus; percentile nội suy trong bucket"""
+
+    def __init__(self, buckets=METRICS_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # ô cuối là +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Ước lượng percentile q (0-100) từ bucket, sai số tối đa bằng độ rộng một bucket"""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(max(lower + (upper - lower) * (rank - seen) / bucket_count, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Timer, counter và histogram của process, dùng chung cho mọi thread
+
+    Khi tắt (enabled=False) các hàm @timed chỉ kiểm tra một cờ rồi gọi thẳng
+    hàm gốc. Khi bật trace_memory và tracemalloc đang chạy thì mỗi lần gọi còn
+    ghi lại peak memory cấp phát thêm trong lúc hàm chạy (tính cả hàm con).
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, trace_memory=METRICS_TRACE_MEMORY):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.time()
+        self.timers = {}
+        self.errors = {}
+        self.peak_memory = {}
+        self.counters = {}
+        self.trace_memory = False
+        self.set_trace_memory(trace_memory)
+
+    def set_trace_memory(self, enabled):
+        """Bật/tắt đo peak memory; tracemalloc làm chậm mọi lệnh cấp phát nên chỉ nên bật khi profile"""
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = bool(enabled)
+
+    def observe(self, name, elapsed_ms):
+        with self._lock:
+            histogram = self.timers.get(name)
+            if histogram is None:
+                histogram = self.timers[name] = Histogram()
+            histogram.observe(elapsed_ms)
+
+    def increment(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_error(self, name, error=None):
+        """Đếm lỗi của name (kể cả lỗi đã được bắt và chỉ in warning); error là exception hoặc chuỗi mô tả"""
+        if not self.enabled:
+            return
+        if isinstance(error, BaseException):
+            error = f"{type(error).__name__}: {error}"
+        with self._lock:
+            count, _ = self.errors.get(name, (0, None))
+            self.errors[name] = (count + 1, error)
+
+    def _memory_enter(self):
+        stack = getattr(self._local, "memory", None)
+        if stack is None:
+            stack = self._local.memory = []
+        _, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        stack.append([current, current])
+
+    def _memory_exit(self, name):
+        stack = self._local.memory
+        _, peak = tracemalloc.get_traced_memory()
+        baseline, seen = stack.pop()
+        peak = max(seen, peak)
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        with self._lock:
+            self.peak_memory[name] = max(self.peak_memory.get(name, 0), peak - baseline)
+
+    def timed(self, name):
+        """Decorator đo thời gian, số lần gọi, lỗi (exception bay ra) và peak memory của hàm"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                trace = self.trace_memory and tracemalloc.is_tracing()
+                if trace:
+                    self._memory_enter()
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    self.record_error(name, e)
+                    raise
+                finally:
+                    self.observe(name, (time.perf_counter() - start) * 1000)
+                    if trace:
+                        self._memory_exit(name)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.errors.clear()
+            self.peak_memory.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Dict JSON-ready: mỗi timer có count, errors, mean/p50/p95/p99/max (ms) và peak memory"""
+        with self._lock:
+            timers = {}
+            for name in sorted(set(self.timers) | set(self.errors)):
+                histogram = self.timers.get(name) or Histogram()
+                errors, last_error = self.errors.get(name, (0, None))
+                timers[name] = {
+                    "count": histogram.count,
+                    "errors": errors,
+                    "total_ms": round(histogram.total, 3),
+                    "mean_ms": round(histogram.total / histogram.count, 3) if histogram.count else 0.0,
+                    "p50_ms": round(histogram.percentile(50), 3),
+                    "p95_ms": round(histogram.percentile(95), 3),
+                    "p99_ms": round(histogram.percentile(99), 3),
+                    "max_ms": round(histogram.max, 3),
+                    "peak_memory_bytes": self.peak_memory.get(name),
+                    "last_error": last_error,
+                }
+            return {
+                "enabled": self.enabled,
+                "trace_memory": self.trace_memory,
+                "uptime_s": round(time.time() - self.started, 1),
+                "timers": timers,
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix="recommender"):
+        """Text exposition format của Prometheus; thời gian đổi sang giây theo convention"""
+        with self._lock:
+            timers = {name: (list(h.counts), h.total, h.count) for name, h in sorted(self.timers.items())}
+            errors = dict(sorted(self.errors.items()))
+            peaks = dict(sorted(self.peak_memory.items()))
+            counters = dict(sorted(self.counters.items()))
+
+        lines = [f"# HELP {prefix}_duration_seconds Duration of instrumented functions",
+                 f"# TYPE {prefix}_duration_seconds histogram"]
+        for name, (counts, total, count) in timers.items():
+            label = f'function="{_label(name)}"'
+            cumulative = 0
+            for bucket, bucket_count in zip(list(METRICS_BUCKETS_MS) + [None], counts):
+                cumulative += bucket_count
+                le = "+Inf" if bucket is None else repr(bucket / 1000)
+                lines.append(f'{prefix}_duration_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{prefix}_duration_seconds_sum{{{label}}} {total / 1000}")
+            lines.append(f"{prefix}_duration_seconds_count{{{label}}} {count}")
+
+        lines += [f"# HELP {prefix}_errors_total Errors, including handled ones", f"# TYPE {prefix}_errors_total counter"]
+        lines += [f'{prefix}_errors_total{{function="{_label(name)}"}} {count}' for name, (count, _) in errors.items()]
+        lines += [f"# HELP {prefix}_peak_memory_bytes Largest extra memory allocated during one call (tracemalloc)",
+                  f"# TYPE {prefix}_peak_memory_bytes gauge"]
+        lines += [f'{prefix}_peak_memory_bytes{{function="{_label(name)}"}} {peak}' for name, peak in peaks.items()]
+        lines += [f"# HELP {prefix}_events_total Event counters", f"# TYPE {prefix}_events_total counter"]
+        lines += [f'{prefix}_events_total{{name="{_label(name)}"}} {value}' for name, value in counters.items()]
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return re.sub(r'["\\\n]', "_", str(value))
+
+
+METRICS = MetricsRegistry()
+timed = METRICS.timed
+increment = METRICS.increment
+record_error = METRICS.record_error
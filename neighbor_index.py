@@ -0,0 +1,233 @@
+# neighbor_index.py
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from config import NEIGHBOR_TOP_K, NEIGHBOR_BLOCK_SIZE, NEIGHBOR_BUILD_BLOCK_SIZE, NEIGHBOR_BOUND_DIMS
+from artifact_store import publish_arrays, attach_arrays
+from topk import top_k_rows
+
+
+class NeighborIndex:
+    """
+    Lưu top-K láng giềng của mỗi phim trong mảng int32/float32 (N x K)
+
+    Có thể kèm vectors (N x D float32 column-major, đã chuẩn hóa L2) để tính
+    similarity với toàn catalog khi cần, ví dụ cho hybrid ranking.
+    """
+
+    def __init__(self, neighbors, scores, meta=None, vectors=None):
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.meta = dict(meta or {})
+        self.vectors = np.asfortranarray(vectors, dtype=np.float32) if vectors is not None else None
+        self._bound_vectors = {}
+
+    @property
+    def shape(self):
+        return self.neighbors.shape
+
+    def __len__(self):
+        return self.neighbors.shape[0]
+
+    @property
+    def nbytes(self):
+        vectors = self.vectors.nbytes if self.vectors is not None else 0
+        return self.neighbors.nbytes + self.scores.nbytes + vectors
+
+    def query(self, idx, top_n):
+        """Trả về (indices, scores) của top_n láng giềng gần nhất của phim idx"""
+        neighbors = self.neighbors[idx, :top_n]
+        scores = self.scores[idx, :top_n]
+        valid = neighbors >= 0
+        return neighbors[valid], scores[valid]
+
+    def similarity_row(self, idx):
+        """
+        Similarity float32 của phim idx với mọi phim trong catalog
+
+        Dùng vectors nếu có (một phép nhân ma trận-vector); nếu không thì chỉ
+        có điểm của top-K láng giềng, các phim còn lại nhận 0.
+        """
+        if self.vectors is not None:
+            # vectors lưu column-major: với vector thưa (TF-IDF genres) chỉ cần các cột khác 0 của phim idx
+            query = np.asarray(self.vectors[idx])
+            nonzero = np.flatnonzero(query)
+            if len(nonzero) * 2 < len(query):
+                return self.vectors[:, nonzero] @ query[nonzero]
+            return self.vectors @ query
+        row = np.zeros(len(self), dtype=np.float32)
+        neighbors, scores = self.query(idx, self.neighbors.shape[1])
+        row[neighbors] = scores
+        return row
+
+    def similarity_bound(self, idx, dims=NEIGHBOR_BOUND_DIMS):
+        """
+        Cận trên (float32) similarity của phim idx với mọi phim, None nếu không có vectors
+
+        Chỉ nhân dims cột đầu của vectors (SVD xếp các chiều theo năng lượng giảm
+        dần) rồi cộng chuẩn phần còn lại của từng phim nhân chuẩn phần còn lại của
+        query (Cauchy-Schwarz), nên rẻ hơn similarity_row khoảng D / dims lần.
+        dims cột đầu và chuẩn phần còn lại được ghép thành một ma trận N x (dims + 1)
+        giữ lại sau lần gọi đầu, để cận trên chỉ là một phép nhân ma trận-vector.
+        """
+        if self.vectors is None:
+            return None
+        dims = min(dims, self.vectors.shape[1])
+        bound_vectors = self._bound_vectors.get(dims)
+        if bound_vectors is None:
+            tail = np.sqrt(np.einsum('ij,ij->i', self.vectors[:, dims:], self.vectors[:, dims:]))
+            bound_vectors = np.asfortranarray(np.column_stack([self.vectors[:, :dims], tail]))
+            self._bound_vectors[dims] = bound_vectors
+        query = np.asarray(self.vectors[idx])
+        return bound_vectors @ np.append(query[:dims], np.linalg.norm(query[dims:])).astype(np.float32)
+
+    def save(self, path):
+        """Lưu index ra thư mục .npy (kèm meta) để load lại bằng mmap"""
+        arrays = {'neighbors': self.neighbors, 'scores': self.scores}
+        if self.vectors is not None:
+            arrays['vectors'] = self.vectors
+        return publish_arrays(path, arrays, self.meta)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Đọc index đã lưu bằng save(), None nếu chưa có
+
+        Với mmap=True các mảng được map read-only, nên nhiều session/process
+        dùng chung một bản trong page cache thay vì mỗi nơi một bản copy.
+        """
+        attached = attach_arrays(path, mmap=mmap)
+        if attached is None:
+            return None
+        meta, arrays = attached
+        meta.pop('arrays', None)
+        return cls(arrays['neighbors'], arrays['scores'], meta, arrays.get('vectors'))
+
+
+def build_neighbor_index(vectors, k=NEIGHBOR_TOP_K, block_size=NEIGHBOR_BLOCK_SIZE):
+    """
+    Xây dựng NeighborIndex từ ma trận vector (dense hoặc scipy.sparse) đã chuẩn hóa L2
+
+    Tính similarity theo từng block hàng nên bộ nhớ tạm chỉ là block_size x N,
+    còn kết quả chỉ tốn N x K thay vì N x N.
+    """
+    n_items = vectors.shape[0]
+    neighbors = np.empty((n_items, k), dtype=np.int32)
+    scores = np.empty((n_items, k), dtype=np.float32)
+    vectors_t = vectors.T
+
+    for start in range(0, n_items, block_size):
+        stop = min(start + block_size, n_items)
+        block_sim = vectors[start:stop] @ vectors_t
+        if hasattr(block_sim, 'toarray'):
+            block_sim = block_sim.toarray()
+        neighbors[start:stop], scores[start:stop] = top_k_rows(
+            block_sim, k, exclude_cols=np.arange(start, stop)
+        )
+
+    return NeighborIndex(neighbors, scores)
+
+
+# State của process build block: vectors và các file memmap của thư mục staging
+_BLOCK_STATE = {}
+
+
+def _init_block_worker(vectors, staging):
+    _BLOCK_STATE['vectors'] = vectors
+    _BLOCK_STATE['vectors_t'] = vectors.T
+    _BLOCK_STATE['neighbors'] = np.load(os.path.join(staging, 'neighbors.npy'), mmap_mode='r+')
+    _BLOCK_STATE['scores'] = np.load(os.path.join(staging, 'scores.npy'), mmap_mode='r+')
+
+
+def _build_block(start, stop):
+    """Tính top-K của các hàng [start, stop) và ghi thẳng vào file memmap (flush trước khi báo xong)"""
+    block_sim = _BLOCK_STATE['vectors'][start:stop] @ _BLOCK_STATE['vectors_t']
+    if hasattr(block_sim, 'toarray'):
+        block_sim = block_sim.toarray()
+    k = _BLOCK_STATE['neighbors'].shape[1]
+    neighbors, scores = top_k_rows(block_sim, k, exclude_cols=np.arange(start, stop))
+    _BLOCK_STATE['neighbors'][start:stop] = neighbors
+    _BLOCK_STATE['scores'][start:stop] = scores
+    _BLOCK_STATE['neighbors'].flush()
+    _BLOCK_STATE['scores'].flush()
+    return start, stop
+
+
+def _open_staging(staging, key, n_items, k, n_blocks):
+    """Mở thư mục staging của lần build trước nếu cùng key (để resume), nếu không thì tạo mới"""
+    key_path = os.path.join(staging, 'build.json')
+    try:
+        with open(key_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == key:
+                return np.load(os.path.join(staging, 'done.npy'), mmap_mode='r+')
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    np.lib.format.open_memmap(os.path.join(staging, 'neighbors.npy'), mode='w+', dtype=np.int32, shape=(n_items, k))
+    np.lib.format.open_memmap(os.path.join(staging, 'scores.npy'), mode='w+', dtype=np.float32, shape=(n_items, k))
+    done = np.lib.format.open_memmap(os.path.join(staging, 'done.npy'), mode='w+', dtype=bool, shape=(n_blocks,))
+    done.flush()
+    with open(key_path, 'w', encoding='utf-8') as f:
+        json.dump(key, f)
+    return done
+
+
+def build_neighbor_index_on_disk(vectors, path, k=NEIGHBOR_TOP_K, block_size=NEIGHBOR_BUILD_BLOCK_SIZE, workers=1,
+                                 meta=None, dense_vectors=None, progress=None):
+    """
+    Build NeighborIndex theo block hàng vào file memory-map, song song trên nhiều process
+
+    Mỗi block (block_size hàng) được một worker tính similarity với toàn bộ
+    catalog rồi ghi top-K thẳng vào neighbors.npy/scores.npy (mmap) trong thư
+    mục staging path + ".partial", nên RAM mỗi worker chỉ cần block_size x N
+    và không phải gửi kết quả về process cha. done.npy đánh dấu block đã ghi
+    xong: build bị ngắt giữa chừng sẽ chỉ tính tiếp các block còn thiếu, nếu
+    lần chạy sau có cùng kích thước, k, block_size và meta.
+
+    Xong thì publish index (kèm meta, dense_vectors nếu có) ra path, xóa staging
+    và trả về index đã memory-map. progress(done_blocks, total_blocks) được gọi
+    sau mỗi block.
+    """
+    n_items = vectors.shape[0]
+    blocks = [(start, min(start + block_size, n_items)) for start in range(0, n_items, block_size)]
+    staging = path.rstrip(os.sep) + '.partial'
+    key = {'n_items': n_items, 'k': k, 'block_size': block_size, 'meta': meta or {}}
+    done = _open_staging(staging, key, n_items, k, len(blocks))
+    pending = np.flatnonzero(~done)
+
+    def finish(block):
+        done[block] = True
+        done.flush()
+        if progress:
+            progress(int(done.sum()), len(blocks))
+
+    if progress:
+        progress(len(blocks) - len(pending), len(blocks))
+    if len(pending) and (workers <= 1 or len(pending) == 1):
+        _init_block_worker(vectors, staging)
+        try:
+            for block in pending:
+                _build_block(*blocks[block])
+                finish(block)
+        finally:
+            _BLOCK_STATE.clear()
+    elif len(pending):
+        # spawn thay vì fork: process gọi có thể đang chạy thread (Streamlit, service)
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_block_worker, initargs=(vectors, staging)) as pool:
+            futures = {pool.submit(_build_block, *blocks[block]): block for block in pending}
+            for future in as_completed(futures):
+                future.result()
+                finish(futures[future])
+
+    neighbors = np.load(os.path.join(staging, 'neighbors.npy'), mmap_mode='r')
+    scores = np.load(os.path.join(staging, 'scores.npy'), mmap_mode='r')
+    NeighborIndex(neighbors, scores, meta, dense_vectors).save(path)
+    del neighbors, scores, done
+    shutil.rmtree(staging, ignore_errors=True)
+    return NeighborIndex.load(path)
@@ -0,0 +1,181 @@
+# poster_cache.py
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Tuple
+from config import (
+    POSTER_CACHE_PATH, POSTER_CACHE_HIT_TTL, POSTER_CACHE_MISS_TTL, POSTER_CACHE_ERROR_TTL,
+    POSTER_REQUEST_TIMEOUT
+)
+
+STATUS_HIT = "hit"
+STATUS_MISS = "miss"
+STATUS_ERROR = "error"
+
+_TTLS = {
+    STATUS_HIT: POSTER_CACHE_HIT_TTL,
+    STATUS_MISS: POSTER_CACHE_MISS_TTL,
+    STATUS_ERROR: POSTER_CACHE_ERROR_TTL,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posters (
+    key TEXT PRIMARY KEY,
+    url TEXT,
+    status TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inflight (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    lease_until REAL NOT NULL
+);
+"""
+
+
+class PosterCache:
+    """
+    Cache poster dùng SQLite, chia sẻ giữa các thread, session và process
+
+    Mỗi entry có TTL theo trạng thái: hit (có poster), miss (OMDb không có)
+    và error (timeout/lỗi mạng). Việc fetch được single-flight: trong một
+    process bằng Event in-flight theo key (không giữ lock nào trong lúc gọi
+    mạng, nên các title khác không phải chờ), giữa các process bằng lease
+    trong bảng inflight, nên cùng một title không bị gọi OMDb hai lần đồng thời.
+    """
+
+    def __init__(self, path=POSTER_CACHE_PATH, lease_seconds=POSTER_REQUEST_TIMEOUT * 2):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._inflight = {}  # key -> threading.Event, set khi lần fetch của key đó kết thúc
+        self._inflight_lock = threading.Lock()
+        self._owner = f"{os.getpid()}"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        """Trả về (found, url); found=False nếu chưa có entry hoặc entry đã hết hạn"""
+        row = self._conn().execute(
+            "SELECT url, expires_at FROM posters WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return False, None
+        return True, row[0]
+
+    def put(self, key: str, url: Optional[str], status: str, ttl: Optional[float] = None):
+        now = time.time()
+        ttl = _TTLS[status] if ttl is None else ttl
+        self._conn().execute(
+            "INSERT OR REPLACE INTO posters (key, url, status, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (key, url, status, now + ttl, now),
+        )
+
+    def _acquire_lease(self, key: str) -> bool:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM inflight WHERE key = ? AND lease_until < ?", (key, now))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO inflight (key, owner, lease_until) VALUES (?, ?, ?)",
+            (key, self._owner, now + self.lease_seconds),
+        )
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key: str):
+        self._conn().execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, self._owner))
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Tuple[str, Optional[str]]]) -> Optional[str]:
+        """
+        Đọc poster từ cache, nếu chưa có thì gọi fetch() -> (status, url) đúng một lần và lưu lại
+
+        Nếu process khác đang fetch cùng key thì chờ kết quả của nó; quá thời hạn
+        lease mà vẫn chưa có thì tự fetch.
+        """
+        found, url = self.get(key)
+        if found:
+            return url
+
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+        if not owner:
+            # Thread khác trong process đang fetch key này: chờ nó rồi đọc cache
+            event.wait(self.lease_seconds)
+            found, url = self.get(key)
+            if found:
+                return url
+            return self._fetch(key, fetch)
+
+        try:
+            return self._fetch(key, fetch)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _fetch(self, key, fetch):
+        """Fetch dưới lease liên process; process khác đang giữ lease thì chờ kết quả của nó"""
+        found, url = self.get(key)
+        if found:
+            return url
+
+        give_up_at = time.time() + self.lease_seconds
+        while not self._acquire_lease(key):
+            time.sleep(0.05)
+            found, url = self.get(key)
+            if found:
+                return url
+            if time.time() > give_up_at:
+                break
+
+        try:
+            status, url = fetch()
+            self.put(key, url, status)
+            return url
+        finally:
+            self._release_lease(key)
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        self._conn().execute("DELETE FROM posters")
+
+    def purge_expired(self) -> int:
+        """Xóa các entry đã hết hạn, trả về số entry bị xóa"""
+        cursor = self._conn().execute("DELETE FROM posters WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        """Số entry còn hạn theo từng trạng thái"""
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) FROM posters WHERE expires_at > ? GROUP BY status", (time.time(),)
+        ).fetchall()
+        return dict(rows)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_poster_cache() -> PosterCache:
+    """PosterCache dùng chung trong process (mở lazily ở lần dùng đầu)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PosterCache()
+    return _cache
@@ -1,9 +1,15 @@
+import argparse
 import os
+import threading
+import time
 import urllib.parse
-from functools import lru_cache
-from typing import Optional
-import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Iterable, List, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from config import OMDB_API_URL, POSTER_REQUEST_TIMEOUT, POSTER_MAX_WORKERS, POSTER_BATCH_DEADLINE
+from poster_cache import get_poster_cache, STATUS_HIT, STATUS_MISS, STATUS_ERROR
+from metrics import timed, increment, record_error
 
 # Fallback poster URLs cho demo
 FALLBACK_POSTERS = {
@@ -19,11 +25,15 @@ FALLBACK_POSTERS = {
     "dracula: dead and loving it": "https://m.media-amazon.com/images/M/MV5BMTU2MDAwOTcyN15BMl5BanBnXkFtZTcwMDM2OTM3OA@@._V1_SX300.jpg"
 }
 
+_dotenv_loaded = False
+
 def _get_api_key() -> Optional[str]:
-    # Prefer environment variable; fallback to .env if python-dotenv is installed
+    # Prefer environment variable; fallback to .env if python-dotenv is installed (chỉ đọc .env một lần)
+    global _dotenv_loaded
     api_key = os.getenv("OMDB_API_KEY")
-    if api_key:
+    if api_key or _dotenv_loaded:
         return api_key
+    _dotenv_loaded = True
     try:
         from dotenv import load_dotenv  # type: ignore
         load_dotenv()
@@ -38,7 +48,66 @@ def get_placeholder_poster(title: str) -> str:
     color = colors[hash(title) % len(colors)]
     return f"https://via.placeholder.com/300x450/{color}/FFFFFF?text={title_encoded}"
 
-@lru_cache(maxsize=4096)
+_session = None
+_session_lock = threading.Lock()
+
+def _get_session() -> requests.Session:
+    """Session dùng chung cho mọi request OMDb để tái sử dụng kết nối (keep-alive)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POSTER_MAX_WORKERS)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+_executors = {}
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Thread pool dùng chung giữa các batch (không shutdown sau mỗi lần gọi)"""
+    max_workers = max(1, max_workers)
+    executor = _executors.get(max_workers)
+    if executor is None:
+        with _session_lock:
+            executor = _executors.get(max_workers)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poster")
+                _executors[max_workers] = executor
+    return executor
+
+def _normalize_year(year) -> Optional[int]:
+    if year is None or (isinstance(year, float) and str(year) == "nan"):
+        return None
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return None
+
+@timed("poster.omdb_request")
+def _fetch_omdb_poster(title: str, year: Optional[int], api_key: str) -> Tuple[str, Optional[str]]:
+    """Gọi OMDb cho một title/year, trả về (status, poster URL) với status hit/miss/error"""
+    params = {"t": title, "apikey": api_key}
+    if year:
+        params["y"] = str(year)
+
+    url = OMDB_API_URL + "?" + urllib.parse.urlencode(params)
+    try:
+        resp = _get_session().get(url, timeout=POSTER_REQUEST_TIMEOUT)
+        if resp.status_code != 200:
+            record_error("poster.omdb_request", f"HTTP {resp.status_code}")
+            return STATUS_ERROR, None
+        poster = resp.json().get("Poster")
+        if poster and poster != "N/A":
+            return STATUS_HIT, poster
+        return STATUS_MISS, None
+    except Exception as e:
+        record_error("poster.omdb_request", e)
+        return STATUS_ERROR, None
+
+@timed("get_poster_url")
 def get_poster_url(title: str, year: Optional[int] = None) -> Optional[str]:
     """Return a poster URL from OMDb for the given title/year, or fallback options."""
     
@@ -47,25 +116,76 @@ def get_poster_url(title: str, year: Optional[int] = None) -> Optional[str]:
     if title_lower in FALLBACK_POSTERS:
         return FALLBACK_POSTERS[title_lower]
     
-    # Thử OMDb API nếu có key
+    # Thử cache SQLite rồi OMDb API nếu có key (kết quả âm/lỗi cũng được cache với TTL ngắn)
     api_key = _get_api_key()
     if api_key:
-        params = {"t": title, "apikey": api_key}
-        if year and not (isinstance(year, float) and str(year) == "nan"):
-            params["y"] = str(int(year))
-
-        url = "https://www.omdbapi.com/?" + urllib.parse.urlencode(params)
-        try:
-            resp = requests.get(url, timeout=5)
-            if resp.status_code == 200:
-                data = resp.json()
-                poster = data.get("Poster")
-                if poster and poster != "N/A":
-                    return poster
-        except Exception:
-            pass
+        year = _normalize_year(year)
+        key = f"{title_lower}|{year or ''}"
+        poster = get_poster_cache().get_or_fetch(key, lambda: _fetch_omdb_poster(title, year, api_key))
+        if poster:
+            return poster
     
     # Fallback: placeholder poster
     return get_placeholder_poster(title)
 
+@timed("get_poster_urls")
+def get_poster_urls(items: Iterable[Tuple[str, Optional[int]]], max_workers: int = POSTER_MAX_WORKERS,
+                    deadline: Optional[float] = POSTER_BATCH_DEADLINE) -> List[Optional[str]]:
+    """
+    Resolve poster cho nhiều cặp (title, year) cùng lúc, trả về list theo đúng thứ tự đầu vào
+
+    Các cặp trùng nhau chỉ được resolve một lần; các request chạy song song trên
+    tối đa max_workers thread của một pool dùng chung, qua Session dùng chung.
+    Cặp nào chưa xong sau deadline giây sẽ nhận placeholder; request đó (kể cả
+    request còn xếp hàng) vẫn chạy tiếp ở nền và kết quả được cache cho lần
+    render sau. deadline=None thì chờ tới khi xong hết.
+    """
+    items = [(title, year) for title, year in items]
+    unique = list(dict.fromkeys(items))
+    if not unique:
+        return []
+
+    started = time.monotonic()
+    pool = _get_executor(max_workers)
+    futures = {key: pool.submit(get_poster_url, *key) for key in unique}
+    timeout = None if deadline is None else max(0.0, deadline - (time.monotonic() - started))
+    wait(futures.values(), timeout=timeout)
+
+    resolved = {}
+    for key, future in futures.items():
+        if future.done() and future.exception() is None:
+            resolved[key] = future.result()
+        else:
+            increment("poster.deadline_placeholders")
+            resolved[key] = get_placeholder_poster(key[0])
+    return [resolved[key] for key in items]
+
+def prewarm(max_workers: int = POSTER_MAX_WORKERS) -> dict:
+    """Resolve poster cho toàn bộ catalog để điền sẵn cache (chạy offline)"""
+    from data_loader import load_data
+    
+    if not _get_api_key():
+        raise RuntimeError("OMDB_API_KEY is not set; nothing to pre-warm")
+    
+    movies_df, _, _ = load_data(with_ratings=False)
+    get_poster_urls(zip(movies_df["title"], movies_df["year"]), max_workers=max_workers, deadline=None)
+    return get_poster_cache().stats()
+
+def main():
+    parser = argparse.ArgumentParser(description="Poster cache utilities")
+    parser.add_argument("--prewarm", action="store_true", help="fetch posters for the whole catalog")
+    parser.add_argument("--purge", action="store_true", help="delete expired cache entries")
+    parser.add_argument("--workers", type=int, default=POSTER_MAX_WORKERS)
+    args = parser.parse_args()
+    
+    if args.purge:
+        print(f"Purged {get_poster_cache().purge_expired()} expired entries")
+    if args.prewarm:
+        print("Pre-warming poster cache...")
+        start = time.monotonic()
+        stats = prewarm(args.workers)
+        print(f"Done in {time.monotonic() - start:.1f}s: {stats}")
+    print(f"Cache entries: {get_poster_cache().stats()}")
 
+if __name__ == "__main__":
+    main()
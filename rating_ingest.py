@@ -0,0 +1,279 @@
+# rating_ingest.py
+import argparse
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from config import RATING_LOG_PATH, RATING_RANGE
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ dựa vào O_APPEND
+    fcntl = None
+
+# Mỗi rating là một record cố định 20 byte trong file log
+RATING_RECORD = np.dtype([('userId', '<i4'), ('movieId', '<i4'), ('rating', '<f4'), ('timestamp', '<i8')])
+
+
+class RatingLog:
+    """
+    Log append-only các rating mới, lưu dạng record nhị phân cố định
+
+    Ghi bằng một lệnh write O_APPEND (kèm flock nếu có) nên nhiều process có
+    thể cùng append. Record ghi dở ở cuối file (crash giữa chừng) bị bỏ qua khi
+    đọc và bị cắt đi ở lần append tiếp theo.
+    """
+
+    def __init__(self, path=RATING_LOG_PATH):
+        self.path = path
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path) // RATING_RECORD.itemsize
+        except OSError:
+            return 0
+
+    def append(self, records):
+        """Ghi thêm mảng record (RATING_RECORD) vào cuối log, trả về số record đã ghi"""
+        records = np.ascontiguousarray(records, dtype=RATING_RECORD)
+        if len(records) == 0:
+            return 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        payload = records.tobytes()
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            torn = os.fstat(fd).st_size % RATING_RECORD.itemsize
+            if torn:
+                os.ftruncate(fd, os.fstat(fd).st_size - torn)
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)  # đóng fd cũng nhả flock
+        return len(records)
+
+    def read(self, start=0):
+        """Đọc các record từ vị trí start tới record hoàn chỉnh cuối cùng"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(start * RATING_RECORD.itemsize)
+                data = f.read()
+        except FileNotFoundError:
+            return np.empty(0, dtype=RATING_RECORD)
+        usable = len(data) - len(data) % RATING_RECORD.itemsize
+        return np.frombuffer(data[:usable], dtype=RATING_RECORD)
+
+
+def to_frame(batch):
+    """Chuyển batch rating (DataFrame, list dict hoặc list tuple theo thứ tự RATING_RECORD) thành DataFrame"""
+    if isinstance(batch, pd.DataFrame):
+        return batch
+    rows = list(batch)
+    if rows and not isinstance(rows[0], dict):
+        return pd.DataFrame(rows, columns=list(RATING_RECORD.names[:len(rows[0])]))
+    return pd.DataFrame(rows, columns=None if rows else list(RATING_RECORD.names))
+
+
+def to_records(frame):
+    """
+    Chuyển DataFrame rating thành mảng RATING_RECORD
+
+    Thiếu timestamp thì dùng thời điểm hiện tại. Dòng có giá trị không phải số,
+    hoặc userId/movieId không phải số nguyên trong khoảng int32, bị bỏ.
+    """
+    missing = {'userId', 'movieId', 'rating'} - set(frame.columns)
+    if missing:
+        raise ValueError(f"missing rating columns: {sorted(missing)}")
+
+    now = int(time.time())
+    columns = {name: pd.to_numeric(frame[name], errors='coerce') for name in ('userId', 'movieId', 'rating')}
+    for name in ('userId', 'movieId'):
+        # Ép kiểu int32 sẽ cắt 1.5 thành 1 (hoặc tràn số): đánh dấu NaN để dòng bị loại
+        ids = columns[name].astype(float)
+        columns[name] = ids.where((ids == np.floor(ids)) & (ids.abs() <= np.iinfo(np.int32).max))
+    if 'timestamp' in frame.columns:
+        columns['timestamp'] = pd.to_numeric(frame['timestamp'], errors='coerce').fillna(now)
+    else:
+        columns['timestamp'] = pd.Series(now, index=frame.index)
+    clean = pd.DataFrame(columns).dropna()
+
+    records = np.empty(len(clean), dtype=RATING_RECORD)
+    for name in RATING_RECORD.names:
+        records[name] = clean[name].to_numpy()
+    return records
+
+
+class RatingIngestor:
+    """
+    Áp dụng rating mới lên catalog mà không đọc lại toàn bộ dữ liệu
+
+    Giữ tổng và số lượng rating của mỗi phim (running sums) để cập nhật
+    avg_rating/rating_count trong O(batch). movies_df là bản copy riêng tạo
+    một lần lúc khởi tạo; sync() ghi tại chỗ vào đó nên người giữ
+    ingestor.movies_df thấy ngay stats mới, còn frame truyền vào không bị sửa. Mọi batch được ghi vào RatingLog
+    trước, sau đó sync() đọc phần log chưa áp dụng, nên rating do process khác
+    ghi cũng được nhận. Lúc khởi tạo toàn bộ log được replay lên dữ liệu gốc.
+
+    Vị trí các phim có rating thay đổi được gom vào tập dirty để index
+    (leaderboard, item-CF) chỉ cần refresh phần bị ảnh hưởng. Ratings được
+    nối vào buffer theo cột có capacity tăng gấp đôi, nên mỗi batch chỉ tốn
+    O(batch) (trừ lần tăng capacity) thay vì concat lại toàn bộ lịch sử.
+    """
+
+    def __init__(self, movies_df, ratings=None, log=None):
+        self.log = log if log is not None else RatingLog()
+        self.lock = threading.RLock()
+        # Bản riêng của catalog với hai cột stats ghi được: mỗi batch chỉ sửa tại chỗ các phim thay đổi
+        self.movies_df = movies_df.assign(
+            avg_rating=movies_df['avg_rating'].to_numpy(dtype=np.float64, copy=True),
+            rating_count=movies_df['rating_count'].to_numpy(copy=True),
+        )
+        self._ratings = ratings
+        self._buffer = None  # cột numpy, tạo ở batch đầu tiên; _ratings là view [:_n_ratings]
+        self._n_ratings = len(ratings) if ratings is not None else 0
+        self.applied = 0
+        self._movie_pos = pd.Index(movies_df['movieId'].to_numpy())
+        self._dirty = np.zeros(len(movies_df), dtype=bool)
+
+        counts = movies_df['rating_count'].to_numpy(dtype=np.int64)
+        if ratings is not None:
+            positions = self.positions(ratings['movieId'])
+            known = positions >= 0
+            self.sums = np.bincount(positions[known], weights=ratings['rating'].to_numpy(dtype=np.float64)[known],
+                                    minlength=len(movies_df))
+            self.counts = np.bincount(positions[known], minlength=len(movies_df)).astype(np.int64)
+        else:
+            # Không có ratings gốc: sum suy ra từ avg_rating đã làm tròn 2 chữ số
+            self.sums = movies_df['avg_rating'].to_numpy(dtype=np.float64) * counts
+            self.counts = counts.copy()
+
+        self.sync()
+        self._dirty[:] = False
+
+    def positions(self, movie_ids):
+        """Vị trí trong catalog của các movieId, -1 nếu không có"""
+        return self._movie_pos.get_indexer(np.asarray(movie_ids))
+
+    def append(self, batch):
+        """
+        Ghi một batch rating (userId, movieId, rating, timestamp) vào log
+
+        Dòng thiếu giá trị, movieId không có trong catalog hoặc điểm ngoài
+        RATING_RANGE bị loại. Batch chỉ được áp dụng ở lần sync() kế tiếp, để
+        người gọi nhận được các rating mới và cập nhật index của mình.
+        Trả về (số dòng nhận, số dòng bị loại).
+        """
+        frame = to_frame(batch)
+        records = to_records(frame)
+        total = len(frame)
+        low, high = RATING_RANGE
+        valid = (self.positions(records['movieId']) >= 0) & (records['rating'] >= low) & (records['rating'] <= high)
+        records = records[valid]
+        self.log.append(records)
+        return len(records), total - len(records)
+
+    def sync(self):
+        """
+        Áp dụng các record trong log chưa được áp dụng (kể cả do process khác ghi)
+
+        Returns:
+            DataFrame các rating mới (userId, movieId, rating, timestamp), rỗng nếu không có gì mới
+        """
+        with self.lock:
+            records = self.log.read(self.applied)
+            if len(records) == 0:
+                return _ratings_frame(records)
+            self.applied += len(records)
+
+            positions = self.positions(records['movieId'])
+            records = records[positions >= 0]
+            positions = positions[positions >= 0]
+            self.sums += np.bincount(positions, weights=records['rating'].astype(np.float64), minlength=len(self.sums))
+            self.counts += np.bincount(positions, minlength=len(self.counts))
+            self._dirty[positions] = True
+            self._apply_stats(np.unique(positions))
+
+            new_ratings = _ratings_frame(records)
+            self._extend_ratings(new_ratings)
+            return new_ratings
+
+    @property
+    def ratings(self):
+        """Ratings gốc cùng mọi rating đã áp dụng (None nếu không có ratings gốc); frame là view trên buffer"""
+        with self.lock:
+            if self._ratings is None and self._buffer is not None:
+                self._ratings = pd.DataFrame({name: values[:self._n_ratings] for name, values in self._buffer.items()},
+                                             copy=False)
+            return self._ratings
+
+    def _extend_ratings(self, new_ratings):
+        """Nối new_ratings vào buffer; chỉ copy toàn bộ khi hết capacity (tăng gấp đôi)"""
+        if self._buffer is None and self._ratings is None:
+            return
+        current = self._buffer if self._buffer is not None else {
+            name: self._ratings[name].to_numpy() for name in self._ratings.columns
+        }
+        size, count = self._n_ratings, len(new_ratings)
+        if self._buffer is None or size + count > len(next(iter(self._buffer.values()))):
+            capacity = max(2 * (size + count), 1024)
+            self._buffer = {name: np.empty(capacity, dtype=values.dtype) for name, values in current.items()}
+            for name, values in current.items():
+                self._buffer[name][:size] = values[:size]
+        for name, values in self._buffer.items():
+            values[size:size + count] = new_ratings[name].to_numpy()
+        self._n_ratings = size + count
+        # Frame cũ vẫn là view hợp lệ của phần [:size]; frame mới được tạo lazily
+        self._ratings = None
+
+    def _apply_stats(self, changed):
+        """Ghi avg_rating/rating_count mới của các phim changed vào movies_df, tại chỗ (O(batch))"""
+        columns = self.movies_df.columns
+        self.movies_df.iloc[changed, columns.get_loc('avg_rating')] = np.round(
+            self.sums[changed] / self.counts[changed], 2)
+        self.movies_df.iloc[changed, columns.get_loc('rating_count')] = self.counts[changed]
+
+    @property
+    def dirty(self):
+        """Vị trí các phim có rating mới từ lần take_dirty() trước"""
+        return np.flatnonzero(self._dirty)
+
+    def take_dirty(self):
+        """Trả về rồi xóa tập phim dirty"""
+        with self.lock:
+            changed = self.dirty
+            self._dirty[:] = False
+            return changed
+
+
+def _ratings_frame(records):
+    return pd.DataFrame({
+        'userId': records['userId'].astype(np.int32),
+        'movieId': records['movieId'].astype(np.int32),
+        'rating': records['rating'].astype(np.float32),
+        'timestamp': records['timestamp'].astype(np.int32),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append rating mới (file tab-separated như u.data) vào rating log")
+    parser.add_argument("path", help="file userId<TAB>movieId<TAB>rating[<TAB>timestamp]")
+    parser.add_argument("--log", default=RATING_LOG_PATH, help="file rating log")
+    args = parser.parse_args()
+
+    from data_loader import load_data
+    movies_df, _, _ = load_data(with_ratings=False)
+    batch = pd.read_csv(args.path, sep="\t", header=None)
+    batch.columns = list(RATING_RECORD.names)[:batch.shape[1]]
+    accepted, rejected = RatingIngestor(movies_df, log=RatingLog(args.log)).append(batch)
+    print(f"Appended {accepted} ratings to {args.log} ({rejected} rejected)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,130 @@
 # recommend.py
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from config import (
     DEFAULT_MIN_RATING, DEFAULT_MIN_RATING_COUNT, DEFAULT_TOP_N,
     GENRE_WEIGHT, RATING_WEIGHT, SIMILARITY_WEIGHT, 
-    RATING_SCORE_WEIGHT, PREFERENCE_WEIGHT, TFIDF_MAX_FEATURES
+    RATING_SCORE_WEIGHT, PREFERENCE_WEIGHT, HYBRID_GATHER_MAX_FRACTION, TFIDF_MAX_FEATURES,
+    NEIGHBOR_TOP_K, GENRE_COLS, TRENDING_WEIGHT, TRENDING_DEFAULT_WINDOW, SERVE_MODE,
+    EMBEDDING_DIM, CONTENT_SEARCH_MODE, SEARCH_MODES
 )
 from search import fuzzy_search_movie_by_title
+from neighbor_index import NeighborIndex, build_neighbor_index, build_neighbor_index_on_disk
+from embeddings import build_item_embeddings, embedding_key
+from artifact_store import frame_digest
+from topk import top_k
+from utils import genre_mask, genre_masks_from_strings, popcount32
+from metrics import timed, record_error
 
-def build_similarity_matrix(movies_df):
-    """Xây dựng ma trận cosine similarity dựa trên genres"""
+# Cột thông tin phim trả về cùng điểm trong kết quả gợi ý
+RESULT_COLUMNS = ['movieId', 'title', 'genres', 'year', 'avg_rating', 'rating_count']
+
+def _genre_masks(movies_df):
+    """Bitmask genre uint32 của mỗi phim, tính từ cột genres nếu chưa có cột genre_mask"""
+    if 'genre_mask' in movies_df.columns:
+        return movies_df['genre_mask'].to_numpy(dtype=np.uint32)
+    return genre_masks_from_strings(movies_df['genres'].fillna('unknown').to_numpy(), GENRE_COLS)
+
+@timed("build_similarity_matrix")
+def build_similarity_matrix(movies_df, n_neighbors=NEIGHBOR_TOP_K, index_path=None, allow_build=not SERVE_MODE,
+                            workers=1, progress=None, embedding_dim=EMBEDDING_DIM):
+    """
+    Xây dựng content similarity giữa các phim
+
+    Mỗi phim là một embedding float32 embedding_dim chiều (genres, token title,
+    năm, rating; xem embeddings.py), similarity là tích vô hướng của hai embedding.
+    embedding_dim=None dùng TF-IDF trên chuỗi genres như trước.
+
+    Mặc định trả về NeighborIndex chỉ giữ n_neighbors láng giềng của mỗi phim, kèm vectors.
+    Truyền n_neighbors=None để lấy ma trận cosine N x N đầy đủ.
+    Nếu có index_path và index đã lưu khớp catalog (cùng digest movieId, genres, title,
+    year và cấu hình embedding) thì memory-map index đó thay vì build lại; sklearn chỉ
+    được import khi phải fit. Rating trong embedding là snapshot lúc build, rating
+    ingest thêm sau đó không làm index bị build lại.
+    allow_build=False (serve mode) thì không fit mà trả về (None, indices) nếu chưa có index.
+    Khi có index_path, index được build theo block vào file memory-map (workers process,
+    resume được nếu bị ngắt, progress(done, total) sau mỗi block).
+    """
     if movies_df.empty or 'genres' not in movies_df.columns:
         return None, None
     
-    # Fill missing genres và build TF-IDF matrix
-    genres_filled = movies_df['genres'].fillna('unknown')
-    tfidf = TfidfVectorizer(stop_words='english', max_features=TFIDF_MAX_FEATURES)
-    tfidf_matrix = tfidf.fit_transform(genres_filled)
+    indices = pd.Series(movies_df.index, index=movies_df['title'].fillna('unknown'))
+    indices = indices[~indices.index.duplicated()]  # title trùng: dùng phim xuất hiện đầu tiên
+    
+    model = embedding_key(embedding_dim) if embedding_dim else "tfidf"
+    catalog_cols = ['movieId', 'genres'] + (['title', 'year'] if embedding_dim else [])
+    catalog = frame_digest(movies_df, [c for c in catalog_cols if c in movies_df.columns]) if index_path else None
+    if n_neighbors is not None and index_path:
+        neighbor_index = NeighborIndex.load(index_path)
+        if (neighbor_index is not None and neighbor_index.meta.get('catalog') == catalog
+                and neighbor_index.meta.get('model', 'tfidf') == model
+                and neighbor_index.shape[1] >= n_neighbors and neighbor_index.vectors is not None):
+            return neighbor_index, indices
     
-    # Compute cosine similarity và create indices
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-    indices = pd.Series(movies_df.index, index=movies_df['title'].fillna('unknown')).drop_duplicates()
+    if not allow_build:
+        record_error("build_similarity_matrix", "prebuilt neighbor index missing or stale")
+        print("Warning: Neighbor index missing or stale; run `python build_artifacts.py` (serve mode does not fit models)")
+        return None, indices
     
-    return cosine_sim, indices
+    if embedding_dim:
+        # Embedding dense, nhỏ (N x embedding_dim float32): similarity là phép nhân ma trận dense
+        matrix = build_item_embeddings(movies_df, embedding_dim)
+        vectors = np.asfortranarray(matrix)
+    else:
+        # Import sklearn mất ~1.5s nên chỉ import khi thật sự fit TF-IDF
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        # Fill missing genres và build TF-IDF matrix (các hàng đã chuẩn hóa L2)
+        genres_filled = movies_df['genres'].fillna('unknown')
+        tfidf = TfidfVectorizer(stop_words='english', max_features=TFIDF_MAX_FEATURES)
+        matrix = tfidf.fit_transform(genres_filled)
+        # Vector genre TF-IDF rất hẹp (N x số token genre) nên giữ dense cho hybrid ranking toàn catalog
+        vectors = np.asfortranarray(matrix.toarray(), dtype=np.float32)
+    
+    if n_neighbors is None:
+        # Các hàng đã chuẩn hóa L2 nên tích vô hướng chính là cosine similarity
+        full = matrix @ matrix.T
+        return (full.toarray() if hasattr(full, 'toarray') else full), indices
+    
+    if index_path:
+        try:
+            neighbor_index = build_neighbor_index_on_disk(
+                matrix, index_path, k=n_neighbors, workers=workers, meta={'catalog': catalog, 'model': model},
+                dense_vectors=vectors, progress=progress
+            )
+            return neighbor_index, indices
+        except OSError as e:
+            record_error("build_similarity_matrix.save", e)
+            print(f"Warning: Could not save neighbor index: {e}")
+    
+    neighbor_index = build_neighbor_index(matrix, k=n_neighbors)
+    neighbor_index.vectors = vectors
+    return neighbor_index, indices
+
+def _ann_candidates(cosine_sim, idx, mode, ann):
+    """
+    (vị trí, similarity) của các phim ứng viên từ ANN index khi mode="approx"
+
+    Trả về None (dùng exact) nếu mode="exact" hoặc không có ANN index / vectors.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"unknown search mode '{mode}'")
+    if mode == "exact" or ann is None or getattr(cosine_sim, 'vectors', None) is None:
+        return None
+    return ann.candidates(np.asarray(cosine_sim.vectors[idx]))
 
-def recommend(title, movies_df, cosine_sim, indices, top_n=10, return_scores=False):
-    """Gợi ý phim tương tự dựa trên cosine similarity"""
+@timed("recommend")
+def recommend(title, movies_df, cosine_sim, indices, top_n=10, return_scores=False, mode=CONTENT_SEARCH_MODE,
+              ann=None):
+    """
+    Gợi ý phim tương tự dựa trên cosine similarity
+
+    mode="exact" đọc top-K láng giềng đã tính sẵn (hoặc quét ma trận dense);
+    khi top_n lớn hơn K thì tính lại cả hàng similarity từ vectors (nếu index
+    không có vectors thì chỉ trả về tối đa K phim).
+    mode="approx" tìm trong ANN index (ann_index.py) nên không cần neighbor
+    index đầy đủ và vẫn trả về được nhiều hơn K phim.
+    """
     # Fallback search if title not found
     if title not in indices:
         similar = movies_df[movies_df['title'].str.contains(title, case=False, na=False)]
@@ -35,74 +132,225 @@ def recommend(title, movies_df, cosine_sim, indices, top_n=10, return_scores=Fal
             # Try with first match
             best_match = similar.iloc[0]['title']
             if best_match in indices:
-                return recommend(best_match, movies_df, cosine_sim, indices, top_n, return_scores)
-            return similar[['title', 'genres', 'year', 'avg_rating', 'rating_count']].head(5)
+                return recommend(best_match, movies_df, cosine_sim, indices, top_n, return_scores, mode, ann)
+            return similar[['movieId', 'title', 'genres', 'year', 'avg_rating', 'rating_count']].head(5)
         return pd.DataFrame()
     
     # Get similarity scores
     idx = indices[title]
-    sim_scores = list(enumerate(cosine_sim[idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1:top_n+1]
+    approx = _ann_candidates(cosine_sim, idx, mode, ann)
+    if approx is not None:
+        positions, similarity = approx
+        order = top_k(similarity, top_n, exclude=np.flatnonzero(positions == idx))
+        movie_indices, scores = positions[order], similarity[order]
+    elif isinstance(cosine_sim, NeighborIndex) and (top_n <= cosine_sim.shape[1] or cosine_sim.vectors is None):
+        movie_indices, scores = cosine_sim.query(idx, top_n)
+    else:
+        row = _similarity_row(cosine_sim, idx)
+        movie_indices = top_k(row, top_n, exclude=idx)
+        scores = row[movie_indices]
     
     # Create result
-    movie_indices = [i[0] for i in sim_scores]
-    result = movies_df.iloc[movie_indices][['title', 'genres', 'year', 'avg_rating', 'rating_count']].copy()
+    result = movies_df[['movieId', 'title', 'genres', 'year', 'avg_rating', 'rating_count']].iloc[movie_indices]
     
     if return_scores:
-        result['similarity_score'] = [round(score[1], 3) for score in sim_scores]
+        result['similarity_score'] = np.round(np.asarray(scores, dtype=float), 3)
     
     return result
 
-def recommend_by_genres(movies_df, preferred_genres, top_n=DEFAULT_TOP_N, min_rating=DEFAULT_MIN_RATING, min_rating_count=DEFAULT_MIN_RATING_COUNT):
-    """Gợi ý phim theo thể loại yêu thích với điểm rating"""
+@timed("recommend_by_genres")
+def recommend_by_genres(movies_df, preferred_genres, top_n=DEFAULT_TOP_N, min_rating=DEFAULT_MIN_RATING, min_rating_count=DEFAULT_MIN_RATING_COUNT, leaderboards=None):
+    """
+    Gợi ý phim theo thể loại yêu thích với điểm rating
+
+    Nếu có leaderboards (GenreLeaderboards build cho cùng catalog) thì chỉ cắt
+    các bảng xếp hạng đã build sẵn thay vì chấm điểm cả catalog.
+    """
     if isinstance(preferred_genres, str):
         preferred_genres = [preferred_genres]
     
     if not preferred_genres or movies_df.empty:
         return pd.DataFrame()
     
-    # Tính genre score
-    movies_copy = movies_df.copy()
-    movies_copy['genre_score'] = 0.0
+    if leaderboards is not None and len(leaderboards) == len(movies_df):
+        positions, genre_score, final_score = leaderboards.query(
+            preferred_genres, top_n, min_rating=min_rating, min_rating_count=min_rating_count
+        )
+        if positions.size == 0:
+            return pd.DataFrame()
+        result = movies_df[['movieId', 'title', 'genres', 'year', 'avg_rating', 'rating_count']].iloc[positions]
+        result['genre_score'] = genre_score
+        result['final_score'] = final_score
+        return result
     
-    for genre in preferred_genres:
-        if genre:
-            mask = movies_copy['genres'].str.contains(genre, case=False, na=False)
-            movies_copy.loc[mask, 'genre_score'] += 1.0
+    # Tính genre score bằng bitmask: số genre yêu thích mà phim có
+    genre_score = popcount32(_genre_masks(movies_df) & genre_mask(preferred_genres, GENRE_COLS))
+    avg_rating = movies_df['avg_rating'].to_numpy(dtype=float)
+    rating_count = movies_df['rating_count'].to_numpy(dtype=float)
     
     # Filter movies
-    result = movies_copy[
-        (movies_copy['genre_score'] > 0) & 
-        (movies_copy['avg_rating'] >= min_rating) & 
-        (movies_copy['rating_count'] >= min_rating_count)
-    ].copy()
+    keep = np.flatnonzero(
+        (genre_score > 0) & 
+        (avg_rating >= min_rating) & 
+        (rating_count >= min_rating_count)
+    )
     
-    if result.empty:
+    if keep.size == 0:
         return pd.DataFrame()
     
     # Calculate final score
-    max_genre_score = result['genre_score'].max()
-    result['genre_score_norm'] = result['genre_score'] / max_genre_score if max_genre_score > 0 else 0
-    result['final_score'] = (result['avg_rating'] / 5.0) * RATING_WEIGHT + result['genre_score_norm'] * GENRE_WEIGHT
+    genre_score_norm = genre_score[keep] / genre_score[keep].max()
+    final_score = (avg_rating[keep] / 5.0) * RATING_WEIGHT + genre_score_norm * GENRE_WEIGHT
+    order = top_k(final_score, top_n, tiebreak=rating_count[keep])
     
-    return result.sort_values(['final_score', 'rating_count'], ascending=[False, False]).head(top_n)[
-        ['title', 'genres', 'year', 'avg_rating', 'rating_count', 'genre_score', 'final_score']
-    ]
+    result = movies_df[['movieId', 'title', 'genres', 'year', 'avg_rating', 'rating_count']].iloc[keep[order]]
+    result['genre_score'] = genre_score[keep[order]].astype(float)
+    result['final_score'] = final_score[order]
+    return result
 
-def get_genre_recommendations(movies_df, cosine_sim, indices, genres_list, top_n=5):
-    """Gợi ý phim cho từng thể loại"""
+def get_genre_recommendations(movies_df, cosine_sim, indices, genres_list, top_n=5, leaderboards=None):
+    """Gợi ý phim cho từng thể loại, lấy phim đứng đầu bảng xếp hạng của genre làm seed"""
     recommendations = {}
     
     for genre in genres_list:
-        genre_movies = movies_df[movies_df['genres'].str.contains(genre, case=False, na=False)]
-        if not genre_movies.empty:
-            seed_movie = genre_movies.iloc[0]['title']
+        # Seed là phim rating cao nhất của genre (đủ ngưỡng mặc định), nếu không có thì bỏ ngưỡng
+        top = recommend_by_genres(movies_df, [genre], top_n=1, leaderboards=leaderboards)
+        if top.empty:
+            top = recommend_by_genres(movies_df, [genre], top_n=1, min_rating=0, min_rating_count=0,
+                                      leaderboards=leaderboards)
+        if not top.empty:
+            seed_movie = top.iloc[0]['title']
             recommendations[genre] = recommend(seed_movie, movies_df, cosine_sim, indices, top_n)
     
     return recommendations
 
-def hybrid_recommend(title, movies_df, cosine_sim, indices, user_preferences=None, top_n=DEFAULT_TOP_N):
-    """Hybrid recommendation kết hợp content-based, user preferences và ratings với fuzzy search"""
+def _result_frame(movies_df, rows, scores):
+    """
+    Các cột thông tin phim ở vị trí rows ghép với các cột điểm, dựng DataFrame một lần
+
+    Gán từng cột điểm vào kết quả iloc tốn gần 1 ms mỗi cột trên catalog lớn,
+    nhiều hơn cả phần chấm điểm.
+    """
+    data = {col: movies_df[col].array.take(rows) for col in RESULT_COLUMNS}
+    data.update(scores)
+    return pd.DataFrame(data, index=movies_df.index[rows], copy=False)
+
+def _similarity_row(cosine_sim, idx):
+    """Similarity của phim idx với toàn catalog, từ NeighborIndex hoặc ma trận dense"""
+    if isinstance(cosine_sim, NeighborIndex):
+        return cosine_sim.similarity_row(idx)
+    return np.asarray(cosine_sim[idx], dtype=np.float32).ravel()
+
+def _preference_parts(movies_df, user_preferences, trend=None):
+    """
+    (parts, max_rest): parts(rows) -> (avg_rating, bonus_index, trend) của các phim ở vị trí rows
+    (None là cả catalog), max_rest() là cận trên của _rest_score trên cả catalog
+
+    Preference: 0.1 cho mỗi genre yêu thích mà phim có, +0.05 nếu năm nằm trong year_range,
+    tức bonus = 0.05 * bonus_index với bonus_index = genre_hits*2 + in_year (uint8, tối đa 65).
+    Các cột được đọc một lần, mỗi lần gọi chỉ gather các vị trí cần chấm.
+    """
+    avg_rating = movies_df['avg_rating'].to_numpy(dtype=float)
+    masks = _genre_masks(movies_df)
+    preferred_mask = genre_mask(user_preferences.get('genres', []), GENRE_COLS)
+    year_range = user_preferences.get('year_range', None)
+    year = movies_df['year'].to_numpy(dtype=float) if year_range and len(year_range) == 2 else None
+    
+    def parts(rows=None):
+        def take(values):
+            return values if rows is None else values[rows]
+        
+        ratings = take(avg_rating)
+        if np.isnan(ratings).any():
+            ratings = np.nan_to_num(ratings, nan=3.0)
+        bonus_index = popcount32(take(masks) & preferred_mask, dtype=np.uint8)
+        bonus_index <<= 1
+        if year is not None:
+            years = take(year)
+            with np.errstate(invalid='ignore'):
+                in_year = years >= year_range[0]
+                in_year &= years <= year_range[1]
+            bonus_index += in_year
+        return ratings, bonus_index, None if trend is None else take(trend)
+    
+    def max_rest():
+        """Từ giá trị lớn nhất của từng thành phần, không phải chấm từng phim"""
+        bonus = 2 * bin(preferred_mask).count("1") + (year is not None)
+        value = float(np.fmax(np.fmax.reduce(avg_rating), 3.0)) * RATING_SCORE_WEIGHT / 5.0
+        value += bonus * 0.05 * PREFERENCE_WEIGHT
+        if trend is not None:
+            value += float(trend.max()) * TRENDING_WEIGHT
+        return value
+    
+    return parts, max_rest
+
+def _rest_score(avg_rating, bonus_index, trend=None):
+    """Phần điểm hybrid không phụ thuộc similarity, cộng dồn vào một buffer float32"""
+    rest = np.multiply(avg_rating, RATING_SCORE_WEIGHT / 5.0, dtype=np.float32)
+    rest += np.multiply(bonus_index, np.float32(0.05 * PREFERENCE_WEIGHT), dtype=np.float32)
+    if trend is not None:
+        rest += trend * np.float32(TRENDING_WEIGHT)
+    return rest
+
+def _hybrid_candidates(cosine_sim, idx, top_n, parts, max_rest):
+    """
+    (vị trí, similarity) của các phim có thể vào top_n hybrid, None nếu phải chấm toàn catalog
+
+    Ngưỡng là điểm thứ top_n (chấm đủ) của các láng giềng content. Phim có cận
+    trên similarity (NeighborIndex.similarity_bound) cộng cận trên rest của cả
+    catalog (max_rest) dưới ngưỡng thì không thể vào top_n; các phim còn
+    lại mới được tính rest, ngưỡng được siết bằng top_n phim có upper cao nhất
+    rồi chỉ phim có upper đạt ngưỡng được chấm đủ. Kết quả giống hệt quét toàn catalog.
+    """
+    if not isinstance(cosine_sim, NeighborIndex) or cosine_sim.vectors is None or top_n <= 0:
+        return None
+    neighbors, _ = cosine_sim.query(idx, cosine_sim.shape[1])
+    neighbors = neighbors[neighbors != idx]
+    if len(neighbors) < top_n:
+        return None
+    
+    vectors = cosine_sim.vectors
+    query = np.asarray(vectors[idx])
+    weight = np.float32(SIMILARITY_WEIGHT)
+    # Trừ thêm một khoảng nhỏ cho sai số float32 giữa cận trên và điểm tính đủ
+    slack = 1e-5
+    
+    def kth_score(rows):
+        """Điểm đủ thứ top_n trong các phim rows: không lớn hơn điểm thứ top_n của cả catalog"""
+        scores = _rest_score(*parts(rows)) + (vectors[rows] @ query) * weight
+        return float(np.partition(scores, len(scores) - top_n)[len(scores) - top_n]) - slack
+    
+    threshold = kth_score(neighbors)
+    bound = cosine_sim.similarity_bound(idx)
+    positions = np.flatnonzero(bound >= (threshold - max_rest()) / SIMILARITY_WEIGHT)
+    positions = positions[positions != idx]
+    upper = _rest_score(*parts(positions))
+    upper += bound[positions] * weight
+    if len(positions) > top_n:
+        head = positions[np.argpartition(upper, len(positions) - top_n)[len(positions) - top_n:]]
+        threshold = max(threshold, kth_score(np.union1d(neighbors, head)))
+    positions = positions[upper >= threshold]
+    if len(positions) > len(bound) * HYBRID_GATHER_MAX_FRACTION:
+        # Nhiều ứng viên: gather từng hàng chậm hơn một phép nhân cả catalog
+        return positions, _similarity_row(cosine_sim, idx)[positions]
+    return positions, vectors[positions] @ query
+
+@timed("hybrid_recommend")
+def hybrid_recommend(title, movies_df, cosine_sim, indices, user_preferences=None, top_n=DEFAULT_TOP_N,
+                     trending=None, trending_window=TRENDING_DEFAULT_WINDOW, mode=CONTENT_SEARCH_MODE, ann=None):
+    """
+    Hybrid recommendation kết hợp content-based, user preferences và ratings với fuzzy search
+
+    Khi có user_preferences (hoặc trending), điểm rating và preference được tính
+    bằng NumPy trên các cột đã tính sẵn (genre_mask, year, avg_rating), cộng
+    similarity rồi chọn top-K trên toàn catalog, nên phim hợp sở thích nằm
+    ngoài nhóm láng giềng gần nhất vẫn có thể được gợi ý. Chỉ các phim còn có
+    thể vào top-K mới được chấm (cận trên exact, xem _hybrid_candidates).
+    Nếu truyền TrendingScores thì trend score (đã chuẩn hóa) của window được
+    cộng thêm với TRENDING_WEIGHT.
+    Với mode="approx" chỉ các phim trong các inverted list ANN gần phim đầu vào
+    nhất được chấm điểm thay vì toàn catalog.
+    """
     # Try exact match first, then fuzzy search
     if title not in indices:
         fuzzy_results = fuzzy_search_movie_by_title(title, movies_df)
@@ -111,35 +359,57 @@ def hybrid_recommend(title, movies_df, cosine_sim, indices, user_preferences=Non
         else:
             return pd.DataFrame()  # No matches found
     
-    # Get content-based recommendations
-    content_recs = recommend(title, movies_df, cosine_sim, indices, top_n*2, return_scores=True)
+    if not user_preferences and trending is None:
+        return recommend(title, movies_df, cosine_sim, indices, top_n, return_scores=True, mode=mode, ann=ann)
     
-    if content_recs.empty or not user_preferences:
-        return content_recs.head(top_n)
+    idx = indices[title]
+    trend = None if trending is None else trending.normalized(trending_window)
+    parts, max_rest = _preference_parts(movies_df, user_preferences or {}, trend)
     
-    # Add user preference scoring (explicitly set as float to avoid dtype warning)
-    content_recs['bonus_score'] = 0.0
+    # rows: vị trí các phim được chấm (None là cả catalog) cùng similarity của chúng
+    candidates = _ann_candidates(cosine_sim, idx, mode, ann)
+    if candidates is None:
+        candidates = _hybrid_candidates(cosine_sim, idx, top_n, parts, max_rest)
+    if candidates is None:
+        rows, similarity = None, _similarity_row(cosine_sim, idx)
+    else:
+        rows, similarity = candidates
     
-    # Genre preferences
-    for genre in user_preferences.get('genres', []):
-        if genre:
-            mask = content_recs['genres'].str.contains(genre, case=False, na=False)
-            content_recs.loc[mask, 'bonus_score'] += 0.1
+    rest = _rest_score(*parts(rows))
+    rest[idx if rows is None else rows == idx] = -np.inf  # bỏ chính phim đầu vào
+    rating_count = movies_df['rating_count'].to_numpy()
+    if rows is not None:
+        rating_count = rating_count[rows]
+    final_score = rest + similarity * np.float32(SIMILARITY_WEIGHT)
+    order = top_k(final_score, top_n, tiebreak=rating_count)
+    picked = order if rows is None else rows[order]
     
-    # Year preferences
-    year_range = user_preferences.get('year_range', None)
-    if year_range and len(year_range) == 2:
-        year_mask = (content_recs['year'].notna() & 
-                    (content_recs['year'] >= year_range[0]) & 
-                    (content_recs['year'] <= year_range[1]))
-        content_recs.loc[year_mask, 'bonus_score'] += 0.05
-    
-    # Calculate final hybrid score
-    content_recs['rating_score'] = content_recs['avg_rating'].fillna(3.0) / 5.0
-    content_recs['final_score'] = (
-        content_recs['similarity_score'].fillna(0) * SIMILARITY_WEIGHT + 
-        content_recs['rating_score'] * RATING_SCORE_WEIGHT + 
-        content_recs['bonus_score'] * PREFERENCE_WEIGHT
-    )
+    avg_rating, bonus_index, trend_score = parts(picked)
+    scores = {
+        'similarity_score': np.round(similarity[order].astype(float), 3),
+        'bonus_score': np.round(bonus_index * 0.05, 3),
+        'rating_score': avg_rating / 5.0,
+    }
+    if trend is not None:
+        scores['trend_score'] = np.round(trend_score.astype(float), 3)
+    scores['final_score'] = np.round(final_score[order].astype(float), 4)
+    return _result_frame(movies_df, picked, scores)
+
+@timed("als_recommend")
+def als_recommend(user_id, movies_df, als_model, top_n=DEFAULT_TOP_N, exclude_seen=True):
+    """Gợi ý cá nhân hóa cho một user từ matrix factorization (ALS)"""
+    if als_model is None or movies_df.empty:
+        return pd.DataFrame()
     
-    return content_recs.sort_values(['final_score', 'rating_count'], ascending=[False, False]).head(top_n)
+    user_pos = als_model.user_index(user_id)
+    if user_pos is None:
+        return pd.DataFrame()
+    
+    # Một phép nhân ma trận-vector cho toàn catalog rồi chọn top-K, bỏ phim user đã xem
+    scores = als_model.score_items(user_pos)
+    exclude = als_model.seen_items(user_pos) if exclude_seen else None
+    order = top_k(scores, top_n, exclude=exclude)
+    
+    result = movies_df.iloc[order][['movieId', 'title', 'genres', 'year', 'avg_rating', 'rating_count']].copy()
+    result['predicted_rating'] = np.round(np.clip(scores[order], 1.0, 5.0), 2)
+    return result
@@ -0,0 +1,244 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+import numpy as np
+from config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_PATH, ARTIFACT_VERSION
+from artifact_store import frame_digest
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_kind_version ON results (kind, version);
+"""
+
+
+def normalize_param(value):
+    """
+    Chuẩn hóa một tham số để các query tương đương cho cùng một key
+
+    Chuỗi: bỏ khoảng trắng thừa; list/tuple/set chuỗi (genres): sort;
+    dict (user_preferences): sort theo key, bỏ giá trị None; float: làm tròn 6 chữ số.
+    Phân biệt hoa/thường được giữ nguyên, caller tự casefold khi hàm không phân biệt.
+    """
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): normalize_param(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))
+                if v is not None}
+    if isinstance(value, (list, tuple, set)):
+        items = [normalize_param(v) for v in value]
+        if isinstance(value, set) or all(isinstance(v, str) for v in items):
+            items = sorted(items)
+        return items
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def _model_fingerprint(model):
+    if model is None:
+        return "-"
+    meta = getattr(model, "meta", None)
+    if meta:
+        return json.dumps(meta, sort_keys=True)
+    # Model không có meta (ALS, index đã refresh, ma trận dense): hash vài hàng đầu của factors/ma trận
+    array = getattr(model, "item_factors", getattr(model, "neighbors", model))
+    head = np.ascontiguousarray(np.asarray(array[:8]))
+    return f"{type(model).__name__}:{np.shape(array)}:{hashlib.sha1(head.tobytes()).hexdigest()[:12]}"
+
+
+def data_version(movies_df, *models):
+    """Version của dữ liệu + model: đổi khi catalog, rating stats hoặc bất kỳ model nào đổi"""
+    columns = [c for c in ("movieId", "title", "genres", "avg_rating", "rating_count") if c in movies_df.columns]
+    parts = [str(ARTIFACT_VERSION), frame_digest(movies_df, columns)]
+    parts += [_model_fingerprint(model) for model in models]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Cache kết quả query theo version dữ liệu/model
+
+    Tầng 1 là LRU + TTL trong memory của process; tầng 2 (nếu có path) là bảng
+    SQLite chia sẻ giữa các session và process, value được pickle. Key gồm
+    kind, namespace, version hiện tại và các tham số đã chuẩn hóa, nên khi dữ
+    liệu hoặc model đổi version các entry cũ không bao giờ được trả về nữa.
+    kind tách các loại process dùng chung file ("app" lưu DataFrame, "service"
+    lưu records JSON): mỗi loại có version riêng và chỉ dọn entry của mình.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, path=RESULT_CACHE_PATH, kind="app"):
+        self.kind = kind
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.version = ""
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._create_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Đóng kết nối SQLite của thread hiện tại (vd. trước khi fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _create_schema(self):
+        conn = self._conn()
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(results)")]
+        if columns and "kind" not in columns:
+            # File cache tạo bởi bản cũ (không có cột kind): nội dung chỉ là cache nên bỏ đi
+            conn.execute("DROP TABLE results")
+        conn.executescript(_SCHEMA)
+
+    def set_version(self, version: str):
+        """
+        Đổi version dữ liệu/model; bỏ entry memory
+
+        Ở tầng shared chỉ xóa entry cùng kind nhưng khác version, cùng các entry
+        đã hết TTL; entry của loại process khác được giữ nguyên.
+        """
+        version = str(version)
+        if version == self.version:
+            return
+        with self._lock:
+            self.version = version
+            self._entries.clear()
+        if self.path:
+            try:
+                self._conn().execute("DELETE FROM results WHERE (kind = ? AND version != ?) OR expires_at <= ?",
+                                     (self.kind, version, time.time()))
+            except sqlite3.Error as e:
+                print(f"Warning: Could not purge result cache: {e}")
+
+    def make_key(self, namespace: str, **params) -> str:
+        payload = json.dumps([self.kind, namespace, self.version, normalize_param(params)], sort_keys=True,
+                             default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Trả về (found, value), tìm trong memory trước rồi tới tầng shared"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return True, entry[1]
+                del self._entries[key]
+                self.counters["expired"] += 1
+
+        if self.path:
+            try:
+                row = self._conn().execute(
+                    "SELECT value, expires_at FROM results WHERE key = ? AND kind = ? AND version = ?",
+                    (key, self.kind, self.version)
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None and row[1] > now:
+                value = pickle.loads(row[0])
+                self._remember(key, value, row[1])
+                self._count("shared_hits")
+                return True, value
+
+        self._count("misses")
+        return False, None
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._remember(key, value, expires_at)
+        if self.path:
+            try:
+                self._conn().execute(
+                    "INSERT OR REPLACE INTO results (key, kind, version, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, self.kind, self.version, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at),
+                )
+            except sqlite3.Error as e:
+                print(f"Warning: Could not write result cache: {e}")
+
+    def get_or_compute(self, namespace: str, compute: Callable[[], Any], **params) -> Any:
+        """Trả về kết quả đã cache cho (namespace, params), nếu chưa có thì gọi compute() và lưu lại"""
+        key = self.make_key(namespace, **params)
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        """Xóa toàn bộ cache của kind này (memory và shared)"""
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            self._conn().execute("DELETE FROM results WHERE kind = ?", (self.kind,))
+
+    def stats(self) -> dict:
+        """Counters hit/miss/eviction cùng số entry hiện có"""
+        with self._lock:
+            stats = dict(self.counters, entries=len(self._entries), kind=self.kind, version=self.version)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """ResultCache kind "app" dùng chung trong process (mở lazily ở lần dùng đầu)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ResultCache()
+                except sqlite3.Error as e:
+                    print(f"Warning: Shared result cache unavailable, using memory only: {e}")
+                    _cache = ResultCache(path=None)
+    return _cache
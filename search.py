@@ -1,128 +1,96 @@
 # search.py
-try:
-    from fuzzywuzzy import fuzz, process
-    FUZZYWUZZY_AVAILABLE = True
-except ImportError:
-    FUZZYWUZZY_AVAILABLE = False
-    print("Warning: fuzzywuzzy not installed. Using basic string matching.")
-
 import pandas as pd
 from config import FUZZY_MIN_SCORE, FUZZY_CONFIDENCE_THRESHOLD, DEFAULT_TOP_N
+from utils import preprocess_title
+from search_index import get_search_index, FUZZYWUZZY_AVAILABLE
+from metrics import timed
 
-def preprocess_title(title):
-    """Tiền xử lý title để so sánh tốt hơn"""
-    if pd.isna(title) or not title:
-        return ""
-    
-    # Chuyển về lowercase và loại bỏ khoảng trắng thừa
-    title = str(title).lower().strip()
-    
-    # Loại bỏ "the", "a", "an" ở đầu
-    prefixes = ["the ", "a ", "an "]
-    for prefix in prefixes:
-        if title.startswith(prefix):
-            title = title[len(prefix):]
-            break
-    
-    return title
+# preprocess_title được re-export cho code cũ vẫn import từ search
+__all__ = ["preprocess_title", "get_movie_data", "fuzzy_search_movie_by_title", "autocomplete_titles",
+           "search_movie_by_title"]
+
+if not FUZZYWUZZY_AVAILABLE:
+    print("Warning: fuzzywuzzy not installed. Using trigram matching only.")
 
 def get_movie_data(movie_id, movies_df):
     """Get movie data by movie ID"""
     return movies_df[movies_df["movieId"] == movie_id].reset_index(drop=True)
 
-def fuzzy_search_movie_by_title(q, movies_df, top_n=DEFAULT_TOP_N, min_score=FUZZY_CONFIDENCE_THRESHOLD):
+@timed("fuzzy_search_movie_by_title")
+def fuzzy_search_movie_by_title(q, movies_df, top_n=DEFAULT_TOP_N, min_score=FUZZY_CONFIDENCE_THRESHOLD, search_index=None):
     """
-    Tìm kiếm phim sử dụng fuzzy matching với fuzzywuzzy
+    Tìm kiếm phim sử dụng fuzzy matching trên trigram index
     
     Args:
         q: Query string
         movies_df: DataFrame chứa phim
         top_n: Số lượng kết quả trả về
         min_score: Điểm tối thiểu để coi là match (0-100)
+        search_index: TitleSearchIndex đã build sẵn (mặc định lấy từ cache theo catalog)
     
     Returns:
         DataFrame với các phim match và confidence score
     """
-    if not FUZZYWUZZY_AVAILABLE:
-        # Fallback về exact search đơn giản
-        q_norm = q.strip().lower()
-        exact_matches = movies_df[movies_df["title"].str.lower().str.contains(q_norm, na=False)]
-        result = exact_matches.head(top_n).reset_index(drop=True)
-        if not result.empty:
-            result['confidence_score'] = 100
-        return result
-    
-    if not q.strip():
+    if not q.strip() or movies_df.empty:
         return pd.DataFrame()
     
-    # Preprocess query
-    query_processed = preprocess_title(q)
+    if search_index is None:
+        search_index = get_search_index(movies_df)
     
-    # Tạo dictionary mapping title -> index để dễ lookup
-    title_to_index = {}
-    for idx, title in enumerate(movies_df['title'].fillna('')):
-        processed_title = preprocess_title(title)
-        if processed_title:  # Chỉ add non-empty titles
-            title_to_index[processed_title] = idx
-    
-    # Sử dụng fuzzywuzzy để tìm matches
-    processed_titles = list(title_to_index.keys())
-    matches = process.extract(
-        query_processed, 
-        processed_titles, 
-        scorer=fuzz.WRatio,
-        limit=top_n * 2
-    )
-    
-    # Filter và tạo kết quả
-    result_indices = []
-    confidence_scores = []
-    
-    for match_title, score in matches:
-        if score >= min_score and match_title in title_to_index:
-            idx = title_to_index[match_title]
-            result_indices.append(idx)
-            confidence_scores.append(score)
-            
-            if len(result_indices) >= top_n:
-                break
-    
-    if not result_indices:
+    # Lọc ứng viên bằng trigram rồi chấm điểm fuzzy trên shortlist
+    matches = search_index.fuzzy_search(q, top_n, min_score)
+    if not matches:
         return pd.DataFrame()
     
     # Tạo result DataFrame
-    result_df = movies_df.iloc[result_indices].copy()
-    result_df['confidence_score'] = confidence_scores
+    result_df = movies_df.iloc[[pos for pos, _ in matches]].copy()
+    result_df['confidence_score'] = [score for _, score in matches]
     
     return result_df.reset_index(drop=True)
 
-def search_movie_by_title(q, movies_df, top_n=DEFAULT_TOP_N, use_fuzzy=True):
+@timed("autocomplete_titles")
+def autocomplete_titles(prefix, movies_df, top_n=DEFAULT_TOP_N, search_index=None):
+    """Gợi ý title khi người dùng đang gõ, xếp theo độ phổ biến (rating_count)"""
+    if not prefix.strip() or movies_df.empty:
+        return []
+    
+    if search_index is None:
+        search_index = get_search_index(movies_df)
+    
+    positions = search_index.prefix_search(prefix, top_n)
+    return movies_df['title'].iloc[positions].tolist()
+
+@timed("search_movie_by_title")
+def search_movie_by_title(q, movies_df, top_n=DEFAULT_TOP_N, use_fuzzy=True, search_index=None):
     """
-    Tìm kiếm phim với hybrid approach: exact search + fuzzy search
+    Tìm kiếm phim với hybrid approach: prefix search + fuzzy search
     
     Args:
         q: Query string
         movies_df: DataFrame chứa phim
         top_n: Số lượng kết quả
         use_fuzzy: Có sử dụng fuzzy search không
+        search_index: TitleSearchIndex đã build sẵn (mặc định lấy từ cache theo catalog)
     """
-    if not q.strip():
+    if not q.strip() or movies_df.empty:
         return pd.DataFrame()
     
-    q_norm = q.strip().lower()
+    if search_index is None:
+        search_index = get_search_index(movies_df)
     
-    # 1. Thử exact substring match trước
-    exact_matches = movies_df[movies_df["title"].str.lower().str.contains(q_norm, na=False)]
+    # 1. Thử match prefix của các từ trong title trước, xếp theo độ phổ biến
+    positions = search_index.prefix_search(q, top_n)
     
     # Nếu có kết quả exact match
-    if not exact_matches.empty:
-        result = exact_matches.head(top_n).reset_index(drop=True)
+    if len(positions):
+        result = movies_df.iloc[positions].reset_index(drop=True)
         result['confidence_score'] = 100  # Perfect match
         return result
     
     # 2. Nếu không có exact match và use_fuzzy=True, dùng fuzzy search
-    if use_fuzzy and FUZZYWUZZY_AVAILABLE:
-        fuzzy_result = fuzzy_search_movie_by_title(q, movies_df, top_n, min_score=FUZZY_MIN_SCORE)
+    if use_fuzzy:
+        fuzzy_result = fuzzy_search_movie_by_title(q, movies_df, top_n, min_score=FUZZY_MIN_SCORE,
+                                                   search_index=search_index)
         if not fuzzy_result.empty:
             return fuzzy_result
     
@@ -0,0 +1,214 @@
+# search_index.py
+import importlib.util
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+import numpy as np
+from config import FUZZY_SHORTLIST_SIZE, SEARCH_INDEX_CACHE_SIZE
+from topk import top_k
+from utils import preprocess_title, clean_title_for_search
+
+# Chỉ kiểm tra có cài hay không; fuzzywuzzy được import ở lần build index đầu tiên
+FUZZYWUZZY_AVAILABLE = importlib.util.find_spec("fuzzywuzzy") is not None
+
+
+def _fuzzywuzzy():
+    """(fuzz, utils) của fuzzywuzzy, None nếu chưa cài"""
+    if not FUZZYWUZZY_AVAILABLE:
+        return None
+    from fuzzywuzzy import fuzz, utils
+    return fuzz, utils
+
+
+def title_trigrams(text):
+    """Tách chuỗi đã chuẩn hóa thành tập trigram ký tự (có padding 2 space đầu, 1 space cuối)"""
+    if not text:
+        return set()
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+_WORD_START = re.compile(r"(?<![a-z0-9])[a-z0-9]")
+_PREFIX_END = "\uffff"
+_SHORT_PREFIX_LEN = 3
+_PREFIX_SLACK = 8
+
+
+class TitleSearchIndex:
+    """
+    Index tìm kiếm title được build một lần cho cả catalog
+
+    Mỗi phim (keyed theo movieId, kể cả phim trùng title) có title đã chuẩn hóa
+    và được đưa vào inverted index trigram dạng CSR (offsets + postings int32).
+    Query chỉ chấm điểm fuzzy đầy đủ trên shortlist ứng viên chung nhiều trigram nhất.
+
+    Ngoài ra index giữ mảng đã sắp xếp các hậu tố lowercase bắt đầu ở đầu mỗi từ
+    của title, dùng cho prefix search / autocomplete xếp hạng theo rating_count.
+    """
+
+    def __init__(self, movies_df):
+        self.movie_ids = movies_df['movieId'].to_numpy()
+        self.titles = [preprocess_title(t) for t in movies_df['title'].fillna('')]
+        self.normalized = [clean_title_for_search(t) for t in self.titles]
+        # fuzz.full_process chạy trước một lần để lúc query gọi WRatio với full_process=False
+        self.fuzzywuzzy = _fuzzywuzzy()
+        self.scoring_titles = [self.fuzzywuzzy[1].full_process(t) for t in self.titles] if self.fuzzywuzzy else None
+
+        vocab = {}
+        doc_ids = []
+        gram_ids = []
+        gram_counts = np.zeros(len(self.titles), dtype=np.int32)
+        for doc, text in enumerate(self.normalized):
+            grams = title_trigrams(text)
+            gram_counts[doc] = len(grams)
+            for gram in grams:
+                gram_ids.append(vocab.setdefault(gram, len(vocab)))
+                doc_ids.append(doc)
+
+        gram_ids = np.asarray(gram_ids, dtype=np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        order = np.argsort(gram_ids, kind='stable')
+        self.vocab = vocab
+        self.postings = doc_ids[order]
+        self.offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gram_ids, minlength=len(vocab)), out=self.offsets[1:])
+        self.gram_counts = gram_counts
+
+        # Prefix index: (hậu tố từ đầu mỗi từ, vị trí phim) sắp xếp theo hậu tố
+        self.lower_titles = [t.lower() for t in movies_df['title'].fillna('')]
+        entries = sorted(
+            (title[m.start():], doc)
+            for doc, title in enumerate(self.lower_titles)
+            for m in _WORD_START.finditer(title)
+        )
+        self.prefix_keys = [key for key, _ in entries]
+        self.prefix_docs = np.fromiter((doc for _, doc in entries), dtype=np.int32, count=len(entries))
+        if 'rating_count' in movies_df.columns:
+            popularity = movies_df['rating_count'].fillna(0).to_numpy(dtype=np.float64)
+        else:
+            popularity = np.zeros(len(self.lower_titles))
+        self.set_popularity(popularity)
+        self._last_prefix = ("", 0, len(self.prefix_keys))
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def set_popularity(self, popularity):
+        """Cập nhật điểm phổ biến (rating_count) dùng để xếp hạng prefix search"""
+        self.popularity = np.asarray(popularity, dtype=np.float64)
+        self._short_prefix_cache = {}
+
+    def _prefix_range(self, prefix):
+        """Khoảng [lo, hi) trong prefix_keys bắt đầu bằng prefix, thu hẹp dần khi gõ thêm ký tự"""
+        last_prefix, lo, hi = self._last_prefix
+        if not prefix.startswith(last_prefix):
+            lo, hi = 0, len(self.prefix_keys)
+        lo = bisect_left(self.prefix_keys, prefix, lo, hi)
+        hi = bisect_left(self.prefix_keys, prefix + _PREFIX_END, lo, hi)
+        self._last_prefix = (prefix, lo, hi)
+        return lo, hi
+
+    def prefix_search(self, prefix, top_n):
+        """
+        Trả về vị trí các phim có một từ trong title bắt đầu bằng prefix
+
+        Kết quả xếp theo rating_count giảm dần. Prefix ngắn (<= 3 ký tự) khớp rất
+        nhiều phim nên được memo lại để latency không tăng theo kích thước catalog.
+        """
+        prefix = " ".join(str(prefix).lower().split())
+        if not prefix:
+            return np.empty(0, dtype=np.intp)
+
+        short = len(prefix) <= _SHORT_PREFIX_LEN
+        if short and (prefix, top_n) in self._short_prefix_cache:
+            return self._short_prefix_cache[(prefix, top_n)]
+
+        lo, hi = self._prefix_range(prefix)
+        docs = self.prefix_docs[lo:hi]
+        # Một phim hiếm khi có 2 từ cùng prefix nên chọn dư vài entry rồi bỏ trùng
+        best = docs[top_k(self.popularity[docs], top_n + _PREFIX_SLACK)]
+        _, first = np.unique(best, return_index=True)
+        result = best[np.sort(first)][:top_n]
+        if len(result) < top_n and len(best) < len(docs):
+            unique_docs = np.unique(docs)
+            result = unique_docs[top_k(self.popularity[unique_docs], top_n)]
+        if short:
+            self._short_prefix_cache[(prefix, top_n)] = result
+        return result
+
+    def candidates(self, query, limit=FUZZY_SHORTLIST_SIZE):
+        """
+        Trả về (positions, scores) của tối đa limit phim chung nhiều trigram nhất với query
+
+        Score là tỉ lệ trigram của query có trong title; bằng điểm thì ưu tiên
+        Dice coefficient cao hơn (title ngắn, sát với query hơn).
+        """
+        grams = title_trigrams(clean_title_for_search(preprocess_title(query)))
+        slices = [self.postings[self.offsets[g]:self.offsets[g + 1]]
+                  for g in (self.vocab.get(gram) for gram in grams) if g is not None]
+        if not slices:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        shared = np.bincount(np.concatenate(slices), minlength=len(self.movie_ids))
+        docs = np.flatnonzero(shared)
+        shared = shared[docs]
+        containment = shared / len(grams)
+        dice = 2.0 * shared / (len(grams) + self.gram_counts[docs])
+        best = top_k(containment, limit, tiebreak=dice)
+        return docs[best], containment[best]
+
+    def fuzzy_search(self, query, top_n, min_score, shortlist=FUZZY_SHORTLIST_SIZE):
+        """
+        Trả về list (position, score 0-100) đã sắp xếp theo score giảm dần
+
+        Dùng fuzz.WRatio trên shortlist nếu có fuzzywuzzy, nếu không thì dùng
+        điểm trigram của bước lọc ứng viên.
+        """
+        query_processed = preprocess_title(query)
+        if not query_processed:
+            return []
+
+        positions, containment = self.candidates(query_processed, max(shortlist, top_n))
+        if self.fuzzywuzzy:
+            fuzz, fuzz_utils = self.fuzzywuzzy
+            query_scoring = fuzz_utils.full_process(query_processed)
+            scores = np.array([fuzz.WRatio(query_scoring, self.scoring_titles[pos], full_process=False)
+                               for pos in positions], dtype=float)
+        else:
+            scores = np.round(containment * 100)
+
+        order = top_k(np.where(scores >= min_score, scores, np.nan), top_n)
+        return [(int(positions[i]), int(scores[i])) for i in order]
+
+
+_INDEX_CACHE = OrderedDict()
+
+
+def _fingerprint(movies_df):
+    """Khóa cache rẻ cho catalog: số phim + hash của movieId và title hai đầu"""
+    if movies_df.empty:
+        return (0,)
+    ids = np.ascontiguousarray(movies_df['movieId'].to_numpy())
+    titles = movies_df['title']
+    return (len(movies_df), hash(ids.tobytes()), titles.iloc[0], titles.iloc[-1])
+
+
+def get_search_index(movies_df):
+    """Lấy TitleSearchIndex cho catalog, chỉ build lại khi catalog thay đổi"""
+    key = _fingerprint(movies_df)
+    index = _INDEX_CACHE.get(key)
+    if index is None:
+        index = TitleSearchIndex(movies_df)
+        _INDEX_CACHE[key] = index
+        while len(_INDEX_CACHE) > SEARCH_INDEX_CACHE_SIZE:
+            _INDEX_CACHE.popitem(last=False)
+    else:
+        _INDEX_CACHE.move_to_end(key)
+    return index
+
+
+def update_popularity(movies_df):
+    """Đưa rating_count mới (sau khi ingest) vào index đã build của catalog; chưa build thì bỏ qua"""
+    index = _INDEX_CACHE.get(_fingerprint(movies_df))
+    if index is not None and 'rating_count' in movies_df.columns:
+        index.set_popularity(movies_df['rating_count'].fillna(0).to_numpy(dtype=np.float64))
@@ -0,0 +1,407 @@
+# service.py
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metrics import METRICS, record_error
+from config import (
+    SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_MAX_BATCH,
+    DEFAULT_TOP_N, DEFAULT_MIN_RATING, DEFAULT_MIN_RATING_COUNT, TRENDING_WINDOWS, TRENDING_DEFAULT_WINDOW,
+    CONTENT_SEARCH_MODE, SEARCH_MODES
+)
+
+
+# Cột chỉ dùng bên trong (bitmask genre), không trả ra API
+INTERNAL_COLUMNS = ["genre_mask"]
+
+
+class ServiceContext:
+    """Dữ liệu và model của một worker, được load đúng một lần khi worker khởi động"""
+
+    def __init__(self):
+        from config import NEIGHBOR_INDEX_PATH
+        from data_loader import load_data
+        from genre_leaderboard import GenreLeaderboards
+        from rating_ingest import RatingIngestor
+        from trending import TrendingScores
+        from recommend import build_similarity_matrix
+        from result_cache import ResultCache
+        from ann_index import load_or_build_ann_index
+
+        # Catalog và neighbor index được memory-map từ artifact, các worker dùng chung page cache
+        movies_df, ratings, _ = load_data()
+        # Rating mới trong log được replay lên stats gốc; worker nào cũng đọc chung một log
+        self.ingestor = RatingIngestor(movies_df, ratings)
+        self.movies_df = self.ingestor.movies_df
+        self.cosine_sim, self.indices = build_similarity_matrix(self.movies_df, index_path=NEIGHBOR_INDEX_PATH)
+        # ANN index chỉ load khi config dùng mode approx (None thì request mode=approx dùng exact)
+        self.ann = None
+        if CONTENT_SEARCH_MODE == "approx":
+            self.ann = load_or_build_ann_index(self.cosine_sim, allow_build=True)
+        self.leaderboards = GenreLeaderboards(self.movies_df)
+        self.trending = TrendingScores(self.movies_df, self.ingestor.ratings)
+        # Cache lưu thẳng records JSON-ready; tầng SQLite dùng chung giữa các worker
+        self.cache = ResultCache(kind="service")
+        self._set_version()
+
+    def _set_version(self):
+        from result_cache import data_version
+        self.cache.set_version(data_version(self.movies_df, self.cosine_sim))
+
+    def sync_ratings(self):
+        """Áp dụng rating mới trong log (kể cả do worker khác ghi); chỉ tốn một lần đọc file khi không có gì mới"""
+        from search_index import update_popularity
+        with self.ingestor.lock:
+            new_ratings = self.ingestor.sync()
+            if new_ratings.empty:
+                return 0
+            self.movies_df = self.ingestor.movies_df
+            update_popularity(self.movies_df)
+            self.leaderboards.update(self.movies_df, self.ingestor.take_dirty())
+            self.trending.update(new_ratings)
+            self._set_version()
+            return len(new_ratings)
+
+
+def _records(df):
+    """DataFrame -> list dict JSON-safe (NaN thành null, numpy scalar thành kiểu Python), bỏ cột nội bộ"""
+    if isinstance(df, str):
+        raise ValueError(df)
+    if df is None or df.empty:
+        return []
+    records = []
+    for row in df.drop(columns=INTERNAL_COLUMNS, errors="ignore").to_dict(orient="records"):
+        clean = {}
+        for key, value in row.items():
+            if hasattr(value, "item"):
+                value = value.item()
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            clean[key] = value
+        records.append(clean)
+    return records
+
+
+def _int_param(params, name, default):
+    value = params.get(name, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+
+
+def _float_param(params, name, default):
+    value = params.get(name, default)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a number")
+
+
+def _required(params, name):
+    value = params.get(name)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError(f"'{name}' is required")
+    return value
+
+
+def _trending_param(params, name="trending"):
+    """Window trending: true/1 là window mặc định, tên window (week, month, ...), thiếu/false là không dùng"""
+    value = params.get(name)
+    if value in (None, False, "", "0", "false"):
+        return None
+    if value in (True, "1", "true"):
+        return TRENDING_DEFAULT_WINDOW
+    if value not in TRENDING_WINDOWS:
+        raise ValueError(f"'{name}' must be true/false or one of {list(TRENDING_WINDOWS)}")
+    return value
+
+
+def _mode_param(params):
+    """Mode content similarity: exact (mặc định theo config) hoặc approx (ANN)"""
+    mode = params.get("mode") or CONTENT_SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"'mode' must be one of {list(SEARCH_MODES)}")
+    return mode
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _preferences_param(params):
+    """user_preferences cho hybrid: {"genres": [str, ...], "year_range": [số, số]}, các key đều tùy chọn"""
+    preferences = params.get("preferences") or params.get("user_preferences")
+    if isinstance(preferences, str):
+        try:
+            preferences = json.loads(preferences)
+        except json.JSONDecodeError:
+            raise ValueError("'preferences' must be a JSON object")
+    if preferences is None:
+        return None
+    if not isinstance(preferences, dict):
+        raise ValueError("'preferences' must be a JSON object")
+    genres = preferences.get("genres")
+    if genres is not None and (not isinstance(genres, list) or not all(isinstance(g, str) for g in genres)):
+        raise ValueError("'preferences.genres' must be a list of strings")
+    year_range = preferences.get("year_range")
+    if year_range is not None and (not isinstance(year_range, list) or len(year_range) != 2
+                                   or not all(_is_number(y) for y in year_range)):
+        raise ValueError("'preferences.year_range' must be a list of two numbers")
+    return preferences
+
+
+def handle_search(ctx, params):
+    from search import search_movie_by_title
+    q = _required(params, "q")
+    top_n = _int_param(params, "top_n", DEFAULT_TOP_N)
+    return ctx.cache.get_or_compute(
+        "search", lambda: _records(search_movie_by_title(q, ctx.movies_df, top_n=top_n)), q=q.casefold(), top_n=top_n
+    )
+
+
+def handle_recommend(ctx, params):
+    from recommend import recommend
+    title = _required(params, "title").strip()
+    top_n = _int_param(params, "top_n", DEFAULT_TOP_N)
+    mode = _mode_param(params)
+    return ctx.cache.get_or_compute(
+        "recommend",
+        lambda: _records(recommend(title, ctx.movies_df, ctx.cosine_sim, ctx.indices, top_n=top_n, return_scores=True,
+                                   mode=mode, ann=ctx.ann)),
+        title=title, top_n=top_n, mode=mode
+    )
+
+
+def handle_genres(ctx, params):
+    from recommend import recommend_by_genres
+    genres = _required(params, "genres")
+    if isinstance(genres, str):
+        genres = [g.strip() for g in genres.split(",") if g.strip()]
+    filters = {
+        "top_n": _int_param(params, "top_n", DEFAULT_TOP_N),
+        "min_rating": _float_param(params, "min_rating", DEFAULT_MIN_RATING),
+        "min_rating_count": _int_param(params, "min_rating_count", DEFAULT_MIN_RATING_COUNT),
+    }
+    return ctx.cache.get_or_compute(
+        "genres",
+        lambda: _records(recommend_by_genres(ctx.movies_df, genres, leaderboards=ctx.leaderboards, **filters)),
+        genres=genres, **filters
+    )
+
+
+def handle_hybrid(ctx, params):
+    from recommend import hybrid_recommend
+    title = _required(params, "title").strip()
+    preferences = _preferences_param(params)
+    top_n = _int_param(params, "top_n", DEFAULT_TOP_N)
+    window = _trending_param(params)
+    trending = ctx.trending if window else None
+    mode = _mode_param(params)
+    return ctx.cache.get_or_compute(
+        "hybrid",
+        lambda: _records(hybrid_recommend(title, ctx.movies_df, ctx.cosine_sim, ctx.indices,
+                                          user_preferences=preferences, top_n=top_n,
+                                          trending=trending, trending_window=window, mode=mode, ann=ctx.ann)),
+        title=title, preferences=preferences, top_n=top_n, trending=window, mode=mode
+    )
+
+
+def handle_trending(ctx, params):
+    """Top phim trending; bảng xếp hạng được giữ sẵn nên không cần qua result cache"""
+    from trending import get_trending
+    window = _trending_param(params, "window") or TRENDING_DEFAULT_WINDOW
+    top_n = _int_param(params, "top_n", DEFAULT_TOP_N)
+    return _records(get_trending(ctx.movies_df, ctx.trending, window, top_n))
+
+
+ENDPOINTS = {
+    "search": handle_search,
+    "recommend": handle_recommend,
+    "genres": handle_genres,
+    "hybrid": handle_hybrid,
+    "trending": handle_trending,
+}
+
+
+def handle_ratings(ctx, params):
+    """Ghi thêm rating: {"ratings": [{"userId", "movieId", "rating", "timestamp"?}, ...]}"""
+    ratings = params.get("ratings")
+    if not isinstance(ratings, list) or not all(isinstance(item, dict) for item in ratings):
+        raise ValueError("'ratings' must be a list of objects")
+    accepted, rejected = ctx.ingestor.append(ratings)
+    ctx.sync_ratings()
+    return {"accepted": accepted, "rejected": rejected}
+
+
+def handle_batch(ctx, params):
+    """Chạy nhiều request trong một lần gọi: {"requests": [{"endpoint": ..., "params": {...}}, ...]}"""
+    requests = params.get("requests")
+    if not isinstance(requests, list):
+        raise ValueError("'requests' must be a list")
+    if len(requests) > SERVICE_MAX_BATCH:
+        raise ValueError(f"at most {SERVICE_MAX_BATCH} requests per batch")
+
+    responses = []
+    for item in requests:
+        start = time.perf_counter()
+        endpoint = item.get("endpoint") if isinstance(item, dict) else None
+        try:
+            if endpoint not in ENDPOINTS:
+                raise ValueError(f"unknown endpoint '{endpoint}'")
+            results = ENDPOINTS[endpoint](ctx, item.get("params") or {})
+            responses.append({"endpoint": endpoint, "results": results,
+                              "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)})
+        except Exception as e:
+            responses.append({"endpoint": endpoint, "error": str(e)})
+    return responses
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    """HTTP handler JSON; context được gán ở lớp con tạo bởi make_handler"""
+
+    context = None
+    protocol_version = "HTTP/1.1"
+    server_version = "MovieRecommender/1.0"
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        self._dispatch(url.path, params)
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        except json.JSONDecodeError:
+            self._send(400, {"error": "invalid JSON body"}, 0.0)
+            return
+        if not isinstance(params, dict):
+            self._send(400, {"error": "JSON body must be an object"}, 0.0)
+            return
+        self._dispatch(url.path, params)
+
+    def _dispatch(self, path, params):
+        start = time.perf_counter()
+        name = path.strip("/")
+        try:
+            self.context.sync_ratings()
+            if name == "health":
+                status, body = 200, {"status": "ok", "movies": len(self.context.movies_df),
+                                     "ingested_ratings": self.context.ingestor.applied,
+                                     "cache": self.context.cache.stats()}
+            elif name == "metrics":
+                # Mỗi worker có registry riêng; response cho biết worker nào qua X-Worker-Pid
+                status, body = 200, METRICS.snapshot() if params.get("format") == "json" else METRICS.to_prometheus()
+            elif name == "ratings":
+                status, body = 200, handle_ratings(self.context, params)
+            elif name == "batch":
+                status, body = 200, {"responses": handle_batch(self.context, params)}
+            elif name in ENDPOINTS:
+                status, body = 200, {"results": ENDPOINTS[name](self.context, params)}
+            else:
+                status, body = 404, {"error": f"unknown endpoint '/{name}'"}
+        except ValueError as e:
+            status, body = 400, {"error": str(e)}
+        except Exception as e:
+            record_error(f"http./{name}", e)
+            status, body = 500, {"error": f"internal error: {e}"}
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if METRICS.enabled and status != 404:
+            METRICS.observe(f"http./{name}", elapsed_ms)
+        self._send(status, body, elapsed_ms)
+
+    def _send(self, status, body, elapsed_ms):
+        if isinstance(body, str):
+            payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            payload, content_type = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-Response-Time-Ms", f"{elapsed_ms:.3f}")
+        self.send_header("Server-Timing", f"app;dur={elapsed_ms:.3f}")
+        self.send_header("X-Worker-Pid", str(os.getpid()))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_handler(context):
+    return type("BoundRecommendationHandler", (RecommendationHandler,), {"context": context})
+
+
+def _run_worker(sock, context=None):
+    """
+    Một worker phục vụ request trên socket đã listen sẵn
+
+    context là ServiceContext đã load ở process cha trước khi fork (dùng chung
+    qua copy-on-write); None thì worker tự load.
+    """
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    if context is None:
+        context = ServiceContext()
+    server = ThreadingHTTPServer(sock.getsockname()[:2], make_handler(context), bind_and_activate=False)
+    server.socket = sock
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS, ready=None):
+    """
+    Chạy service với nhiều worker process cùng accept trên một socket
+
+    Socket được tạo ở process cha rồi fork sang các worker. Trên nền tảng không
+    hỗ trợ fork (Windows) service chạy một worker đa luồng.
+    """
+    sock = socket.create_server((host, port), backlog=128)
+    print(f"Recommendation service listening on http://{host}:{sock.getsockname()[1]} ({workers} workers)")
+    if ready is not None:
+        ready(sock.getsockname()[1])
+
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        _run_worker(sock)
+        return
+
+    # Load dữ liệu/model (và publish artifact) một lần ở process cha; các worker fork ra dùng
+    # chung context này. Kết nối SQLite không được mang qua fork nên đóng trước.
+    context = ServiceContext()
+    context.cache.close()
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_run_worker, args=(sock, context), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless JSON HTTP recommendation service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# service_client.py
+import pandas as pd
+import requests
+from config import SERVICE_HOST, SERVICE_PORT, DEFAULT_TOP_N
+
+
+class RecommenderClient:
+    """Client mỏng cho service.py, trả về DataFrame giống các hàm trong recommend/search"""
+
+    def __init__(self, base_url=None, timeout=5):
+        self.base_url = (base_url or f"http://{SERVICE_HOST}:{SERVICE_PORT}").rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _get(self, endpoint, **params):
+        response = self.session.get(f"{self.base_url}/{endpoint}", params=params, timeout=self.timeout)
+        return self._results(response)
+
+    def _post(self, endpoint, payload):
+        response = self.session.post(f"{self.base_url}/{endpoint}", json=payload, timeout=self.timeout)
+        return self._results(response)
+
+    @staticmethod
+    def _results(response):
+        body = response.json()
+        if response.status_code != 200:
+            raise ValueError(body.get("error", f"HTTP {response.status_code}"))
+        return body
+
+    def search(self, q, top_n=DEFAULT_TOP_N):
+        return pd.DataFrame(self._get("search", q=q, top_n=top_n)["results"])
+
+    def recommend(self, title, top_n=DEFAULT_TOP_N, mode=None):
+        return pd.DataFrame(self._get("recommend", title=title, top_n=top_n, mode=mode)["results"])
+
+    def recommend_by_genres(self, genres, top_n=DEFAULT_TOP_N, **filters):
+        return pd.DataFrame(self._get("genres", genres=",".join(genres), top_n=top_n, **filters)["results"])
+
+    def hybrid(self, title, preferences=None, top_n=DEFAULT_TOP_N, trending=None, mode=None):
+        payload = {"title": title, "preferences": preferences, "top_n": top_n, "trending": trending, "mode": mode}
+        return pd.DataFrame(self._post("hybrid", payload)["results"])
+
+    def trending(self, window=None, top_n=DEFAULT_TOP_N):
+        params = {"top_n": top_n} if window is None else {"window": window, "top_n": top_n}
+        return pd.DataFrame(self._get("trending", **params)["results"])
+
+    def add_ratings(self, ratings):
+        """ratings: DataFrame hoặc list dict (userId, movieId, rating, timestamp); trả về (accepted, rejected)"""
+        if isinstance(ratings, pd.DataFrame):
+            ratings = ratings.to_dict(orient="records")
+        body = self._post("ratings", {"ratings": ratings})
+        return body["accepted"], body["rejected"]
+
+    def batch(self, requests_):
+        """requests_: list {"endpoint": ..., "params": {...}}; trả về list kết quả/lỗi theo thứ tự"""
+        return self._post("batch", {"requests": requests_})["responses"]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Cho phép import các module ở thư mục gốc (poster_service, benchmarks, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+"""Kiểm tra GenreLeaderboards.update (chèn lại từng phim) và dùng chung giữa các thread"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import GENRE_COLS
+from genre_leaderboard import GenreLeaderboards
+
+
+def _catalog(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    genres = [" ".join(rng.choice(GENRE_COLS, size=rng.integers(1, 4), replace=False)) for _ in range(n)]
+    return pd.DataFrame({
+        "movieId": np.arange(1, n + 1),
+        "title": [f"Movie {i}" for i in range(n)],
+        "genres": genres,
+        # Rating làm tròn 1 chữ số để có nhiều phim bằng điểm (kiểm tra thứ tự tie-break)
+        "avg_rating": np.round(rng.uniform(1, 5, size=n), 1),
+        "rating_count": rng.integers(0, 12, size=n),
+    })
+
+
+def _boards(leaderboards):
+    return {key: [(level, positions.tolist(), neg_avg.tolist()) for level, positions, neg_avg in board]
+            for key, board in {**leaderboards._pinned, **leaderboards._lru}.items()}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_update_patches_boards_like_a_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    movies = _catalog(seed=seed)
+    leaderboards = GenreLeaderboards(movies)
+    leaderboards.query(["Comedy", "Drama"], min_rating_count=0)
+    leaderboards.query(["Action", "Thriller", "War"], min_rating_count=5)
+
+    for _ in range(3):
+        changed = rng.choice(len(movies), size=15, replace=False)
+        movies = movies.copy()
+        movies.loc[changed, "avg_rating"] = np.round(rng.uniform(1, 5, size=len(changed)), 1)
+        movies.loc[changed, "rating_count"] += rng.integers(0, 6, size=len(changed))
+        leaderboards.update(movies, changed)
+
+    rebuilt = GenreLeaderboards(movies)
+    rebuilt.query(["Comedy", "Drama"], min_rating_count=0)
+    rebuilt.query(["Action", "Thriller", "War"], min_rating_count=5)
+    assert _boards(leaderboards) == _boards(rebuilt)
+
+
+def test_concurrent_queries_and_updates():
+    movies = _catalog()
+    leaderboards = GenreLeaderboards(movies, cache_size=2)
+    combos = [["Comedy"], ["Drama", "Romance"], ["Action", "Sci-Fi"], ["Horror", "Thriller"]]
+    errors = []
+
+    def query():
+        try:
+            for i in range(200):
+                leaderboards.query(combos[i % len(combos)], min_rating_count=i % 3)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=query) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        changed = rng.choice(len(movies), size=5, replace=False)
+        movies = movies.copy()
+        movies.loc[changed, "avg_rating"] = rng.uniform(1, 5, size=len(changed))
+        leaderboards.update(movies, changed)
+    for thread in threads:
+        thread.join()
+    assert errors == []
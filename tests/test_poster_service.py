@@ -0,0 +1,100 @@
+"""Kiểm tra get_poster_url/get_poster_urls trên server giả lập OMDb ở localhost"""
+import threading
+import time
+
+import pytest
+
+import poster_cache
+import poster_service
+from benchmarks.bench_posters import FakeOMDbHandler, start_fake_omdb
+from config import POSTER_MAX_WORKERS
+
+
+@pytest.fixture(scope="module")
+def omdb_url():
+    server, base_url = start_fake_omdb()
+    yield base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def omdb(omdb_url, tmp_path, monkeypatch):
+    monkeypatch.setenv("OMDB_API_KEY", "test")
+    monkeypatch.setattr(poster_service, "OMDB_API_URL", omdb_url)
+    monkeypatch.setattr(poster_cache, "_cache", poster_cache.PosterCache(str(tmp_path / "posters.sqlite3")))
+    FakeOMDbHandler.connections.clear()
+    FakeOMDbHandler.requests_seen = 0
+    return FakeOMDbHandler
+
+
+def _items(n, prefix="Movie"):
+    return [(f"{prefix} {i}", 1990 + i % 10) for i in range(n)]
+
+
+def test_batch_matches_sequential(omdb):
+    items = _items(12) + [("Missing Movie", 1995), ("Toy Story", 1995)]
+    sequential = [poster_service.get_poster_url(title, year) for title, year in items]
+    poster_service.get_poster_cache().clear()
+
+    batched = poster_service.get_poster_urls(items)
+
+    assert batched == sequential
+    assert batched[0] == "http://posters.local/Movie%200.jpg"
+    assert batched[-2] == poster_service.get_placeholder_poster("Missing Movie")
+
+
+def test_deadline_returns_placeholder(omdb):
+    items = _items(3) + [("Slow Movie", 1995)]
+    start = time.monotonic()
+    results = poster_service.get_poster_urls(items, deadline=1.0)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 2.0
+    assert results[:3] == [f"http://posters.local/Movie%20{i}.jpg" for i in range(3)]
+    assert results[3] == poster_service.get_placeholder_poster("Slow Movie")
+
+
+def test_queued_lookups_finish_after_deadline(omdb):
+    items = _items(3, prefix="Queued")
+    results = poster_service.get_poster_urls(items, max_workers=1, deadline=0.05)
+    assert results == [poster_service.get_placeholder_poster(title) for title, _ in items]
+
+    # Request còn xếp hàng không bị hủy: chạy xong ở nền và được cache
+    deadline = time.monotonic() + 5
+    while omdb.requests_seen < len(items) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.1)
+    assert omdb.requests_seen == len(items)
+    assert poster_service.get_poster_urls(items, deadline=0.5) == [
+        f"http://posters.local/Queued%20{i}.jpg" for i in range(3)]
+    assert omdb.requests_seen == len(items)
+
+
+def test_duplicate_titles_fetched_once(omdb):
+    items = [("Shared Movie", 1995)] * 5 + [("Shared Movie", "1995")]
+    results = poster_service.get_poster_urls(items)
+    assert len(set(results)) == 1
+    assert omdb.requests_seen == 1
+
+
+def test_concurrent_lookups_single_flight(omdb):
+    threads = [threading.Thread(target=poster_service.get_poster_url, args=("Concurrent Movie", 1995))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert omdb.requests_seen == 1
+
+
+def test_pool_and_connections_reused(omdb):
+    assert poster_service._get_executor(POSTER_MAX_WORKERS) is poster_service._get_executor(POSTER_MAX_WORKERS)
+    session = poster_service._get_session()
+
+    poster_service.get_poster_urls(_items(20))
+    poster_service.get_poster_cache().clear()
+    poster_service.get_poster_urls(_items(20))
+
+    assert omdb.requests_seen == 40
+    assert poster_service._get_session() is session
+    assert len(omdb.connections) <= POSTER_MAX_WORKERS
@@ -0,0 +1,51 @@
+"""Kiểm tra RatingIngestor: loại id không hợp lệ và cập nhật stats tại chỗ"""
+import numpy as np
+import pandas as pd
+
+from rating_ingest import RatingIngestor, RatingLog, to_records
+
+
+def _movies():
+    return pd.DataFrame({
+        "movieId": [1, 2, 3, 4],
+        "title": ["A (1990)", "B (1991)", "C (1992)", "D (1993)"],
+        "avg_rating": [3.0, 4.0, 2.0, 5.0],
+        "rating_count": [2, 1, 1, 0],
+    })
+
+
+def test_to_records_drops_fractional_and_garbage_ids():
+    frame = pd.DataFrame({
+        "userId": [1, 2.5, "x", 3, 4, 2**40],
+        "movieId": [1, 1, 1, 1.5, "2", 1],
+        "rating": [4, 4, 4, 4, 3, 4],
+    })
+    records = to_records(frame)
+    assert records["userId"].tolist() == [1, 4]
+    assert records["movieId"].tolist() == [1, 2]
+
+
+def test_append_counts_invalid_ids_as_rejected(tmp_path):
+    ingestor = RatingIngestor(_movies(), log=RatingLog(str(tmp_path / "ratings.log")))
+    accepted, rejected = ingestor.append([(1, 1, 4.0), (1, 2.7, 4.0), (1.2, 3, 4.0), ("u", 3, 4.0)])
+    assert (accepted, rejected) == (1, 3)
+    assert ingestor.log.read()["movieId"].tolist() == [1]
+
+
+def test_sync_updates_stats_in_place(tmp_path):
+    movies = _movies()
+    ingestor = RatingIngestor(movies, log=RatingLog(str(tmp_path / "ratings.log")))
+    frame = ingestor.movies_df
+    avg_before = frame["avg_rating"].to_numpy()
+
+    ingestor.append([(1, 1, 5.0), (2, 4, 4.0)])
+    new_ratings = ingestor.sync()
+
+    assert len(new_ratings) == 2
+    assert ingestor.movies_df is frame
+    assert np.shares_memory(frame["avg_rating"].to_numpy(), avg_before)
+    assert frame["avg_rating"].tolist() == [3.67, 4.0, 2.0, 4.0]
+    assert frame["rating_count"].tolist() == [3, 1, 1, 1]
+    assert ingestor.take_dirty().tolist() == [0, 3]
+    # Frame truyền vào không bị sửa
+    assert movies["avg_rating"].tolist() == [3.0, 4.0, 2.0, 5.0]
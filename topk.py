@@ -0,0 +1,93 @@
+# topk.py
+import numpy as np
+
+
+def top_k(scores, k, exclude=None, tiebreak=None):
+    """
+    Chọn vị trí của k phần tử có score lớn nhất, sắp xếp giảm dần
+
+    Dùng argpartition (O(N)) rồi chỉ sắp xếp phần ứng viên thay vì sort cả mảng.
+    Khi bằng score, ưu tiên tiebreak lớn hơn (nếu có) rồi tới vị trí nhỏ hơn,
+    nên kết quả luôn ổn định. Các vị trí trong exclude (int hoặc list) và
+    các score NaN sẽ không bao giờ được chọn.
+    """
+    scores = np.asarray(scores)
+    if scores.dtype.kind != 'f':
+        scores = scores.astype(np.float64)
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if exclude is not None or np.isnan(scores).any():
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+        if exclude is not None:
+            scores[np.asarray(exclude, dtype=np.intp)] = -np.inf
+        candidates = np.flatnonzero(scores > -np.inf)
+    else:
+        candidates = None
+
+    if candidates is not None:
+        if candidates.size == 0:
+            return np.empty(0, dtype=np.intp)
+        sub_scores = scores[candidates]
+    else:
+        sub_scores = scores
+
+    m = sub_scores.shape[0]
+    if k < m:
+        threshold = sub_scores[np.argpartition(-sub_scores, k - 1)[k - 1]]
+        # Phần tử bằng ngưỡng chỉ lấy đủ k theo đúng thứ tự tie-break (không phụ thuộc argpartition),
+        # nên input nhiều giá trị trùng (đếm, điểm 0/1) không làm lexsort chạy trên cả catalog
+        above = np.flatnonzero(sub_scores > threshold)
+        ties = np.flatnonzero(sub_scores == threshold)
+        need = k - len(above)
+        if len(ties) > need:
+            if tiebreak is not None:
+                tie_positions = candidates[ties] if candidates is not None else ties
+                ties = ties[top_k(np.asarray(tiebreak)[tie_positions].astype(np.float64), need)]
+            else:
+                ties = ties[:need]
+        part = np.concatenate([above, ties])
+    else:
+        part = np.arange(m)
+
+    positions = candidates[part] if candidates is not None else part
+    part_scores = sub_scores[part]
+    if tiebreak is not None:
+        secondary = np.asarray(tiebreak)[positions].astype(np.float64)
+        order = np.lexsort((positions, -secondary, -part_scores))
+    else:
+        order = np.lexsort((positions, -part_scores))
+    return positions[order[:k]]
+
+
+def top_k_rows(block, k, exclude_cols=None):
+    """
+    Phiên bản 2D của top_k: chọn top-k cột cho mỗi hàng của block
+
+    exclude_cols là mảng cột cần loại bỏ cho từng hàng (ví dụ chính phim đó).
+    Trả về (indices int32, scores float32) kích thước (n_rows, k); các ô trống
+    khi một hàng có ít hơn k cột hợp lệ được điền -1 và score 0. Khác với
+    top_k, các cột bằng điểm ngay tại ngưỡng cắt do argpartition quyết định.
+    """
+    block = np.array(block, dtype=np.float32, copy=True)
+    n_rows, n_cols = block.shape
+    if exclude_cols is not None:
+        block[np.arange(n_rows), np.asarray(exclude_cols, dtype=np.intp)] = -np.inf
+
+    out_indices = np.full((n_rows, k), -1, dtype=np.int32)
+    out_scores = np.zeros((n_rows, k), dtype=np.float32)
+    kk = min(k, n_cols - (1 if exclude_cols is not None else 0))
+    if kk <= 0:
+        return out_indices, out_scores
+
+    if kk < n_cols:
+        part = np.argpartition(-block, kk - 1, axis=1)[:, :kk]
+    else:
+        part = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    part_scores = np.take_along_axis(block, part, axis=1)
+    order = np.lexsort((part, -part_scores), axis=1)[:, :kk]
+
+    out_indices[:, :kk] = np.take_along_axis(part, order, axis=1)
+    out_scores[:, :kk] = np.take_along_axis(part_scores, order, axis=1)
+    return out_indices, out_scores
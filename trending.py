@@ -0,0 +1,131 @@
+# trending.py
+import numpy as np
+import pandas as pd
+from config import TRENDING_WINDOWS, TRENDING_DEFAULT_WINDOW, TRENDING_TOP_K, DEFAULT_TOP_N
+from topk import top_k
+
+_DAY = 86400
+_MAX_EXPONENT = 500.0  # exp(500) ~ 1e217, còn cách xa giới hạn float64
+
+
+class TrendingScores:
+    """
+    Popularity và rating có decay theo thời gian cho mỗi phim, theo nhiều window
+
+    Mỗi window là một half-life: rating cách thời điểm hiện tại h half-life
+    có trọng số 2^-h. Thời điểm hiện tại là timestamp mới nhất đã thấy (đồng
+    hồ của dữ liệu), nên dữ liệu cũ như MovieLens 100K vẫn có trending hợp lý.
+
+    Dùng forward decay: mỗi rating được cộng trọng số exp(λ (t - t_ref)) vào
+    ô của phim đó, nên thêm rating mới là O(batch) thay vì decay lại cả mảng.
+    Khi thời gian trôi mọi phim bị nhân chung một hệ số, thứ hạng chỉ đổi khi
+    có rating mới; top-K của mỗi window được tính lại sau mỗi batch để query
+    chỉ còn là cắt mảng.
+    """
+
+    def __init__(self, movies_df, ratings=None, windows=TRENDING_WINDOWS, top_k=TRENDING_TOP_K):
+        self.windows = dict(windows)
+        self.top_size = top_k
+        self.now = 0
+        self._movie_pos = pd.Index(movies_df['movieId'].to_numpy())
+        n_items = len(movies_df)
+        self._ref = {name: None for name in self.windows}
+        self._counts = {name: np.zeros(n_items) for name in self.windows}
+        self._sums = {name: np.zeros(n_items) for name in self.windows}
+        self._ranked = {}
+        self._normalized = {}
+        if ratings is not None:
+            self.update(ratings)
+        else:
+            self._rank()
+
+    def _rate(self, window):
+        return np.log(2.0) / (self.windows[window] * _DAY)
+
+    def update(self, ratings):
+        """Cộng thêm một batch rating (cần cột movieId, rating, timestamp) rồi xếp hạng lại"""
+        if len(ratings) == 0:
+            return
+        if 'timestamp' not in ratings.columns:
+            raise ValueError("ratings must have a 'timestamp' column for trending")
+
+        positions = self._movie_pos.get_indexer(ratings['movieId'].to_numpy())
+        known = positions >= 0
+        positions = positions[known]
+        times = ratings['timestamp'].to_numpy(dtype=np.int64)[known]
+        values = ratings['rating'].to_numpy(dtype=np.float64)[known]
+        if len(times) == 0:
+            return
+        self.now = max(self.now, int(times.max()))
+
+        n_items = len(self._movie_pos)
+        for name in self.windows:
+            rate = self._rate(name)
+            if self._ref[name] is None:
+                self._ref[name] = self.now
+            if rate * (self.now - self._ref[name]) > _MAX_EXPONENT:
+                # Dời mốc t_ref tới hiện tại trước khi trọng số tràn float64
+                shrink = np.exp(-rate * (self.now - self._ref[name]))
+                self._counts[name] = self._counts[name] * shrink
+                self._sums[name] = self._sums[name] * shrink
+                self._ref[name] = self.now
+            weights = np.exp(rate * (times - self._ref[name]))
+            self._counts[name] = self._counts[name] + np.bincount(positions, weights=weights, minlength=n_items)
+            self._sums[name] = self._sums[name] + np.bincount(positions, weights=weights * values, minlength=n_items)
+        self._rank()
+
+    def _rank(self):
+        ranked, normalized = {}, {}
+        for name in self.windows:
+            score = self._sums[name]
+            order = top_k(score, self.top_size, tiebreak=self._counts[name])
+            ranked[name] = order[score[order] > 0]
+            peak = score.max() if len(score) else 0.0
+            normalized[name] = (score / peak if peak > 0 else np.zeros_like(score)).astype(np.float32)
+        # Gán cả dict một lần: query đang chạy ở thread khác luôn thấy bảng xếp hạng nhất quán
+        self._ranked, self._normalized = ranked, normalized
+
+    def decayed(self, window=TRENDING_DEFAULT_WINDOW):
+        """(số rating đã decay, rating trung bình có trọng số decay) của mọi phim tại thời điểm now"""
+        if window not in self.windows:
+            raise ValueError(f"unknown trending window '{window}'")
+        ref = self._ref[window]
+        factor = np.exp(-self._rate(window) * (self.now - ref)) if ref is not None else 1.0
+        counts = self._counts[window]
+        average = np.divide(self._sums[window], counts, out=np.zeros_like(counts), where=counts > 0)
+        return counts * factor, average
+
+    def top(self, window=TRENDING_DEFAULT_WINDOW, top_n=DEFAULT_TOP_N):
+        """Vị trí top_n phim trending; top_n <= top_size chỉ là cắt bảng xếp hạng có sẵn"""
+        if window not in self.windows:
+            raise ValueError(f"unknown trending window '{window}'")
+        if top_n <= self.top_size:
+            return self._ranked[window][:top_n]
+        score = self._sums[window]
+        order = top_k(score, top_n, tiebreak=self._counts[window])
+        return order[score[order] > 0]
+
+    def normalized(self, window=TRENDING_DEFAULT_WINDOW):
+        """Trend score float32 trong [0, 1] của mọi phim (1 = phim trending nhất), dùng để blend"""
+        if window not in self.windows:
+            raise ValueError(f"unknown trending window '{window}'")
+        return self._normalized[window]
+
+
+def get_trending(movies_df, trending, window=TRENDING_DEFAULT_WINDOW, top_n=DEFAULT_TOP_N):
+    """
+    Danh sách phim trending của một window
+
+    trend_count là số rating đã decay, trend_rating là rating trung bình có trọng
+    số decay, trend_score = trend_count * trend_rating / 5 chuẩn hóa về [0, 1].
+    """
+    if trending is None or movies_df.empty:
+        return pd.DataFrame()
+    positions = trending.top(window, top_n)
+    counts, average = trending.decayed(window)
+
+    result = movies_df[['movieId', 'title', 'genres', 'year', 'avg_rating', 'rating_count']].iloc[positions]
+    result['trend_count'] = np.round(counts[positions], 2)
+    result['trend_rating'] = np.round(average[positions], 2)
+    result['trend_score'] = np.round(trending.normalized(window)[positions].astype(float), 4)
+    return result
@@ -1,6 +1,7 @@
 # utils.py
 import re
 import numpy as np
+import pandas as pd
 
 def extract_year(title: str):
     """Trích xuất năm từ tiêu đề phim"""
@@ -14,6 +15,72 @@ def row_genres(row, genre_cols):
     g = [g for g in genre_cols if row[g] == 1]
     return " ".join(g) if g else "unknown"  # Dùng space thay vì double space
 
+def genre_masks_from_flags(flags):
+    """Mã hóa bảng flags (N x số genre, tối đa 32) thành bitmask uint32 cho mỗi phim"""
+    flags = np.asarray(flags) == 1
+    weights = np.left_shift(np.uint32(1), np.arange(flags.shape[1], dtype=np.uint32))
+    return (flags.astype(np.uint32) @ weights).astype(np.uint32)
+
+def genres_from_flags(flags, genre_cols):
+    """
+    Bản vectorized của row_genres cho cả bảng flags (N x len(genre_cols))
+
+    Mỗi hàng được mã hóa thành bitmask, chỉ các tổ hợp genre khác nhau
+    (thường vài trăm) mới phải ghép chuỗi.
+    """
+    masks = genre_masks_from_flags(flags)
+    unique_masks, inverse = np.unique(masks, return_inverse=True)
+    labels = [mask_to_genres(mask, genre_cols) or "unknown" for mask in unique_masks]
+    return np.asarray(labels, dtype=object)[inverse.ravel()]
+
+def _genre_key(name):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+def genre_mask(genres, genre_cols):
+    """
+    Chuyển list tên genre (không phân biệt hoa thường, bỏ qua dấu) thành bitmask
+
+    Tên không có trong genre_cols bị bỏ qua.
+    """
+    if isinstance(genres, str):
+        genres = [genres]
+    bits = {_genre_key(name): bit for bit, name in enumerate(genre_cols)}
+    mask = 0
+    for name in genres or []:
+        bit = bits.get(_genre_key(name)) if name else None
+        if bit is not None:
+            mask |= 1 << bit
+    return np.uint32(mask)
+
+def mask_to_genres(mask, genre_cols):
+    """Chuỗi genres (space-separated) tương ứng với một bitmask"""
+    return " ".join(name for bit, name in enumerate(genre_cols) if (int(mask) >> bit) & 1)
+
+def genre_masks_from_strings(genres, genre_cols):
+    """Tính bitmask từ cột genres dạng chuỗi (dùng khi DataFrame chưa có cột genre_mask)"""
+    lookup = {}
+    masks = np.empty(len(genres), dtype=np.uint32)
+    for i, value in enumerate(genres):
+        value = value if isinstance(value, str) else ""
+        if value not in lookup:
+            lookup[value] = genre_mask(value.split(), genre_cols)
+        masks[i] = lookup[value]
+    return masks
+
+def popcount32(values, dtype=np.int32):
+    """Đếm số bit 1 của từng phần tử mảng uint32 (kết quả kiểu dtype, tối đa 32)"""
+    values = np.asarray(values, dtype=np.uint32)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(dtype, copy=False)
+    values = values - ((values >> 1) & np.uint32(0x55555555))
+    values = (values & np.uint32(0x33333333)) + ((values >> 2) & np.uint32(0x33333333))
+    values = (values + (values >> 4)) & np.uint32(0x0F0F0F0F)
+    return ((values * np.uint32(0x01010101)) >> 24).astype(dtype)
+
+def extract_years(titles):
+    """Bản vectorized của extract_year cho cả Series title"""
+    return titles.str.extract(r"\((\d{4})\)", expand=False).astype(float)
+
 def clean_title_for_search(title: str) -> str:
     """Làm sạch title để tìm kiếm tốt hơn"""
     if not isinstance(title, str):
@@ -25,4 +92,21 @@ def clean_title_for_search(title: str) -> str:
     # Chuẩn hóa spaces
     cleaned = re.sub(r"\s+", " ", cleaned).strip()
     
-    return cleaned
\ No newline at end of file
+    return cleaned
+
+def preprocess_title(title):
+    """Tiền xử lý title để so sánh tốt hơn"""
+    if pd.isna(title) or not title:
+        return ""
+    
+    # Chuyển về lowercase và loại bỏ khoảng trắng thừa
+    title = str(title).lower().strip()
+    
+    # Loại bỏ "the", "a", "an" ở đầu
+    prefixes = ["the ", "a ", "an "]
+    for prefix in prefixes:
+        if title.startswith(prefix):
+            title = title[len(prefix):]
+            break
+    
+    return title
\ No newline at end of file